@@ -1,19 +1,183 @@
 #!/usr/bin/env python3
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, has_request_context, jsonify, request
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+import gzip
+import hashlib
 import logging
-from utac_scraper import UTACScraper
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utac_scraper import UTACScraper, UTACScraperError
+from center_index import CenterIndex, DEFAULT_SNAPSHOT_DIR, DEFAULT_MAX_AGE, FILTER_FIELDS
+from crawl_jobs import CrawlJobStore
+from result_cache import ResultCache
+from change_feed import ChangeFeed
+from upstream import UpstreamTransport, CircuitBreaker
+from rate_limiter import PRIORITY_REFRESH, shared_rate_limiter
+from metrics import MetricsRegistry
+import json_codec
+
+# Compression brotli optionnelle (pip install Brotli), gzip sinon
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Réponses jsonify sérialisées par json_codec (orjson s'il est installé)
+
+    Sortie compacte en UTF-8 ; indentée si la requête contient ?pretty=true (ou en
+    mode debug, comme le fournisseur par défaut de Flask).
+    """
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = (self.compact is None and self._app.debug) or self.compact is False or (
+            has_request_context() and request.args.get('pretty', '').lower() in ('1', 'true'))
+        body = json_codec.dumps(obj, pretty=pretty, sort_keys=self.sort_keys, default=self.default)
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Métriques Prometheus, agrégées entre workers via un répertoire partagé
+metrics = MetricsRegistry(os.environ.get(
+    'UTAC_METRICS_DIR',
+    os.path.join(os.environ.get('UTAC_SNAPSHOT_DIR', DEFAULT_SNAPSHOT_DIR), 'metrics')
+))
+
+# Transport vers utac-otc.com partagé par les scrapers du worker (un seul disjoncteur),
+# débit global limité entre workers, jobs de crawl et rafraîchissement du snapshot
+upstream = UpstreamTransport(
+    retries=int(os.environ.get('UTAC_UPSTREAM_RETRIES', 3)),
+    connect_timeout=float(os.environ.get('UTAC_UPSTREAM_CONNECT_TIMEOUT', 3.05)),
+    read_timeout=float(os.environ.get('UTAC_UPSTREAM_READ_TIMEOUT', 20)),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.environ.get('UTAC_BREAKER_THRESHOLD', 5)),
+        reset_timeout=int(os.environ.get('UTAC_BREAKER_RESET_TIMEOUT', 30))
+    ),
+    rate_limiter=shared_rate_limiter(os.environ.get('UTAC_SNAPSHOT_DIR', DEFAULT_SNAPSHOT_DIR), metrics=metrics)
+)
+
+# Site interrogé (serveur de rejeu local pour les tests de charge)
+UPSTREAM_URL = os.environ.get('UTAC_UPSTREAM_URL', 'https://www.utac-otc.com')
+
 # Instance globale du scraper
-scraper = UTACScraper()
+scraper = UTACScraper(transport=upstream, metrics=metrics, base_url=UPSTREAM_URL)
+
+# Index local des centres construit depuis les snapshots du crawl national
+SNAPSHOT_DIR = os.environ.get('UTAC_SNAPSHOT_DIR', DEFAULT_SNAPSHOT_DIR)
+center_index = CenterIndex(
+    SNAPSHOT_DIR,
+    max_age=int(os.environ.get('UTAC_SNAPSHOT_MAX_AGE', DEFAULT_MAX_AGE))
+)
+center_index.load()
+
+# Nombre de départements crawlés en parallèle par les jobs de /all-centers/jobs
+CRAWL_WORKERS = int(os.environ.get('UTAC_CRAWL_WORKERS', 1))
+
+# Recherche d'agréments par lot (POST /agreements)
+BATCH_MAX_AGREEMENTS = int(os.environ.get('UTAC_BATCH_MAX_AGREEMENTS', 500))
+BATCH_WORKERS = int(os.environ.get('UTAC_BATCH_WORKERS', 4))
+
+# Recherche multi-critères dans les snapshots (GET /centers)
+CENTERS_DEFAULT_LIMIT = 50
+CENTERS_MAX_LIMIT = int(os.environ.get('UTAC_CENTERS_MAX_LIMIT', 500))
+
+# Jobs de crawl national exécutés hors des workers gunicorn
+crawl_jobs = CrawlJobStore(os.environ.get('UTAC_JOBS_DIR', os.path.join(SNAPSHOT_DIR, 'jobs')))
+
+# Cache de résultats partagé entre workers (SQLite)
+result_cache = ResultCache(
+    os.environ.get('UTAC_CACHE_PATH', os.path.join(SNAPSHOT_DIR, 'result_cache.sqlite3')),
+    max_entries=int(os.environ.get('UTAC_CACHE_MAX_ENTRIES', 5000)),
+    max_bytes=int(os.environ.get('UTAC_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+)
+CACHE_TTL_DEPARTMENT = int(os.environ.get('UTAC_CACHE_TTL_DEPARTMENT', 6 * 3600))
+CACHE_TTL_AGREEMENT = int(os.environ.get('UTAC_CACHE_TTL_AGREEMENT', 6 * 3600))
+CACHE_STALE_TTL = int(os.environ.get('UTAC_CACHE_STALE_TTL', 24 * 3600))
+
+# Flux des changements entre deux crawls nationaux
+change_feed = ChangeFeed(SNAPSHOT_DIR)
+
+# Compression des réponses JSON (taille minimale en octets, niveaux rapides)
+COMPRESSION_MIN_SIZE = int(os.environ.get('UTAC_COMPRESSION_MIN_SIZE', 1024))
+GZIP_LEVEL = int(os.environ.get('UTAC_GZIP_LEVEL', 3))
+BROTLI_QUALITY = int(os.environ.get('UTAC_BROTLI_QUALITY', 4))
+COMPRESSION_ENCODINGS = ['br', 'gzip'] if brotli else ['gzip']
+
+# Scraper dédié aux rafraîchissements en arrière-plan (stale-while-revalidate)
+_background_scraper = None
+_background_lock = threading.Lock()
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def _record_request_duration(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        metrics.observe(
+            'utac_http_request_duration_seconds',
+            time.perf_counter() - started,
+            endpoint=request.url_rule.rule if request.url_rule else 'unmatched',
+            method=request.method,
+            status=response.status_code
+        )
+    return response
+
+@app.after_request
+def _conditional_response(response):
+    """
+    ETag fort et 304 Not Modified (GET/HEAD), compression de toutes les réponses JSON
+
+    Les réponses issues du snapshot portent l'ETag de sa version, calculé avant
+    sérialisation (voir _snapshot_not_modified) ; les autres, un hash de leur contenu.
+    Chaque encodage négocié (br, gzip, identité) a son propre ETag. La compression
+    s'applique aussi aux POST (POST /department, POST /agreements).
+    """
+    snapshot_etag = g.pop('snapshot_etag', None)
+    json_body = response.mimetype == 'application/json' and not response.is_streamed
+    conditional = request.method in ('GET', 'HEAD') and response.status_code in (200, 304) and (
+        snapshot_etag is not None or (json_body and response.status_code == 200))
+    compressible = json_body and response.status_code == 200
+    if not (conditional or compressible):
+        return response
+
+    encoding = _negotiate_encoding()
+    response.vary.add('Accept-Encoding')
+
+    if conditional:
+        if snapshot_etag is None:
+            snapshot_etag = _representation_etag(hashlib.sha1(response.get_data()).hexdigest(), encoding)
+        response.set_etag(snapshot_etag)
+        # Streaming NDJSON : If-None-Match déjà traité par _snapshot_not_modified,
+        # make_conditional consommerait le générateur pour calculer Content-Length
+        if response.is_streamed:
+            return response
+
+        if response.status_code == 200:
+            response.make_conditional(request)
+        if response.status_code == 304:
+            response.set_data(b'')
+            return response
+
+    if compressible and encoding:
+        data = response.get_data()
+        if len(data) >= COMPRESSION_MIN_SIZE:
+            response.set_data(_compress(data, encoding))
+            response.headers['Content-Encoding'] = encoding
+    return response
 
 @app.route('/', methods=['GET'])
 def home():
@@ -24,11 +188,20 @@ def home():
         'endpoints': {
             'GET /': 'Documentation de l\'API',
             'GET /health': 'Vérification de l\'état de l\'API',
+            'GET /metrics': 'Métriques Prometheus (latences par endpoint et par phase du scraper)',
             'GET /agreement/<agreement_number>': 'Recherche par numéro d\'agrément',
             'POST /agreement': 'Recherche par numéro d\'agrément (JSON body)',
-            'GET /department/<department_code>': 'Recherche tous les centres d\'un département',
+            'POST /agreements': 'Recherche de plusieurs numéros d\'agrément (un appel par département)',
+            'GET /department/<department_code>': 'Recherche tous les centres d\'un département (?format=ndjson pour le streaming)',
             'POST /department': 'Recherche par département (JSON body)',
-            'GET /all-centers': 'Récupère TOUS les centres de France (long processus)'
+            'GET /centers?ville=&code_postal=&option=&enseigne=&department=': 'Recherche multi-critères dans le snapshot local (paginée par offset/limit)',
+            'GET /postal/<prefix>': 'Centres dont le code postal commence par un préfixe (440, 75016, 971...)',
+            'GET /all-centers': 'Tous les centres de France depuis le snapshot national (?format=ndjson pour le streaming)',
+            'POST /all-centers/jobs': 'Demande un rafraîchissement anticipé du snapshot national (crawl seulement s\'il est dû)',
+            'GET /all-centers/jobs': 'Liste les jobs de récupération',
+            'GET /all-centers/jobs/<job_id>': 'Avancement d\'un job (progression par département)',
+            'GET /all-centers/jobs/<job_id>/result': 'Résultat d\'un job terminé',
+            'GET /changes?since=<timestamp>': 'Centres ajoutés, supprimés ou modifiés depuis un horodatage'
         },
         'example_usage': {
             'agreement_search': {
@@ -53,6 +226,8 @@ def home():
                 'url': '/department/04',
                 'response_format': {
                     'success': True,
+                    'source': 'snapshot',
+                    'snapshot_age_seconds': 3600.0,
                     'data': {
                         'department_code': '04',
                         'total_centers': 25,
@@ -81,9 +256,18 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'service': 'UTAC-OTC API',
-        'version': '1.0.0'
+        'version': '1.0.0',
+        'snapshot': center_index.stats(),
+        'cache': result_cache.stats(),
+        'upstream': upstream.breaker.stats(),
+        'rate_limiter': upstream.rate_limiter.stats() if upstream.rate_limiter else None
     })
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Métriques de tous les workers au format texte Prometheus"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/agreement/<string:agreement_number>', methods=['GET'])
 def get_agreement_info_get(agreement_number):
     """
@@ -130,6 +314,65 @@ def get_agreement_info_post():
             'details': str(e)
         }), 400
 
+@app.route('/agreements', methods=['POST'])
+def get_agreements_batch():
+    """
+    Recherche plusieurs numéros d'agrément en une requête
+    
+    Les numéros sont dédoublonnés puis regroupés par département (S044C203 -> 44) :
+    chaque département est récupéré au plus une fois (via le cache partagé), et tous
+    ses numéros sont résolus à partir de ses centres. Les erreurs sont rapportées
+    numéro par numéro.
+    
+    Body JSON attendu:
+        {
+            "agreement_numbers": ["S044C203", "S004S062"]
+        }
+        
+    Returns:
+        JSON: Résultat par numéro, dans l'ordre de la requête
+    """
+    try:
+        data = request.get_json()
+    except Exception as e:
+        logger.error(f"Erreur lors du parsing JSON: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Format JSON invalide',
+            'details': str(e)
+        }), 400
+    
+    agreement_numbers = data.get('agreement_numbers') if isinstance(data, dict) else None
+    if not isinstance(agreement_numbers, list) or not agreement_numbers or \
+            not all(isinstance(number, str) for number in agreement_numbers):
+        return jsonify({
+            'success': False,
+            'error': 'Paramètre agreement_numbers requis dans le body JSON (liste de numéros)',
+            'example': {'agreement_numbers': ['S044C203', 'S004S062']}
+        }), 400
+    
+    if len(agreement_numbers) > BATCH_MAX_AGREEMENTS:
+        return jsonify({
+            'success': False,
+            'error': f'Trop de numéros d\'agrément ({len(agreement_numbers)}, maximum {BATCH_MAX_AGREEMENTS})'
+        }), 400
+    
+    try:
+        logger.info(f"Recherche par lot: {len(agreement_numbers)} numéros d'agrément")
+        results, departments = _process_agreement_batch(agreement_numbers)
+    except Exception as e:
+        return _internal_error(e)
+    
+    found = sum(1 for result in results if result['success'])
+    return jsonify({
+        'success': True,
+        'total': len(results),
+        'found': found,
+        'failed': len(results) - found,
+        'departments_fetched': departments,
+        'results': results
+    })
+
 @app.route('/department/<string:department_code>', methods=['GET'])
 def get_department_centers_get(department_code):
     """
@@ -138,9 +381,14 @@ def get_department_centers_get(department_code):
     Args:
         department_code (str): Le code du département (ex: "04", "75", "971")
         
+    Query params:
+        format (str): "ndjson" pour recevoir les centres en streaming, un par ligne
+        
     Returns:
         JSON: Liste des centres du département ou erreur
     """
+    if request.args.get('format') == 'ndjson':
+        return _stream_department_request(department_code)
     return _process_department_request(department_code)
 
 @app.route('/department', methods=['POST'])
@@ -176,57 +424,474 @@ def get_department_centers_post():
             'details': str(e)
         }), 400
 
+@app.route('/centers', methods=['GET'])
+def get_centers():
+    """
+    Recherche multi-critères dans le snapshot local, sans requête vers utac-otc.com
+    
+    Query params:
+        ville, code_postal, option, enseigne, department: Critères (combinés en ET,
+            casse ignorée ; option=GAZ trouve "GAZ*" et "GAZ - ELECTRIQUE")
+        offset (int): Nombre de centres à sauter (défaut 0)
+        limit (int): Nombre de centres renvoyés (défaut 50)
+        
+    Returns:
+        JSON: Centres correspondants, par numéro d'agrément croissant
+    """
+    criteria = {field: request.args[field] for field in FILTER_FIELDS if request.args.get(field, '').strip()}
+    
+    offset, limit, error = _pagination_args()
+    if error:
+        return error
+    
+    if 'department' in criteria:
+        criteria['department'] = _normalize_department_code(criteria['department'])
+    
+    result = center_index.filter(criteria, offset=offset, limit=limit)
+    return _snapshot_page_response(result, offset, limit, filters=criteria)
+
+@app.route('/postal/<string:prefix>', methods=['GET'])
+def get_centers_by_postal_prefix(prefix):
+    """
+    Centres dont le code postal commence par un préfixe, depuis le snapshot local
+    
+    Args:
+        prefix (str): 1 à 5 chiffres ("440", "75016", "971" pour la Guadeloupe)
+        
+    Query params:
+        offset (int): Nombre de centres à sauter (défaut 0)
+        limit (int): Nombre de centres renvoyés (défaut 50)
+        
+    Returns:
+        JSON: Centres correspondants, par code postal puis numéro d'agrément
+    """
+    prefix = prefix.strip()
+    if not prefix.isdigit() or len(prefix) > 5:
+        return jsonify({
+            'success': False,
+            'error': 'Préfixe de code postal invalide (1 à 5 chiffres)',
+            'prefix': prefix
+        }), 400
+    
+    offset, limit, error = _pagination_args()
+    if error:
+        return error
+    
+    result = center_index.by_postal_prefix(prefix, offset=offset, limit=limit)
+    return _snapshot_page_response(result, offset, limit, prefix=prefix)
+
 @app.route('/all-centers', methods=['GET'])
 def get_all_french_centers():
     """
-    Récupère TOUS les centres de contrôle technique de France
+    Tous les centres de contrôle technique de France, depuis le snapshot national
+    
+    Le snapshot est tenu à jour par le processus de rafraîchissement
+    (python -m utac_scraper refresh) : aucune requête vers utac-otc.com.
+    
+    Query params:
+        format (str): "ndjson" pour recevoir les centres en streaming, un par ligne
+    
+    Returns:
+        JSON: Tous les centres de France et âge du snapshot
+    """
+    age = center_index.snapshot_age()
+    if age is None:
+        return _no_snapshot_response()
+    
+    not_modified = _snapshot_not_modified()
+    if not_modified:
+        return not_modified
+    
+    if request.args.get('format') == 'ndjson':
+        return _stream_all_centers()
+    
+    centers = list(center_index.iter_centers())
+    return jsonify({
+        'success': True,
+        'source': 'snapshot',
+        'snapshot_age_seconds': round(age, 1),
+        'timestamp': center_index.snapshot_timestamp,
+        'data': {
+            'total_centers': len(centers),
+            'centers': centers
+        }
+    })
+
+@app.route('/all-centers/jobs', methods=['POST'])
+def start_all_centers_job():
+    """
+    Demande un rafraîchissement anticipé du snapshot national
     
-    ATTENTION: Cette opération prend 8-10 minutes et traite ~6700 centres
+    Le job ne crawle que si le snapshot est dû (voir crawl_jobs), dans un processus
+    détaché : la réponse est immédiate et l'avancement se consulte via
+    GET /all-centers/jobs/<job_id>.
     
     Returns:
-        JSON: Tous les centres de France avec statistiques complètes
+        JSON: Job créé (202), job déjà en cours (200), ou 409 si le processus de
+            rafraîchissement crawle déjà
     """
     try:
-        logger.info("Début de la récupération de tous les centres de France")
-        
-        # Utiliser le scraper pour récupérer tous les centres
-        result = scraper.get_all_french_centers()
-        
-        if not result or not result.get('success'):
+        job, created = crawl_jobs.start(output_dir=SNAPSHOT_DIR, workers=CRAWL_WORKERS, base_url=UPSTREAM_URL)
+        if job is None:
             return jsonify({
                 'success': False,
-                'error': 'Erreur lors de la récupération des centres'
-            }), 500
-        
-        # Réorganiser les données pour l'API
-        api_response = {
-            'success': True,
-            'timestamp': result.get('timestamp'),
-            'processing_time': {
-                'total_seconds': result.get('total_duration_seconds'),
-                'total_minutes': result.get('total_duration_minutes')
-            },
-            'summary': result.get('summary'),
-            'data': {
-                'total_centers': result['data']['total_centers'],
-                'centers': result['data']['centers']
-            },
-            'department_statistics': result.get('department_statistics'),
-            'errors': result.get('errors', [])
-        }
+                'error': 'Rafraîchissement du snapshot déjà en cours (python -m utac_scraper refresh)'
+            }), 409
         
-        logger.info(f"Récupération terminée: {result['data']['total_centers']} centres en {result.get('total_duration_minutes', 0):.1f} minutes")
+        if created:
+            logger.info(f"Job de crawl national démarré: {job['job_id']}")
         
-        return jsonify(api_response)
+        response = jsonify({
+            'success': True,
+            'created': created,
+            'job': _format_job(job)
+        })
+        response.status_code = 202 if created else 200
+        response.headers['Location'] = f"/all-centers/jobs/{job['job_id']}"
+        return response
         
     except Exception as e:
-        logger.error(f"Erreur lors de la récupération complète: {e}")
+        logger.error(f"Erreur lors du démarrage du job: {e}")
         return jsonify({
             'success': False,
-            'error': 'Erreur interne du serveur lors de la récupération complète',
+            'error': 'Impossible de démarrer le job de récupération',
             'details': str(e)
         }), 500
 
+@app.route('/all-centers/jobs', methods=['GET'])
+def list_all_centers_jobs():
+    """Liste les jobs de récupération les plus récents"""
+    return jsonify({
+        'success': True,
+        'jobs': [_format_job(job, include_departments=False) for job in crawl_jobs.list()]
+    })
+
+@app.route('/all-centers/jobs/<string:job_id>', methods=['GET'])
+def get_all_centers_job(job_id):
+    """
+    Avancement d'un job de récupération (progression par département)
+    
+    Args:
+        job_id (str): Identifiant du job
+        
+    Returns:
+        JSON: État du job ou erreur 404
+    """
+    job = crawl_jobs.get(job_id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'error': 'Job introuvable',
+            'job_id': job_id
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'job': _format_job(job)
+    })
+
+@app.route('/all-centers/jobs/<string:job_id>/result', methods=['GET'])
+def get_all_centers_job_result(job_id):
+    """
+    Résultat complet d'un job terminé (même format que GET /all-centers)
+    
+    Un job qui n'a pas crawlé (snapshot à jour) renvoie le snapshot courant.
+    
+    Args:
+        job_id (str): Identifiant du job
+        
+    Returns:
+        JSON: Tous les centres de France, 409 si le job n'est pas terminé
+    """
+    job = crawl_jobs.get(job_id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'error': 'Job introuvable',
+            'job_id': job_id
+        }), 404
+    
+    if job['status'] != 'done':
+        return jsonify({
+            'success': False,
+            'error': 'Job non terminé',
+            'job_id': job_id,
+            'status': job['status']
+        }), 409
+    
+    if (job['summary'] or {}).get('crawled') is False:
+        return get_all_french_centers()
+    
+    result = crawl_jobs.load_result(job_id)
+    if not result:
+        return jsonify({
+            'success': False,
+            'error': 'Résultat du job indisponible',
+            'job_id': job_id
+        }), 500
+    
+    return jsonify(_format_all_centers_response(result))
+
+@app.route('/changes', methods=['GET'])
+def get_changes():
+    """
+    Changements nets depuis un horodatage, pour une synchronisation incrémentale
+    
+    Query params:
+        since (float): Horodatage Unix (latest_timestamp de la réponse précédente)
+        
+    Returns:
+        JSON: Centres ajoutés, supprimés et modifiés depuis since
+    """
+    since = request.args.get('since')
+    if since is None:
+        return jsonify({
+            'success': False,
+            'error': 'Paramètre since manquant (horodatage Unix)'
+        }), 400
+    
+    try:
+        since = float(since)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Paramètre since invalide (horodatage Unix attendu)',
+            'since': since
+        }), 400
+    
+    changes = change_feed.changes_since(since)
+    if changes['history_start'] is None:
+        return jsonify({
+            'success': False,
+            'error': 'Aucun crawl national disponible'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'data': changes
+    })
+
+def _pagination_args():
+    """(offset, limit, réponse 400 si les query params sont invalides, sinon None)"""
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args.get('limit', CENTERS_DEFAULT_LIMIT))
+    except ValueError:
+        return None, None, (jsonify({
+            'success': False,
+            'error': 'Paramètres offset et limit: entiers attendus'
+        }), 400)
+    if offset < 0 or not 1 <= limit <= CENTERS_MAX_LIMIT:
+        return None, None, (jsonify({
+            'success': False,
+            'error': f'offset doit être positif et limit compris entre 1 et {CENTERS_MAX_LIMIT}'
+        }), 400)
+    return offset, limit, None
+
+def _no_snapshot_response():
+    return jsonify({
+        'success': False,
+        'error': 'Aucun snapshot disponible (lancer python -m utac_scraper refresh)'
+    }), 404
+
+def _negotiate_encoding():
+    """Encodage préféré par le client parmi br (si installé) et gzip, None pour l'identité"""
+    return request.accept_encodings.best_match(COMPRESSION_ENCODINGS)
+
+def _representation_etag(digest, encoding):
+    """ETag d'une représentation : une version par encodage négocié"""
+    return f"{digest}-{encoding}" if encoding else digest
+
+def _compress(data, encoding):
+    """Compresse un corps de réponse (niveaux rapides : la réponse est compressée à chaque appel)"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+def _snapshot_not_modified():
+    """
+    ETag d'une réponse issue du snapshot, calculé sans la sérialiser
+
+    L'ETag dépend de la version des fichiers de snapshot chargés, de l'URL demandée
+    et de l'encodage négocié : il ne change qu'au rechargement du snapshot. Le champ
+    snapshot_age_seconds d'une réponse 304 est donc celui de la réponse en cache chez
+    le client.
+
+    Returns:
+        Response: 304 Not Modified si le client a déjà cette version, sinon None
+            (l'ETag est posé sur la réponse par _conditional_response)
+    """
+    version = repr((center_index.version(), request.path, sorted(request.args.items(multi=True))))
+    g.snapshot_etag = _representation_etag(hashlib.sha1(version.encode('utf-8')).hexdigest(), _negotiate_encoding())
+    if request.if_none_match.contains_weak(g.snapshot_etag):
+        return Response(status=304)
+    return None
+
+def _snapshot_page_response(result, offset, limit, **query):
+    """Réponse JSON d'une page de centres issue du snapshot local (404 sans snapshot)"""
+    age = center_index.snapshot_age()
+    if age is None:
+        return _no_snapshot_response()
+    
+    not_modified = _snapshot_not_modified()
+    if not_modified:
+        return not_modified
+    
+    return jsonify({
+        'success': True,
+        'source': 'snapshot',
+        'snapshot_age_seconds': round(age, 1),
+        **query,
+        'data': {
+            'total': result['total'],
+            'offset': offset,
+            'limit': limit,
+            'centers': result['centers']
+        }
+    })
+
+def _format_job(job, include_departments=True):
+    """Met en forme l'état d'un job pour l'API"""
+    formatted = {
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+        'progress': job['progress'],
+        'summary': job['summary'],
+        'error': job['error'],
+        'result_url': f"/all-centers/jobs/{job['job_id']}/result" if job['status'] == 'done' else None
+    }
+    if include_departments:
+        formatted['departments'] = job['departments']
+    return formatted
+
+def _format_all_centers_response(result):
+    """Réorganise le résultat du crawl national pour l'API"""
+    return {
+        'success': True,
+        'timestamp': result.get('timestamp'),
+        'processing_time': {
+            'total_seconds': result.get('total_duration_seconds'),
+            'total_minutes': result.get('total_duration_minutes')
+        },
+        'summary': result.get('summary'),
+        'data': {
+            'total_centers': result['data']['total_centers'],
+            'centers': result['data']['centers']
+        },
+        'department_statistics': result.get('department_statistics'),
+        'errors': result.get('errors', [])
+    }
+
+def _ndjson_line(obj):
+    """Sérialise un objet en une ligne NDJSON"""
+    return json_codec.dumps(obj) + b'\n'
+
+def _stream_department_request(department_code):
+    """
+    Streaming NDJSON des centres d'un département, page par page
+    
+    La recherche et la première page sont récupérées avant de répondre afin de
+    renvoyer un code d'erreur HTTP classique si le département est invalide ou vide.
+    
+    Args:
+        department_code (str): Le code du département
+        
+    Returns:
+        Response: application/x-ndjson, un centre par ligne
+    """
+    # Code normalisé ("4" -> "04") pour l'index comme pour utac-otc.com, comme en JSON
+    department_code = _normalize_department_code(department_code or '')
+    logger.info(f"Recherche du département (streaming): {department_code}")
+    
+    # Département présent et à jour dans le snapshot : pas de requête vers utac-otc.com
+    indexed = center_index.department(department_code)
+    if indexed and not indexed[2]:
+        return _snapshot_not_modified() or Response(
+            (_ndjson_line(center) for center in indexed[0]), mimetype='application/x-ndjson')
+    
+    centers = scraper.iter_department_centers(department_code)
+    try:
+        first_center = next(centers)
+    except UTACScraperError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'department_code': department_code
+        }), 400
+    except StopIteration:
+        return jsonify({
+            'success': False,
+            'error': 'Aucun centre trouvé pour ce département',
+            'department_code': department_code
+        }), 404
+    
+    def generate():
+        yield _ndjson_line(first_center)
+        try:
+            for center in centers:
+                yield _ndjson_line(center)
+        except Exception as e:
+            logger.error(f"Erreur pendant le streaming du département {department_code}: {e}")
+            yield _ndjson_line({'error': str(e), 'department_code': department_code})
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+def _stream_all_centers():
+    """
+    Streaming NDJSON de tous les centres du snapshot national
+    
+    Returns:
+        Response: application/x-ndjson, un centre par ligne
+    """
+    centers = center_index.iter_centers()
+    return Response((_ndjson_line(center) for center in centers), mimetype='application/x-ndjson')
+
+def _background_search(method_name, *args):
+    """
+    Exécute une recherche avec le scraper d'arrière-plan
+    
+    Un seul rafraîchissement par clé, tous workers confondus : le cache de résultats
+    réserve la clé avant l'appel (refreshing_until). Des clés différentes se
+    rafraîchissent en parallèle (une session HTTP par thread), espacées par le
+    limiteur de débit (priorité refresh).
+    """
+    global _background_scraper
+    with _background_lock:
+        if _background_scraper is None:
+            _background_scraper = UTACScraper(transport=upstream, metrics=metrics, base_url=UPSTREAM_URL,
+                                              priority=PRIORITY_REFRESH)
+    return getattr(_background_scraper, method_name)(*args)
+
+def _normalize_department_code(department_code):
+    """Normalise un code département ("4" -> "04") pour la recherche et le cache"""
+    department_code = department_code.strip()
+    if department_code.isdigit() and 1 <= int(department_code) <= 95:
+        return f"{int(department_code):02d}"
+    return department_code
+
+def _upstream_unavailable(error, **context):
+    """Réponse 503 si l'erreur vient du disjoncteur ouvert (utac-otc.com indisponible)"""
+    if not upstream.breaker.is_open():
+        return None
+    response = jsonify(dict({
+        'success': False,
+        'error': 'Service UTAC-OTC temporairement indisponible',
+        'details': error
+    }, **context))
+    response.status_code = 503
+    response.headers['Retry-After'] = str(int(upstream.breaker.retry_after()) + 1)
+    return response
+
+def _has_department_centers(result):
+    return bool(result) and 'error' not in result and bool(result.get('centers'))
+
+def _has_agreement_details(result):
+    required_fields = ['raison_sociale', 'enseigne', 'adresse', 'ville', 'telephone']
+    return bool(result) and 'error' not in result and any(result.get(field, '').strip() for field in required_fields)
+
 def _process_department_request(department_code):
     """
     Traite une requête de recherche par département
@@ -246,47 +911,73 @@ def _process_department_request(department_code):
     try:
         logger.info(f"Recherche du département: {department_code}")
         
-        # Utiliser le scraper pour récupérer les informations
-        result = scraper.search_by_department(department_code.strip())
-        
-        if not result:
-            return jsonify({
-                'success': False,
-                'error': 'Aucun résultat trouvé pour ce département',
-                'department_code': department_code
-            }), 404
-        
-        if 'error' in result:
-            return jsonify({
-                'success': False,
-                'error': result['error'],
-                'department_code': department_code
-            }), 400
-        
-        # Vérifier que nous avons des centres
-        if not result.get('centers') or len(result['centers']) == 0:
-            return jsonify({
-                'success': False,
-                'error': 'Aucun centre trouvé pour ce département',
-                'department_code': department_code
-            }), 404
-        
-        return jsonify({
-            'success': True,
-            'data': {
-                'department_code': result.get('department_code', department_code),
-                'total_centers': result.get('total_centers', 0),
-                'centers': result.get('centers', [])
-            }
-        })
+        # D'abord l'index local, puis le cache partagé, le scraper seulement en cas d'absence
+        department_code = _normalize_department_code(department_code)
+        indexed = _department_from_index(department_code)
+        if indexed:
+            return indexed
+        result, cache_status = _cached_department_search(department_code)
+        return _department_response(result, cache_status, department_code)
         
     except Exception as e:
-        logger.error(f"Erreur lors de la recherche: {e}")
+        return _internal_error(e)
+
+def _cached_department_search(department_code):
+    """
+    Recherche par département via le cache partagé (le scraper seulement en cas d'absence)
+    
+    Returns:
+        tuple: (résultat de search_by_department, statut du cache)
+    """
+    return result_cache.get_or_compute(
+        f"department:{department_code}",
+        lambda: scraper.search_by_department(department_code),
+        ttl=CACHE_TTL_DEPARTMENT,
+        stale_ttl=CACHE_STALE_TTL,
+        cacheable=_has_department_centers,
+        refresh=lambda: _background_search('search_by_department', department_code)
+    )
+
+def _department_response(result, cache_status, department_code):
+    """Réponse JSON d'une recherche par département (résultat du cache ou du scraper)"""
+    metrics.inc('utac_cache_requests_total', cache='result', kind='department', status=cache_status)
+    
+    if not result:
         return jsonify({
             'success': False,
-            'error': 'Erreur interne du serveur',
-            'details': str(e)
-        }), 500
+            'error': 'Aucun résultat trouvé pour ce département',
+            'department_code': department_code
+        }), 404
+    
+    if 'error' in result:
+        unavailable = _upstream_unavailable(result['error'], department_code=department_code)
+        if unavailable:
+            return unavailable
+        return jsonify({
+            'success': False,
+            'error': result['error'],
+            'department_code': department_code
+        }), 400
+    
+    # Vérifier que nous avons des centres
+    if not result.get('centers') or len(result['centers']) == 0:
+        return jsonify({
+            'success': False,
+            'error': 'Aucun centre trouvé pour ce département',
+            'department_code': department_code
+        }), 404
+    
+    response = jsonify({
+        'success': True,
+        'source': 'live',
+        'data': {
+            'department_code': result.get('department_code', department_code),
+            'total_centers': result.get('total_centers', 0),
+            'centers': result.get('centers', [])
+        }
+    })
+    response.headers['X-Cache'] = cache_status.upper()
+    return response
 
 def _process_agreement_request(agreement_number):
     """
@@ -307,56 +998,221 @@ def _process_agreement_request(agreement_number):
     try:
         logger.info(f"Recherche du numéro d'agrément: {agreement_number}")
         
-        # Utiliser le scraper pour récupérer les informations
-        result = scraper.search_by_agreement_number(agreement_number.strip())
+        # D'abord l'index local, le scraper seulement si absent ou périmé
+        indexed = _agreement_from_index(agreement_number)
+        if indexed:
+            return indexed
         
-        if not result:
-            return jsonify({
-                'success': False,
-                'error': 'Aucun résultat trouvé pour ce numéro d\'agrément',
-                'agreement_number': agreement_number
-            }), 404
-        
-        if 'error' in result:
-            return jsonify({
-                'success': False,
-                'error': result['error'],
-                'agreement_number': agreement_number,
-                'debug_info': result.get('debug_tables', [])
-            }), 404
-        
-        # Vérifier que nous avons au moins une information utile
-        required_fields = ['raison_sociale', 'enseigne', 'adresse', 'ville', 'telephone']
-        if not any(result.get(field, '').strip() for field in required_fields):
-            return jsonify({
-                'success': False,
-                'error': 'Aucune information détaillée trouvée pour ce numéro d\'agrément',
-                'agreement_number': agreement_number
-            }), 404
+        # Puis le cache partagé, le scraper seulement en cas d'absence
+        agreement_number = agreement_number.strip()
+        result, cache_status = result_cache.get_or_compute(
+            f"agreement:{CenterIndex.normalize_agreement(agreement_number)}",
+            lambda: scraper.search_by_agreement_number(agreement_number),
+            ttl=CACHE_TTL_AGREEMENT,
+            stale_ttl=CACHE_STALE_TTL,
+            cacheable=_has_agreement_details,
+            refresh=lambda: _background_search('search_by_agreement_number', agreement_number)
+        )
+        return _agreement_response(result, cache_status, agreement_number)
         
+    except Exception as e:
+        return _internal_error(e)
+
+def _agreement_from_index(agreement_number):
+    """Réponse depuis l'index local des snapshots, ou None si le centre est absent ou périmé"""
+    indexed = center_index.lookup(agreement_number)
+    index_hit = bool(indexed and not indexed[2])
+    metrics.inc('utac_cache_requests_total', cache='index', kind='agreement', status='hit' if index_hit else 'miss')
+    if not index_hit:
+        return None
+    center, age, _ = indexed
+    return jsonify({
+        'success': True,
+        'source': 'snapshot',
+        'snapshot_age_seconds': round(age, 1),
+        'data': _format_agreement_data(dict(center, url='Page de résultats'), agreement_number)
+    })
+
+def _department_from_index(department_code):
+    """Réponse depuis l'index local des snapshots, ou None si le département est absent ou périmé"""
+    indexed = center_index.department(department_code)
+    index_hit = bool(indexed and not indexed[2])
+    metrics.inc('utac_cache_requests_total', cache='index', kind='department', status='hit' if index_hit else 'miss')
+    if not index_hit:
+        return None
+    not_modified = _snapshot_not_modified()
+    if not_modified:
+        return not_modified
+    centers, age, _ = indexed
+    return jsonify({
+        'success': True,
+        'source': 'snapshot',
+        'snapshot_age_seconds': round(age, 1),
+        'data': {
+            'department_code': department_code,
+            'total_centers': len(centers),
+            'centers': centers
+        }
+    })
+
+def _agreement_response(result, cache_status, agreement_number):
+    """Réponse JSON d'une recherche par agrément (résultat du cache ou du scraper)"""
+    metrics.inc('utac_cache_requests_total', cache='result', kind='agreement', status=cache_status)
+    
+    if not result:
         return jsonify({
-            'success': True,
-            'data': {
-                'agreement_number': result.get('agreement_number', agreement_number),
-                'raison_sociale': result.get('raison_sociale', ''),
-                'enseigne': result.get('enseigne', ''),
-                'adresse': result.get('adresse', ''),
-                'ville': result.get('ville', ''),
-                'code_postal': result.get('code_postal', ''),
-                'telephone': result.get('telephone', ''),
-                'option': result.get('option', ''),
-                'site_internet': result.get('site_internet', ''),
-                'url': result.get('url', '')
+            'success': False,
+            'error': 'Aucun résultat trouvé pour ce numéro d\'agrément',
+            'agreement_number': agreement_number
+        }), 404
+    
+    if 'error' in result:
+        unavailable = _upstream_unavailable(result['error'], agreement_number=agreement_number)
+        if unavailable:
+            return unavailable
+        return jsonify({
+            'success': False,
+            'error': result['error'],
+            'agreement_number': agreement_number,
+            'debug_info': result.get('debug_tables', [])
+        }), 404
+    
+    # Vérifier que nous avons au moins une information utile
+    required_fields = ['raison_sociale', 'enseigne', 'adresse', 'ville', 'telephone']
+    if not any(result.get(field, '').strip() for field in required_fields):
+        return jsonify({
+            'success': False,
+            'error': 'Aucune information détaillée trouvée pour ce numéro d\'agrément',
+            'agreement_number': agreement_number
+        }), 404
+    
+    response = jsonify({
+        'success': True,
+        'source': 'live',
+        'data': _format_agreement_data(result, agreement_number)
+    })
+    response.headers['X-Cache'] = cache_status.upper()
+    return response
+
+def _process_agreement_batch(agreement_numbers):
+    """
+    Résout une liste de numéros d'agrément avec au plus une recherche par département
+    
+    Args:
+        agreement_numbers (list): Numéros d'agrément (doublons et casse ignorés)
+        
+    Returns:
+        tuple: (résultats par numéro dans l'ordre de la requête, départements interrogés)
+    """
+    numbers = list(dict.fromkeys(CenterIndex.normalize_agreement(number) for number in agreement_numbers))
+    results = {}
+    by_department = {}
+    
+    # D'abord l'index local, puis regroupement des numéros restants par département
+    for number in numbers:
+        if not number:
+            results[number] = _batch_error(number, 400, 'Numéro d\'agrément vide ou invalide')
+            continue
+        
+        indexed = center_index.lookup(number)
+        index_hit = bool(indexed and not indexed[2])
+        metrics.inc('utac_cache_requests_total', cache='index', kind='agreement', status='hit' if index_hit else 'miss')
+        if index_hit:
+            center, age, _ = indexed
+            results[number] = {
+                'agreement_number': number,
+                'success': True,
+                'status': 200,
+                'source': 'snapshot',
+                'snapshot_age_seconds': round(age, 1),
+                'data': _format_agreement_data(dict(center, url='Page de résultats'), number)
             }
-        })
+            continue
         
+        department_code = CenterIndex.department_of(number)
+        if not department_code:
+            results[number] = _batch_error(number, 400, 'Numéro d\'agrément invalide (département non reconnu)')
+            continue
+        by_department.setdefault(department_code, []).append(number)
+    
+    # Une recherche par département, plusieurs départements en parallèle
+    with ThreadPoolExecutor(max_workers=max(1, min(BATCH_WORKERS, len(by_department) or 1))) as executor:
+        department_results = dict(zip(by_department, executor.map(_batch_department_search, by_department)))
+    
+    for department_code, department_numbers in by_department.items():
+        result, cache_status = department_results[department_code]
+        
+        if result and 'error' in result:
+            status = 503 if upstream.breaker.is_open() else 502
+            for number in department_numbers:
+                results[number] = _batch_error(number, status, result['error'], department_code=department_code)
+            continue
+        
+        centers = {
+            CenterIndex.normalize_agreement(center.get('agreement_number')): center
+            for center in (result or {}).get('centers', [])
+        }
+        for number in department_numbers:
+            center = centers.get(number)
+            if not center:
+                results[number] = _batch_error(
+                    number, 404, 'Aucun centre avec ce numéro d\'agrément dans le département',
+                    department_code=department_code
+                )
+                continue
+            results[number] = {
+                'agreement_number': number,
+                'success': True,
+                'status': 200,
+                'source': 'live',
+                'cache': cache_status,
+                'data': _format_agreement_data(dict(center, url='Page de résultats'), number)
+            }
+    
+    return [results[number] for number in numbers], sorted(by_department)
+
+def _batch_department_search(department_code):
+    """Recherche d'un département pour un lot (une erreur n'interrompt pas les autres départements)"""
+    try:
+        result, cache_status = _cached_department_search(department_code)
     except Exception as e:
-        logger.error(f"Erreur lors de la recherche: {e}")
-        return jsonify({
-            'success': False,
-            'error': 'Erreur interne du serveur',
-            'details': str(e)
-        }), 500
+        logger.error(f"Erreur lors de la recherche du département {department_code}: {e}")
+        return {'error': str(e)}, 'miss'
+    metrics.inc('utac_cache_requests_total', cache='result', kind='department', status=cache_status)
+    return result, cache_status
+
+def _batch_error(agreement_number, status, error, **context):
+    """Résultat en erreur d'un numéro d'un lot"""
+    return dict({
+        'agreement_number': agreement_number,
+        'success': False,
+        'status': status,
+        'error': error
+    }, **context)
+
+def _internal_error(error):
+    """Réponse 500 d'une recherche ayant levé une exception"""
+    logger.error(f"Erreur lors de la recherche: {error}")
+    return jsonify({
+        'success': False,
+        'error': 'Erreur interne du serveur',
+        'details': str(error)
+    }), 500
+
+def _format_agreement_data(result, agreement_number):
+    """Met en forme les informations d'un centre pour la réponse agrément"""
+    return {
+        'agreement_number': result.get('agreement_number', agreement_number),
+        'raison_sociale': result.get('raison_sociale', ''),
+        'enseigne': result.get('enseigne', ''),
+        'adresse': result.get('adresse', ''),
+        'ville': result.get('ville', ''),
+        'code_postal': result.get('code_postal', ''),
+        'telephone': result.get('telephone', ''),
+        'option': result.get('option', ''),
+        'site_internet': result.get('site_internet', ''),
+        'url': result.get('url', '')
+    }
 
 @app.errorhandler(404)
 def not_found(error):
@@ -367,11 +1223,19 @@ def not_found(error):
         'available_endpoints': [
             '/',
             '/health',
+            '/metrics',
             '/agreement/<agreement_number>',
             '/agreement (POST)',
+            '/agreements (POST)',
             '/department/<department_code>',
             '/department (POST)',
-            '/all-centers'
+            '/centers',
+            '/postal/<prefix>',
+            '/all-centers',
+            '/all-centers/jobs (POST)',
+            '/all-centers/jobs/<job_id>',
+            '/all-centers/jobs/<job_id>/result',
+            '/changes?since=<timestamp>'
         ]
     }), 404
 
@@ -384,8 +1248,6 @@ def internal_error(error):
     }), 500
 
 if __name__ == '__main__':
-    import os
-    
     # Port dynamique pour Railway, Heroku, etc.
     port = int(os.environ.get('PORT', 5000))
     
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Point d'entrée ASGI de l'API UTAC-OTC
+
+Les recherches qui interrogent utac-otc.com (GET /agreement/<numéro> et
+GET /department/<code>) sont servies par des routes asynchrones s'appuyant sur
+AsyncUTACScraper : une requête en attente de utac-otc.com n'occupe ni thread ni
+processus, et un worker peut en avoir des centaines en cours. Toutes les autres
+routes (POST, streaming ndjson, crawl national, /changes, /metrics...) sont servies
+par l'application Flask de api.py, avec le même cache, le même index local, le même
+disjoncteur et les mêmes métriques.
+
+Le travail bloquant de ces routes (index local SQLite et son rechargement, cache de
+résultats, métriques, hooks Flask et compression de la réponse) s'exécute dans le pool
+de threads, jamais dans la boucle d'événements.
+
+Usage:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 2
+    gunicorn -k uvicorn.workers.UvicornWorker -w 2 asgi:app
+"""
+import io
+import os
+import sys
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import request
+
+import api
+from async_compat import to_thread
+from async_scraper import AsyncUTACScraper, DEFAULT_MAX_CONNECTIONS
+from center_index import CenterIndex
+
+# Connexions simultanées vers utac-otc.com par worker
+MAX_CONNECTIONS = int(os.environ.get('UTAC_ASYNC_MAX_CONNECTIONS', DEFAULT_MAX_CONNECTIONS))
+
+scraper = AsyncUTACScraper(transport=api.upstream, metrics=api.metrics, base_url=api.UPSTREAM_URL,
+                           max_connections=MAX_CONNECTIONS)
+
+flask_app = WsgiToAsgi(api.app)
+
+
+async def agreement(agreement_number):
+    """GET /agreement/<agreement_number> (voir api._process_agreement_request)"""
+    if not agreement_number.strip():
+        return api.jsonify({
+            'success': False,
+            'error': 'Numéro d\'agrément vide ou invalide'
+        }), 400
+
+    try:
+        api.logger.info(f"Recherche du numéro d'agrément: {agreement_number}")
+
+        # D'abord l'index local, le scraper seulement si absent ou périmé
+        indexed = await to_thread(api._agreement_from_index, agreement_number)
+        if indexed:
+            return indexed
+
+        agreement_number = agreement_number.strip()
+        result, cache_status = await api.result_cache.get_or_compute_async(
+            f"agreement:{CenterIndex.normalize_agreement(agreement_number)}",
+            lambda: scraper.search_by_agreement_number(agreement_number),
+            ttl=api.CACHE_TTL_AGREEMENT,
+            stale_ttl=api.CACHE_STALE_TTL,
+            cacheable=api._has_agreement_details,
+            refresh=lambda: to_thread(api._background_search, 'search_by_agreement_number', agreement_number)
+        )
+        return await to_thread(api._agreement_response, result, cache_status, agreement_number)
+
+    except Exception as e:
+        return api._internal_error(e)
+
+
+async def department(department_code):
+    """GET /department/<department_code> (voir api._process_department_request)"""
+    if not department_code.strip():
+        return api.jsonify({
+            'success': False,
+            'error': 'Code département vide ou invalide'
+        }), 400
+
+    try:
+        api.logger.info(f"Recherche du département: {department_code}")
+
+        # D'abord l'index local, le scraper seulement si absent ou périmé
+        department_code = api._normalize_department_code(department_code)
+        indexed = await to_thread(api._department_from_index, department_code)
+        if indexed:
+            return indexed
+
+        result, cache_status = await api.result_cache.get_or_compute_async(
+            f"department:{department_code}",
+            lambda: scraper.search_by_department(department_code),
+            ttl=api.CACHE_TTL_DEPARTMENT,
+            stale_ttl=api.CACHE_STALE_TTL,
+            cacheable=api._has_department_centers,
+            refresh=lambda: to_thread(api._background_search, 'search_by_department', department_code)
+        )
+        return await to_thread(api._department_response, result, cache_status, department_code)
+
+    except Exception as e:
+        return api._internal_error(e)
+
+
+# Routes servies en asynchrone (règle Flask -> handler)
+ASYNC_ROUTES = {
+    '/agreement/<string:agreement_number>': agreement,
+    '/department/<string:department_code>': department,
+}
+
+
+def _environ(scope):
+    """Environ WSGI d'une requête ASGI (routage, hooks et CORS de l'application Flask)"""
+    host, port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': host,
+        'SERVER_PORT': str(port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    for name, value in scope.get('headers', []):
+        key = name.decode('latin-1').upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = f"HTTP_{key}"
+        environ[key] = value.decode('latin-1')
+    return environ
+
+
+def _async_handler():
+    """Handler asynchrone de la requête courante, ou None si elle est servie par Flask"""
+    if request.method != 'GET' or request.url_rule is None:
+        return None
+    # Le streaming ndjson reste servi par Flask
+    if request.args.get('format') == 'ndjson':
+        return None
+    return ASYNC_ROUTES.get(request.url_rule.rule)
+
+
+def _finalize_response(response):
+    return api.app.process_response(api.app.make_response(response))
+
+
+async def _send_response(send, response):
+    headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers.items()]
+    await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': response.get_data()})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await scraper.aclose()
+            api.metrics.flush()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """Application ASGI"""
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+
+    response = None
+    if scope['type'] == 'http':
+        with api.app.request_context(_environ(scope)):
+            handler = _async_handler()
+            if handler:
+                # before_request / after_request de api.py : durée par endpoint, CORS, compression
+                response = await to_thread(api.app.preprocess_request)
+                if response is None:
+                    response = await handler(**request.view_args)
+                response = await to_thread(_finalize_response, response)
+
+    if response is None:
+        return await flask_app(scope, receive, send)
+    await _send_response(send, response)
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Compatibilité asyncio avec Python 3.8 (version minimale documentée)
+
+to_thread reprend asyncio.to_thread (Python 3.9+) : l'appel bloquant s'exécute dans
+le pool de threads par défaut de la boucle, avec une copie du contexte courant
+(contextvars) : session de recherche d'AsyncUTACScraper, contexte de requête Flask.
+"""
+import asyncio
+import contextvars
+import functools
+
+
+async def to_thread(func, *args, **kwargs):
+    """
+    Exécute un appel bloquant hors de la boucle d'événements
+
+    Args:
+        func (callable): Fonction à appeler
+        *args, **kwargs: Arguments de func
+
+    Returns:
+        Valeur renvoyée par func
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    return await loop.run_in_executor(None, call)
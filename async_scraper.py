@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Version asyncio du scraper UTAC-OTC
+
+AsyncUTACScraper expose les mêmes méthodes publiques que UTACScraper, en coroutines
+(search_by_agreement_number, search_by_department, get_all_french_centers) et en
+générateurs asynchrones (iter_department_centers, iter_department_pages). Le parsing
+et l'extraction sont ceux de UTACScraper ; seules les requêtes HTTP changent.
+
+Une recherche ASP.NET est liée à un cookie de session (pagination par postback) : chaque
+recherche en cours emprunte une "session de recherche" (client httpx avec son propre
+jeu de cookies et son gabarit de formulaire), rendue au pool à la fin de la recherche.
+Toutes les sessions d'une boucle d'événements partagent le même pool de connexions.
+Un processus peut ainsi avoir des centaines de requêtes upstream en cours sans un
+thread ni un processus par requête.
+"""
+import asyncio
+import contextvars
+import os
+import time
+import weakref
+from contextlib import asynccontextmanager
+
+import httpx
+
+from async_compat import to_thread
+from upstream import CircuitOpenError
+from utac_scraper import (
+    UTACScraper, UTACScraperError, _DepartmentCheckpoint, _NationalCrawl, USER_AGENT
+)
+
+# Erreurs réseau remontées par le transport asynchrone
+REQUEST_ERRORS = (httpx.HTTPError, CircuitOpenError)
+
+# Nombre maximal de connexions simultanées vers utac-otc.com par boucle d'événements
+DEFAULT_MAX_CONNECTIONS = 100
+
+# Session de recherche utilisée par la tâche courante
+_current_search = contextvars.ContextVar('utac_search_session', default=None)
+
+
+
+class _SearchSession:
+    """Client HTTP (cookies ASP.NET) et gabarit du formulaire d'une recherche"""
+
+    def __init__(self, client):
+        self.client = client
+        self.form_state = None
+        self.form_state_time = 0
+
+
+class AsyncUTACScraper(UTACScraper):
+    """
+    Scraper asyncio : une instance par processus, partagée par toutes les tâches.
+    Les ressources réseau sont propres à chaque boucle d'événements (et recréées après
+    un fork).
+    """
+
+    def __init__(self, *args, max_connections=DEFAULT_MAX_CONNECTIONS, **kwargs):
+        """
+        Args:
+            max_connections (int): Connexions simultanées maximales vers utac-otc.com
+            *args, **kwargs: Mêmes paramètres que UTACScraper
+        """
+        super().__init__(*args, **kwargs)
+        self.max_connections = max_connections
+        self._loops = weakref.WeakKeyDictionary()
+
+    def _new_worker_scraper(self):
+        worker = super()._new_worker_scraper()
+        worker.max_connections = self.max_connections
+        return worker
+
+    def _loop_state(self):
+        """Pool de connexions et sessions de recherche libres de la boucle courante"""
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None or state['pid'] != os.getpid():
+            transport = httpx.AsyncHTTPTransport(
+                verify=False,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections)
+            )
+            state = {'pid': os.getpid(), 'transport': transport, 'idle': []}
+            self._loops[loop] = state
+        return state
+
+    @asynccontextmanager
+    async def _search_session(self):
+        """Emprunte une session de recherche au pool (créée si aucune n'est libre)"""
+        state = self._loop_state()
+        if state['idle']:
+            search = state['idle'].pop()
+        else:
+            search = _SearchSession(httpx.AsyncClient(
+                transport=state['transport'],
+                headers={'User-Agent': USER_AGENT},
+                follow_redirects=True
+            ))
+        try:
+            yield search
+        finally:
+            state['idle'].append(search)
+
+    async def _in_search(self, search, awaitable):
+        """Exécute une étape de la recherche avec sa session (cookies et gabarit)"""
+        token = _current_search.set(search)
+        try:
+            return await awaitable
+        finally:
+            _current_search.reset(token)
+
+    async def aclose(self):
+        """Ferme les connexions de la boucle courante"""
+        state = self._loops.pop(asyncio.get_running_loop(), None)
+        if state:
+            await state['transport'].aclose()
+
+    # Le gabarit du formulaire suit la session de recherche, pas le thread
+    @property
+    def _form_state(self):
+        search = _current_search.get()
+        return search.form_state if search else None
+
+    @_form_state.setter
+    def _form_state(self, form_state):
+        search = _current_search.get()
+        if search:
+            search.form_state = form_state
+
+    @property
+    def _form_state_time(self):
+        search = _current_search.get()
+        return search.form_state_time if search else 0
+
+    @_form_state_time.setter
+    def _form_state_time(self, value):
+        search = _current_search.get()
+        if search:
+            search.form_state_time = value
+
+    async def _request(self, method, url, phase, **kwargs):
+        """Requête HTTP asynchrone via le transport (nouvelles tentatives, timeouts, disjoncteur)"""
+        search = _current_search.get()
+        if search is None:
+            async with self._search_session() as search:
+                return await self._in_search(search, self._request(method, url, phase, **kwargs))
+
+        try:
+            with self._phase(phase):
+                return await self.transport.request_async(search.client, method, url, priority=self.priority, **kwargs)
+        except REQUEST_ERRORS as e:
+            if self.metrics is not None:
+                self.metrics.inc('utac_upstream_errors_total', phase=phase, error=type(e).__name__)
+            raise
+
+    async def _parse_response(self, response, scope='page'):
+        """Parse hors de la boucle d'événements (le parsing d'une page prend des dizaines de ms)"""
+        return await to_thread(self._parse_html, response.content, scope)
+
+    async def get_page(self, url, scope='page', phase='page_get'):
+        try:
+            response = await self._request('GET', url, phase)
+            return await self._parse_response(response, scope)
+        except REQUEST_ERRORS as e:
+            print(f"Erreur lors de la récupération de la page: {e}")
+            return None
+
+    async def scrape_ct_search_page(self):
+        soup = await self.get_page(self.search_url)
+        if not soup:
+            return None
+        return self._describe_search_page(soup, self.search_url)
+
+    async def search_by_agreement_number(self, agreement_number):
+        """
+        Recherche un centre de contrôle technique par numéro d'agrément
+        """
+        async with self._search_session() as search:
+            return await self._in_search(search, self._search_agreement(agreement_number))
+
+    async def _search_agreement(self, agreement_number):
+        result_soup, error = await self._submit_search('Agrement', agreement_number)
+
+        if not result_soup:
+            print(error)
+            return None
+
+        return await self._parse_search_results(result_soup, agreement_number)
+
+    async def _get_search_form_state(self):
+        """Gabarit du formulaire de recherche de la session courante (voir UTACScraper)"""
+        if self._form_state and time.time() - self._form_state_time < self.form_state_ttl:
+            return self._form_state
+
+        soup = await self.get_page(self.search_url, scope='results', phase='form_get')
+        if not soup:
+            return None
+
+        return self._store_form_state(soup)
+
+    async def _submit_search(self, search_type, value):
+        """
+        Soumet une recherche sur Retrouver_un_CT.aspx (voir UTACScraper._submit_search)
+
+        Returns:
+            tuple: (BeautifulSoup de la page de résultats ou None, message d'erreur ou None)
+        """
+        for attempt in range(2):
+            cached_form_state = self._form_state
+            form_state = await self._get_search_form_state()
+            # Gabarit réutilisé, et non récupéré à l'instant (cache vide ou expiré)
+            from_cache = form_state is not None and form_state is cached_form_state
+
+            if not form_state:
+                return None, "Impossible de récupérer la page de recherche"
+            if 'error' in form_state:
+                return None, form_state['error']
+
+            form_data = self._build_search_form_data(form_state, search_type, value)
+
+            try:
+                response = await self._request('POST', self.search_url, 'search_post', data=form_data)
+                return await self._parse_response(response, scope='results'), None
+
+            except REQUEST_ERRORS as e:
+                self.invalidate_form_state()
+                if not from_cache or attempt == 1 or isinstance(e, CircuitOpenError):
+                    return None, f"Erreur lors de la recherche: {e}"
+                print(f"Erreur avec le formulaire en cache, nouvel essai: {e}")
+
+        return None, "Erreur lors de la recherche"
+
+    async def _parse_search_results(self, soup, agreement_number):
+        """Parse les résultats de recherche et trouve les informations"""
+        result, detail_url = self._results_or_detail_url(soup, agreement_number)
+        if result is not None:
+            return result
+
+        return await self._get_agreement_details(detail_url, agreement_number)
+
+    async def _get_agreement_details(self, detail_url, agreement_number):
+        """Récupère les détails du centre d'agrément"""
+        detail_soup = await self.get_page(detail_url, phase='detail_get')
+        if not detail_soup:
+            return {"error": "Impossible de récupérer la page de détail"}
+
+        return self._extract_agreement_details(detail_soup, detail_url, agreement_number)
+
+    async def search_by_department(self, department_code):
+        """
+        Recherche tous les centres de contrôle technique d'un département
+
+        Args:
+            department_code (str): Code du département (ex: "04", "75", "971")
+
+        Returns:
+            dict: Centres trouvés, ou dict avec 'error'
+        """
+        try:
+            all_centers = [center async for center in self.iter_department_centers(department_code)]
+        except UTACScraperError as e:
+            return {"error": str(e)}
+
+        return {
+            "department_code": department_code,
+            "total_centers": len(all_centers),
+            "centers": all_centers
+        }
+
+    async def iter_department_centers(self, department_code):
+        """
+        Génère les centres d'un département au fil de la pagination
+
+        Raises:
+            UTACScraperError: Code département invalide, recherche impossible ou
+                pagination interrompue
+        """
+        async for _, page_centers in self.iter_department_pages(department_code):
+            for center in page_centers:
+                yield center
+
+    async def iter_department_pages(self, department_code, start_page=1):
+        """
+        Génère les pages de résultats d'un département (voir UTACScraper.iter_department_pages)
+
+        La session de recherche est empruntée pour toute la pagination, et rendue au
+        pool à la fin du générateur (ou à sa fermeture anticipée).
+
+        Yields:
+            tuple: (numéro de page, liste des centres de la page)
+        """
+        if not self._validate_department_code(department_code):
+            raise UTACScraperError(f"Code département invalide: {department_code}")
+
+        async with self._search_session() as search:
+            result_soup, error = await self._in_search(search, self._submit_search('Departement', department_code))
+            if not result_soup:
+                raise UTACScraperError(error)
+
+            page_number = 1
+            if start_page > 1:
+                print(f"Reprise à la page {start_page}...")
+                result_soup = await self._in_search(search, self._navigate_to_page(result_soup, start_page))
+                if not result_soup:
+                    raise UTACScraperError(f"Impossible de reprendre à la page {start_page}")
+                page_number = start_page
+
+            total_centers = 0
+
+            while True:
+                print(f"Traitement de la page {page_number}...")
+
+                page = self._process_results_page(result_soup, department_code)
+                total_centers += len(page.centers)
+
+                yield page_number, page.centers
+
+                if not page.next_page_link:
+                    print(f"Pas de page suivante trouvée. Total: {total_centers} centres")
+                    break
+
+                # Sécurité : éviter les boucles infinies
+                if page_number >= 50:
+                    print("Limite de 50 pages atteinte, arrêt de la pagination")
+                    break
+
+                result_soup = await self._in_search(search, self._navigate_to_next_page(page, page.next_page_link))
+                if not result_soup:
+                    raise UTACScraperError(f"Erreur lors de la navigation vers la page {page_number + 1}")
+
+                page_number += 1
+
+    async def _navigate_to_page(self, soup, target_page):
+        """Atteint une page donnée en suivant les liens visibles du pager (voir UTACScraper)"""
+        page = self._read_results_page(soup)
+
+        while page.current_page != target_page:
+            link = page.hop(target_page)
+            if not link:
+                return None
+
+            soup = await self._navigate_to_next_page(page, link)
+            if not soup:
+                return None
+
+            new_page = self._read_results_page(soup)
+            if new_page.current_page <= page.current_page:
+                return None
+            page = new_page
+
+        return soup
+
+    async def _navigate_to_next_page(self, page, next_link):
+        """Navigue vers une page du pager en simulant le postback ASP.NET (voir UTACScraper)"""
+        form_data = self._postback_form_data(page, next_link)
+        if not form_data:
+            return None
+
+        try:
+            response = await self._request('POST', self.search_url, 'page_postback', data=form_data)
+            return await self._parse_response(response, scope='results')
+
+        except REQUEST_ERRORS as e:
+            print(f"Erreur lors de la navigation: {e}")
+            return None
+
+    async def _crawl_department(self, dept, output_dir, run_started_at=0, checkpoint_max_age=0):
+        """
+        Récupère un département pour le crawl national avec checkpoints
+        (voir UTACScraper._crawl_department)
+
+        Returns:
+            tuple: (liste des centres, statistiques du département, message d'erreur ou None)
+        """
+        checkpoint = _DepartmentCheckpoint(dept, output_dir, run_started_at, checkpoint_max_age)
+        if checkpoint.complete:
+            return checkpoint.reuse()
+
+        try:
+            try:
+                pages = self.iter_department_pages(dept, start_page=checkpoint.pages_completed + 1)
+                async for page_number, page_centers in pages:
+                    checkpoint.add_page(page_number, page_centers)
+
+            except UTACScraperError:
+                if not checkpoint.can_restart():
+                    raise
+                # Reprise impossible (pagination modifiée upstream) : repartir de la page 1
+                checkpoint.restart()
+                return await self._crawl_department(dept, output_dir, run_started_at, checkpoint_max_age)
+
+            return checkpoint.finish()
+
+        except UTACScraperError as e:
+            return checkpoint.failed(str(e))
+
+        except Exception as e:
+            return checkpoint.failed(str(e), status='exception')
+
+    async def get_all_french_centers(self, output_dir="/tmp/utac_departments", workers=1, progress_callback=None,
+                                     resume=True, checkpoint_max_age=24 * 3600):
+        """
+        Récupère tous les centres de contrôle technique de France
+        (voir UTACScraper.get_all_french_centers)
+
+        Les départements sont des tâches concurrentes, dont au plus `workers` sont en
+        cours à la fois. Annuler la coroutine (ou une erreur dans une tâche) annule tous
+        les départements en cours ; leurs checkpoints permettent de reprendre au prochain
+        appel.
+
+        Returns:
+            dict: Résultats complets avec statistiques
+        """
+        crawl = _NationalCrawl(self.list_french_departments(), output_dir, workers, progress_callback,
+                               resume, checkpoint_max_age)
+        semaphore = asyncio.Semaphore(crawl.workers)
+
+        async def crawl_department(dept):
+            async with semaphore:
+                result = await self._crawl_department(dept, output_dir, crawl.run_started_at, checkpoint_max_age)
+            crawl.record(dept, *result)
+
+        tasks = [asyncio.ensure_future(crawl_department(dept)) for dept in crawl.departments]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # gather n'annule pas les autres tâches : pas de département orphelin
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        # Assemblage et écriture du fichier final hors de la boucle d'événements
+        return await to_thread(crawl.finish)
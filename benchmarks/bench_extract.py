@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Benchmark de l'extraction des pages de résultats pendant la pagination
+
+Mesure, page par page, le temps CPU nécessaire pour tirer d'une page déjà parsée
+tout ce dont la pagination a besoin (centres, lien vers la page suivante, champs du
+postback) :
+- historique : un parcours par information (tableaux et lignes, liens puis spans du
+  pager, puis champs cachés du formulaire) et test d'appartenance au département
+  d'origine
+- un parcours : UTACScraper._read_results_page
+
+Le département de référence compte 50 pages (limite de pagination du scraper). Les
+centres extraits sont comparés aux centres attendus de chaque page : à partir de la
+page 11, l'extraction historique prenait la ligne du pager pour un centre.
+
+Usage:
+    python -m benchmarks.bench_extract [--pages 50] [--repeat 5]
+"""
+import argparse
+import re
+import statistics
+import time
+
+from utac_scraper import UTACScraper
+from benchmarks.fixtures import generate_centers, render_results_page, PAGE_SIZE
+
+DEPARTMENT = '13'
+
+CONFIGURATIONS = [
+    ('lxml (zones utiles)', 'lxml', True),
+    ('html.parser (page entière)', 'html.parser', False),
+]
+
+
+def _legacy_is_department_row(row_text, department_code):
+    """Test d'appartenance historique (liste de 1000 codes postaux construite à chaque ligne)"""
+    dept_num = int(department_code)
+    if dept_num <= 95:
+        dept_formatted = f"{dept_num:02d}"
+        # Liste construite puis ignorée, comme dans le code historique : son coût fait partie de la mesure
+        [f"{dept_formatted}{i:03d}" for i in range(1000)]
+        return any(postal in row_text for postal in [dept_formatted + str(d) for d in range(10)])
+    return department_code in row_text
+
+
+def legacy_extract(scraper, soup, department_code):
+    """Extraction historique : un parcours de l'arbre par information"""
+    centers = []
+    for table in soup.find_all('table'):
+        for row in table.find_all('tr'):
+            cells = row.find_all(['td', 'th'])
+            if len(cells) >= 8:
+                row_text = ' '.join([cell.get_text().strip() for cell in cells])
+                if _legacy_is_department_row(row_text, department_code):
+                    center = scraper._extract_center_from_row(cells)
+                    if center:
+                        centers.append(center)
+
+    links = {}
+    for link in soup.find_all('a', href=lambda href: href and '__doPostBack' in href and 'Page$' in href):
+        match = re.search(r"Page\$(\d+)", link.get('href', ''))
+        if match:
+            links.setdefault(int(match.group(1)), link)
+    current_page = 1
+    for span in soup.find_all('span'):
+        text = span.get_text().strip()
+        if text.isdigit() and span.parent and span.parent.name != 'a':
+            current_page = int(text)
+            break
+    next_link = links.get(current_page + 1)
+
+    form_data = None
+    if next_link is not None:
+        form = scraper._find_aspnet_form(soup)
+        form_data = {inp.get('name'): inp.get('value', '')
+                     for inp in form.find_all('input', {'type': 'hidden'}) if inp.get('name')}
+    return centers, next_link.get('href') if next_link else None, form_data
+
+
+def single_pass_extract(scraper, soup, department_code):
+    page = scraper._read_results_page(soup, department_code)
+    form_data = dict(page.hidden_fields) if page.next_page_link else None
+    return page.centers, page.next_page_link, form_data
+
+
+def bench(scraper, soups, extract, repeat):
+    durations = []
+    outputs = []
+    for soup in soups:
+        for _ in range(repeat):
+            started = time.process_time()
+            output = extract(scraper, soup, DEPARTMENT)
+            durations.append(time.process_time() - started)
+        outputs.append(output)
+    return durations, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de l'extraction des pages de résultats")
+    parser.add_argument('--pages', type=int, default=50, help="Nombre de pages du département")
+    parser.add_argument('--repeat', type=int, default=5, help="Répétitions par page")
+    args = parser.parse_args()
+
+    centers = generate_centers(DEPARTMENT, count=args.pages * PAGE_SIZE)
+    pages = [render_results_page(centers, page_number=n).encode('utf-8') for n in range(1, args.pages + 1)]
+
+    print(f"=== Benchmark extraction: département {DEPARTMENT}, {args.pages} pages, "
+          f"{sum(len(p) for p in pages) / len(pages) / 1024:.0f} Ko/page ===")
+    print()
+    expected = [[c['agreement_number'] for c in centers[(n - 1) * PAGE_SIZE:n * PAGE_SIZE]]
+                for n in range(1, args.pages + 1)]
+    print(f"{'Configuration':<28} {'Extraction':<12} {'CPU moy. (ms)':>14} {'p50 (ms)':>9} "
+          f"{f'total {args.pages} p. (ms)':>17} {'centres':>8} {'parasites':>10}")
+
+    for label, backend, scoped in CONFIGURATIONS:
+        scraper = UTACScraper(parser=backend, scoped_parsing=scoped)
+        soups = [scraper._parse_html(content, scope='results') for content in pages]
+
+        results = {}
+        for name, extract in (('historique', legacy_extract), ('un parcours', single_pass_extract)):
+            durations, outputs = bench(scraper, soups, extract, args.repeat)
+            results[name] = (durations, outputs)
+            mean = statistics.mean(durations) * 1000
+            extracted = [[c['agreement_number'] for c in output[0]] for output in outputs]
+            found = sum(len([n for n in page if n in wanted]) for page, wanted in zip(extracted, expected))
+            spurious = sum(len(page) for page in extracted) - found
+            print(f"{label:<28} {name:<12} {mean:>14.2f} {statistics.median(durations) * 1000:>9.2f} "
+                  f"{mean * args.pages:>17.1f} {found:>8} {spurious:>10}")
+
+        legacy, single = results['historique'], results['un parcours']
+        correct = [[c['agreement_number'] for c in output[0]] for output in single[1]] == expected
+        same_pager = [output[1:] for output in legacy[1]] == [output[1:] for output in single[1]]
+        print(f"{'':<28} x{statistics.mean(legacy[0]) / statistics.mean(single[0]):.1f} plus rapide, "
+              f"centres {'exacts ✅' if correct else 'INEXACTS ❌'}, "
+              f"pager et postback {'identiques ✅' if same_pager else 'DIFFÉRENTS ❌'}")
+
+
+if __name__ == "__main__":
+    main()
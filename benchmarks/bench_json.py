@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la sérialisation JSON (json_codec) des réponses et fichiers du crawl
+
+Deux charges : un département (réponse de GET /department/<code>, dept_XX.json) et
+le snapshot national (GET /all-centers, all_french_centers.json), comparées entre :
+- json indenté (ancien format des fichiers du crawl),
+- jsonify par défaut de Flask (json compact, ASCII échappé, clés triées),
+- chaque backend de json_codec installé, compact, compact à clés triées (réponses
+  de l'API) et indenté (?pretty=true, UTAC_JSON_PRETTY=1).
+
+Mesures : meilleure durée de sérialisation sur --repeat essais et taille produite.
+
+Usage:
+    python -m benchmarks.bench_json [--department 29] [--repeat 5] [--json resultats.json]
+"""
+import argparse
+import json
+import time
+
+import json_codec
+from utac_scraper import UTACScraper
+from benchmarks.fixtures import generate_centers
+
+
+def payloads(department):
+    """Réponses département et nationale construites à partir des centres de référence"""
+    centers = []
+    for dept in UTACScraper.list_french_departments():
+        for center in generate_centers(dept):
+            center['department'] = dept
+            centers.append(center)
+    dept_centers = [center for center in centers if center['department'] == department]
+    return {
+        f'department_{department}': {
+            'success': True,
+            'source': 'snapshot',
+            'snapshot_age_seconds': 42.0,
+            'data': {'department_code': department, 'total_centers': len(dept_centers), 'centers': dept_centers}
+        },
+        'national': {
+            'success': True,
+            'source': 'snapshot',
+            'snapshot_age_seconds': 42.0,
+            'timestamp': time.time(),
+            'data': {'total_centers': len(centers), 'centers': centers}
+        }
+    }
+
+
+def serializers():
+    """(libellé, fonction objet -> bytes)"""
+    yield 'json indent=2 (historique)', lambda obj: json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+    yield 'jsonify Flask (défaut)', lambda obj: json.dumps(obj, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    for name, backend in json_codec.BACKENDS.items():
+        yield f'{name} compact', lambda obj, b=backend: b.dumps(obj)
+        yield f'{name} compact clés triées', lambda obj, b=backend: b.dumps(obj, sort_keys=True)
+        yield f'{name} indenté', lambda obj, b=backend: b.dumps(obj, pretty=True)
+
+
+def measure(serialize, obj, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        data = serialize(obj)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return {'ms': round(best * 1000, 2), 'kb': round(len(data) / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la sérialisation JSON")
+    parser.add_argument('--department', default='29',
+                        help="Département de la charge département (défaut : le plus grand des centres de référence)")
+    parser.add_argument('--repeat', type=int, default=5, help="Essais par mesure (meilleur retenu)")
+    parser.add_argument('--json', help="Fichier où enregistrer les résultats")
+    args = parser.parse_args()
+
+    workloads = payloads(args.department)
+    print(f"=== Sérialisation JSON: backends disponibles {', '.join(json_codec.BACKENDS)}, "
+          f"défaut {json_codec.backend.name} ===")
+    print()
+    header = f"{'Sérialiseur':<30}"
+    for name, obj in workloads.items():
+        header += f" {name + ' (ms)':>22} {'(Ko)':>8}"
+    print(header)
+
+    results = {}
+    for label, serialize in serializers():
+        results[label] = {name: measure(serialize, obj, args.repeat) for name, obj in workloads.items()}
+        line = f"{label:<30}"
+        for name in workloads:
+            line += f" {results[label][name]['ms']:>22.2f} {results[label][name]['kb']:>8.1f}"
+        print(line)
+
+    print()
+    print(f"{workloads['national']['data']['total_centers']} centres au niveau national, "
+          f"{workloads[f'department_{args.department}']['data']['total_centers']} dans le département {args.department}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'parameters': vars(args), 'results': results}, f, indent=2)
+        print(f"📁 Résultats enregistrés dans {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark des backends de parsing HTML du scraper
+
+Compare, page par page, le temps de parsing (+ extraction des centres et du pager)
+et le pic mémoire des configurations :
+- html.parser, page entière (comportement historique)
+- lxml, page entière
+- lxml, zones utiles uniquement (champs de formulaire + tableaux)
+
+Usage:
+    python -m benchmarks.bench_parser [--pages DIR] [--repeat N]
+
+Sans --pages, utilise les pages de référence de benchmarks/fixtures.py.
+Avec --pages, utilise les fichiers *.html capturés dans DIR.
+"""
+import argparse
+import glob
+import os
+import statistics
+import time
+import tracemalloc
+
+from utac_scraper import UTACScraper
+from benchmarks.fixtures import sample_pages
+
+CONFIGURATIONS = [
+    ('html.parser (page entière)', 'html.parser', False),
+    ('lxml (page entière)', 'lxml', False),
+    ('lxml (zones utiles)', 'lxml', True),
+]
+
+
+def load_pages(pages_dir=None):
+    if not pages_dir:
+        return sample_pages()
+    pages = []
+    for path in sorted(glob.glob(os.path.join(pages_dir, '*.html'))):
+        with open(path, 'rb') as f:
+            pages.append((os.path.basename(path), f.read()))
+    return pages
+
+
+def _process(scraper, content):
+    """Parsing + extraction, comme pour chaque page de la pagination"""
+    soup = scraper._parse_html(content, scope='results')
+    centers = _all_rows(scraper, soup)
+    return centers, scraper._read_results_page(soup).next_page_link
+
+
+def _all_rows(scraper, soup):
+    """Extrait toutes les lignes de centres, sans filtre de département"""
+    rows = []
+    for tr in soup.find_all('tr'):
+        cells = tr.find_all(['td', 'th'])
+        if len(cells) >= 8:
+            center = scraper._extract_center_from_row(cells)
+            if center:
+                rows.append(center)
+    return rows
+
+
+def bench_configuration(parser, scoped, pages, repeat):
+    scraper = UTACScraper(parser=parser, scoped_parsing=scoped)
+
+    parse_times = []
+    total_times = []
+    peak_memory = []
+    outputs = []
+
+    for _, content in pages:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            scraper._parse_html(content, scope='results')
+            parse_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            output = _process(scraper, content)
+            total_times.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        scraper._parse_html(content, scope='results')
+        peak_memory.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+        outputs.append(output)
+
+    return {
+        'parse_ms_mean': statistics.mean(parse_times) * 1000,
+        'parse_ms_p50': statistics.median(parse_times) * 1000,
+        'total_ms_mean': statistics.mean(total_times) * 1000,
+        'peak_kb_mean': statistics.mean(peak_memory) / 1024,
+        'peak_kb_max': max(peak_memory) / 1024,
+        'outputs': outputs
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des backends de parsing")
+    parser.add_argument('--pages', help="Répertoire de pages HTML capturées (*.html)")
+    parser.add_argument('--repeat', type=int, default=5, help="Répétitions par page")
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages)
+    if not pages:
+        print("Aucune page à analyser")
+        return
+
+    total_bytes = sum(len(content) for _, content in pages)
+    print(f"=== Benchmark parsing: {len(pages)} pages, {total_bytes / len(pages) / 1024:.0f} Ko/page en moyenne ===")
+    print()
+    print(f"{'Configuration':<28} {'parse moy.':>11} {'parse p50':>10} {'+extraction':>12} {'pic mém. moy.':>14} {'pic max':>10}")
+
+    results = {}
+    for label, backend, scoped in CONFIGURATIONS:
+        results[label] = bench_configuration(backend, scoped, pages, args.repeat)
+        r = results[label]
+        print(f"{label:<28} {r['parse_ms_mean']:>8.2f} ms {r['parse_ms_p50']:>7.2f} ms {r['total_ms_mean']:>9.2f} ms "
+              f"{r['peak_kb_mean']:>10.0f} Ko {r['peak_kb_max']:>7.0f} Ko")
+
+    baseline_label = CONFIGURATIONS[0][0]
+    baseline = results[baseline_label]
+    print()
+    for label, _, _ in CONFIGURATIONS[1:]:
+        r = results[label]
+        same = r['outputs'] == baseline['outputs']
+        print(f"{label}: x{baseline['total_ms_mean'] / r['total_ms_mean']:.1f} plus rapide, "
+              f"pic mémoire x{baseline['peak_kb_mean'] / r['peak_kb_mean']:.1f} plus faible, "
+              f"résultats {'identiques ✅' if same else 'DIFFÉRENTS ❌'}")
+
+
+if __name__ == "__main__":
+    main()
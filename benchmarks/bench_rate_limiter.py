@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark du limiteur de débit global (rate_limiter.RateLimiter)
+
+Plusieurs processus (workers gunicorn simulés) se partagent un même seau :
+- des threads de crawl demandent des jetons en continu (priorité crawl),
+- des threads interactifs demandent un jeton à intervalles aléatoires (priorité
+  interactive), comme des recherches /agreement.
+
+Mesures : débit total obtenu par rapport au débit configuré, pire fenêtre d'une
+seconde (le débit ne doit jamais dépasser rate + burst), attente p50/p99 par classe
+de priorité, et coût d'un try_acquire (verrou fcntl + lecture/écriture de l'état).
+
+Usage:
+    python -m benchmarks.bench_rate_limiter [--rate 20] [--burst 5] [--processes 4]
+        [--duration 5]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from rate_limiter import RateLimiter, PRIORITY_INTERACTIVE, PRIORITY_CRAWL
+
+
+def _worker(path, rate, burst, duration, crawl_threads, interactive_threads, results):
+    limiter = RateLimiter(path, rate=rate, burst=burst)
+    deadline = time.time() + duration
+    events = []
+    lock = threading.Lock()
+
+    def crawl():
+        while time.time() < deadline:
+            waited = limiter.acquire(PRIORITY_CRAWL)
+            with lock:
+                events.append((time.time(), PRIORITY_CRAWL, waited))
+
+    def interactive():
+        rng = random.Random()
+        while time.time() < deadline:
+            time.sleep(rng.uniform(0.1, 0.5))
+            waited = limiter.acquire(PRIORITY_INTERACTIVE)
+            with lock:
+                events.append((time.time(), PRIORITY_INTERACTIVE, waited))
+
+    threads = [threading.Thread(target=crawl) for _ in range(crawl_threads)]
+    threads += [threading.Thread(target=interactive) for _ in range(interactive_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put(events)
+
+
+def _percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du limiteur de débit global")
+    parser.add_argument('--rate', type=float, default=20, help="Requêtes par seconde autorisées")
+    parser.add_argument('--burst', type=int, default=5, help="Taille du seau")
+    parser.add_argument('--processes', type=int, default=4, help="Processus partageant le seau")
+    parser.add_argument('--crawl-threads', type=int, default=2, help="Threads de crawl par processus")
+    parser.add_argument('--interactive-threads', type=int, default=1, help="Threads interactifs par processus")
+    parser.add_argument('--duration', type=float, default=5, help="Durée (secondes)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'upstream_rate.state')
+
+        limiter = RateLimiter(os.path.join(tmp, 'cost.state'), rate=1e9, burst=1e9)
+        started = time.perf_counter()
+        for _ in range(10000):
+            limiter.try_acquire()
+        cost_us = (time.perf_counter() - started) / 10000 * 1e6
+
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        processes = [
+            context.Process(target=_worker, args=(path, args.rate, args.burst, args.duration,
+                                                  args.crawl_threads, args.interactive_threads, results))
+            for _ in range(args.processes)
+        ]
+        started = time.time()
+        for process in processes:
+            process.start()
+        events = []
+        for _ in processes:
+            events.extend(results.get())
+        for process in processes:
+            process.join()
+
+    events.sort()
+    elapsed = max(t for t, _, _ in events) - started
+    worst_window = max(
+        sum(1 for t, _, _ in events if start <= t < start + 1)
+        for start, _, _ in events
+    )
+    print(f"=== Limiteur de débit: {args.processes} processus x ({args.crawl_threads} crawl + "
+          f"{args.interactive_threads} interactif), rate={args.rate:g}/s, burst={args.burst} ===")
+    print()
+    print(f"Débit obtenu       : {len(events) / elapsed:.1f} req/s ({len(events)} jetons en {elapsed:.1f}s)")
+    print(f"Pire fenêtre de 1 s : {worst_window} req (plafond rate + burst = {args.rate + args.burst:g})")
+    print(f"Coût try_acquire   : {cost_us:.1f} µs")
+    print()
+    print(f"{'Priorité':<12} {'requêtes':>9} {'attente p50 (ms)':>17} {'p99 (ms)':>9} {'max (ms)':>9}")
+    for priority in (PRIORITY_INTERACTIVE, PRIORITY_CRAWL):
+        waits = [w * 1000 for _, p, w in events if p == priority]
+        print(f"{priority:<12} {len(waits):>9} {statistics.median(waits) if waits else 0:>17.1f} "
+              f"{_percentile(waits, 0.99):>9.1f} {max(waits, default=0):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Benchmark de bout en bout du scraper contre le serveur de rejeu local
+
+Mesure, sans solliciter utac-otc.com :
+- search_by_department : latence par département (p50/p99), pages/s et centres/s
+- search_by_agreement_number : latence par recherche (p50/p99)
+- get_all_french_centers : débit du crawl national sur un sous-ensemble de
+  départements, en séquentiel et avec N workers
+- AsyncUTACScraper.search_by_department : tous les départements en parallèle sur une
+  seule boucle d'événements
+
+Usage:
+    python -m benchmarks.bench_scraper [--latency 0.05] [--jitter 0.02] [--repeat 3]
+        [--departments 04,13,44,75,971] [--workers 4] [--json resultats.json]
+
+La latence simulée permet de reproduire le coût réseau de utac-otc.com ; avec
+--latency 0, le benchmark mesure le coût CPU du scraper (parsing, extraction).
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import statistics
+import tempfile
+import time
+
+from utac_scraper import UTACScraper
+from async_scraper import AsyncUTACScraper
+from benchmarks.fixtures import generate_centers, PAGE_SIZE
+from benchmarks.replay_server import ReplayServer
+
+DEFAULT_DEPARTMENTS = '04,13,44,75,971'
+
+
+def percentile(values, p):
+    """Percentile par rang le plus proche"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _quiet(func, *args, **kwargs):
+    """Exécute une méthode du scraper sans ses print()"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def _report(durations, elapsed, server, centers):
+    pages = server.requests.get('search', 0) + server.requests.get('postback', 0)
+    return {
+        'calls': len(durations),
+        'elapsed_seconds': round(elapsed, 3),
+        'p50_ms': round(percentile(durations, 50) * 1000, 1),
+        'p99_ms': round(percentile(durations, 99) * 1000, 1),
+        'mean_ms': round(statistics.mean(durations) * 1000, 1),
+        'pages': pages,
+        'pages_per_second': round(pages / elapsed, 1) if elapsed else 0,
+        'centers': centers,
+        'centers_per_second': round(centers / elapsed, 1) if elapsed else 0,
+        'upstream_requests': dict(server.requests)
+    }
+
+
+def bench_departments(server, departments, repeat):
+    scraper = UTACScraper(base_url=server.url)
+    server.reset_counts()
+    durations = []
+    centers = 0
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for dept in departments:
+            call_started = time.perf_counter()
+            result = _quiet(scraper.search_by_department, dept)
+            durations.append(time.perf_counter() - call_started)
+            if 'error' in result:
+                raise RuntimeError(f"Département {dept}: {result['error']}")
+            expected = len(generate_centers(dept))
+            if result['total_centers'] != expected:
+                raise RuntimeError(f"Département {dept}: {result['total_centers']} centres au lieu de {expected}")
+            centers += result['total_centers']
+
+    return _report(durations, time.perf_counter() - started, server, centers)
+
+
+def bench_departments_async(server, departments, repeat):
+    async def run():
+        scraper = AsyncUTACScraper(base_url=server.url)
+
+        async def search(dept):
+            call_started = time.perf_counter()
+            result = await scraper.search_by_department(dept)
+            durations.append(time.perf_counter() - call_started)
+            if 'error' in result:
+                raise RuntimeError(f"Département {dept}: {result['error']}")
+            return result['total_centers']
+
+        try:
+            return sum(await asyncio.gather(*(search(dept) for _ in range(repeat) for dept in departments)))
+        finally:
+            await scraper.aclose()
+
+    server.reset_counts()
+    durations = []
+    started = time.perf_counter()
+    centers = _quiet(asyncio.run, run())
+    return _report(durations, time.perf_counter() - started, server, centers)
+
+
+def bench_agreements(server, departments, repeat):
+    scraper = UTACScraper(base_url=server.url)
+    agreements = [center['agreement_number'] for dept in departments for center in generate_centers(dept)[:5]]
+    server.reset_counts()
+    durations = []
+    found = 0
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for agreement_number in agreements:
+            call_started = time.perf_counter()
+            result = _quiet(scraper.search_by_agreement_number, agreement_number)
+            durations.append(time.perf_counter() - call_started)
+            if result and 'error' not in result:
+                found += 1
+
+    report = _report(durations, time.perf_counter() - started, server, found)
+    if found != len(durations):
+        raise RuntimeError(f"{len(durations) - found} agréments introuvables")
+    return report
+
+
+class _SubsetScraper(UTACScraper):
+    """Crawl national restreint aux départements du benchmark"""
+    departments = []
+
+    @classmethod
+    def list_french_departments(cls):
+        return list(cls.departments)
+
+
+def bench_national(server, departments, workers):
+    _SubsetScraper.departments = departments
+    scraper = _SubsetScraper(base_url=server.url)
+    server.reset_counts()
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        started = time.perf_counter()
+        result = _quiet(scraper.get_all_french_centers, output_dir, workers=workers, resume=False)
+        elapsed = time.perf_counter() - started
+
+    if result['errors']:
+        raise RuntimeError(f"Erreurs du crawl: {result['errors']}")
+    durations = [stats['duration_seconds'] for stats in result['department_statistics'].values()]
+    return _report(durations, elapsed, server, result['data']['total_centers'])
+
+
+def _print_line(label, r):
+    print(f"{label:<34} {r['calls']:>6} {r['p50_ms']:>9.1f} {r['p99_ms']:>9.1f} "
+          f"{r['pages_per_second']:>9.1f} {r['centers_per_second']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de bout en bout du scraper (serveur de rejeu local)")
+    parser.add_argument('--latency', type=float, default=0.05, help="Latence simulée par réponse (secondes)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Gigue ajoutée à la latence (secondes)")
+    parser.add_argument('--repeat', type=int, default=3, help="Répétitions des recherches")
+    parser.add_argument('--departments', default=DEFAULT_DEPARTMENTS, help="Départements utilisés (séparés par des virgules)")
+    parser.add_argument('--workers', type=int, default=4, help="Workers du crawl national concurrent")
+    parser.add_argument('--json', help="Fichier où enregistrer les résultats (comparaison entre deux runs)")
+    args = parser.parse_args()
+
+    departments = [d.strip() for d in args.departments.split(',') if d.strip()]
+    total_pages = sum(math.ceil(len(generate_centers(d)) / PAGE_SIZE) for d in departments)
+
+    with ReplayServer(latency=args.latency, jitter=args.jitter) as server:
+        print(f"=== Benchmark scraper: {len(departments)} départements ({total_pages} pages), "
+              f"latence {args.latency * 1000:.0f} ms ± {args.jitter * 1000:.0f} ms, serveur {server.url} ===")
+        print()
+        print(f"{'Scénario':<34} {'appels':>6} {'p50 (ms)':>9} {'p99 (ms)':>9} {'pages/s':>9} {'centres/s':>10}")
+
+        results = {}
+        results['search_by_department'] = bench_departments(server, departments, args.repeat)
+        _print_line('search_by_department', results['search_by_department'])
+
+        results['search_by_department_async'] = bench_departments_async(server, departments, args.repeat)
+        _print_line('search_by_department (asyncio)', results['search_by_department_async'])
+
+        results['search_by_agreement_number'] = bench_agreements(server, departments, args.repeat)
+        _print_line('search_by_agreement_number', results['search_by_agreement_number'])
+
+        results['get_all_french_centers'] = bench_national(server, departments, 1)
+        _print_line('get_all_french_centers (1 worker)', results['get_all_french_centers'])
+
+        if args.workers > 1:
+            key = f'get_all_french_centers_{args.workers}_workers'
+            results[key] = bench_national(server, departments, args.workers)
+            _print_line(f'get_all_french_centers ({args.workers} workers)', results[key])
+
+    print()
+    print("p50/p99 : latence par appel (par département pour le crawl national)")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                'parameters': vars(args),
+                'total_pages': total_pages,
+                'results': results
+            }, f, indent=2)
+        print(f"📁 Résultats enregistrés dans {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Benchmark du chargement de l'index local selon le format du snapshot national
+
+Compare, pour l'ensemble des centres de référence (tous les départements) :
+- all_french_centers.json indenté (format historique)
+- all_french_centers.json compact
+- centers.sqlite3 (SnapshotStore)
+
+Mesures : taille du fichier, durée de CenterIndex.load(), mémoire résidente du
+processus après chargement (chaque format dans un processus neuf), latence de
+CenterIndex.lookup(), de CenterIndex.filter() (recherches multi-critères de
+GET /centers) et de CenterIndex.by_postal_prefix() (GET /postal/<prefix>), après
+construction des index inversés.
+
+Usage:
+    python -m benchmarks.bench_snapshot [--lookups 10000] [--json resultats.json]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from utac_scraper import UTACScraper
+from snapshot_store import SnapshotStore, SNAPSHOT_DB
+from benchmarks.fixtures import generate_centers
+
+# Recherches multi-critères représentatives de GET /centers
+FILTERS = [
+    {'department': '13', 'enseigne': 'AUTOSUR'},
+    {'option': 'GAZ', 'department': '44'},
+    {'ville': 'METZ', 'option': 'ELECTRIQUE'},
+    {'code_postal': '44230'},
+    {'department': '75'},
+]
+
+# Préfixes de GET /postal/<prefix>
+POSTAL_PREFIXES = ['4', '44', '440', '44230', '75016', '971', '97', '13']
+
+FORMATS = [
+    ('json_indent', 'JSON indenté (historique)'),
+    ('json_compact', 'JSON compact'),
+    ('sqlite', 'SQLite (centers.sqlite3)'),
+]
+
+
+def all_centers():
+    centers = []
+    for dept in UTACScraper.list_french_departments():
+        for center in generate_centers(dept):
+            center['department'] = dept
+            centers.append(center)
+    return centers
+
+
+def write_snapshot(fmt, snapshot_dir, centers, timestamp):
+    """Écrit le snapshot national au format donné et renvoie son chemin"""
+    os.makedirs(snapshot_dir, exist_ok=True)
+    if fmt == 'sqlite':
+        store = SnapshotStore.in_directory(snapshot_dir)
+        store.write(centers, timestamp)
+        return store.path
+
+    path = os.path.join(snapshot_dir, 'all_french_centers.json')
+    payload = {'success': True, 'timestamp': timestamp, 'data': {'total_centers': len(centers), 'centers': centers}}
+    with open(path, 'w', encoding='utf-8') as f:
+        if fmt == 'json_indent':
+            json.dump(payload, f, indent=2, ensure_ascii=False)
+        else:
+            json.dump(payload, f, ensure_ascii=False, separators=(',', ':'))
+    return path
+
+
+def _rss_kb():
+    """Mémoire résidente courante du processus (Ko)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(snapshot_dir, lookups):
+    """Charge l'index dans le processus courant (appelé dans un processus neuf)"""
+    from center_index import CenterIndex
+
+    rss_before = _rss_kb()
+    index = CenterIndex(snapshot_dir)
+    started = time.perf_counter()
+    total = index.load()
+    load_seconds = time.perf_counter() - started
+    rss_after = _rss_kb()
+
+    rng = random.Random(0)
+    numbers = [center['agreement_number'] for center in all_centers()]
+    sample = [rng.choice(numbers) for _ in range(lookups)]
+    started = time.perf_counter()
+    for number in sample:
+        if index.lookup(number) is None:
+            raise RuntimeError(f"{number} introuvable")
+    lookup_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    index.filter({})
+    build_seconds = time.perf_counter() - started
+    filters = [FILTERS[i % len(FILTERS)] for i in range(lookups // 10)]
+    started = time.perf_counter()
+    for criteria in filters:
+        index.filter(criteria)
+    filter_seconds = time.perf_counter() - started
+    rss_filter = _rss_kb()
+
+    prefixes = [POSTAL_PREFIXES[i % len(POSTAL_PREFIXES)] for i in range(lookups // 10)]
+    started = time.perf_counter()
+    for prefix in prefixes:
+        index.by_postal_prefix(prefix)
+    postal_seconds = time.perf_counter() - started
+
+    return {
+        'total_centers': total,
+        'load_ms': round(load_seconds * 1000, 1),
+        'rss_delta_mb': round((rss_after - rss_before) / 1024, 1),
+        'lookup_us': round(lookup_seconds / lookups * 1e6, 2),
+        'inverted_build_ms': round(build_seconds * 1000, 1),
+        'filter_us': round(filter_seconds / len(filters) * 1e6, 1),
+        'rss_with_filters_mb': round((rss_filter - rss_before) / 1024, 1),
+        'postal_us': round(postal_seconds / len(prefixes) * 1e6, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du format du snapshot national")
+    parser.add_argument('--lookups', type=int, default=10000, help="Recherches par numéro d'agrément")
+    parser.add_argument('--json', help="Fichier où enregistrer les résultats")
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.lookups)))
+        return
+
+    centers = all_centers()
+    timestamp = time.time()
+    print(f"=== Benchmark snapshot: {len(centers)} centres ===")
+    print()
+    print(f"{'Format':<28} {'taille (Ko)':>11} {'load (ms)':>10} {'RSS (Mo)':>9} {'lookup (µs)':>12} "
+          f"{'index inv. (ms)':>15} {'filter (µs)':>12} {'RSS filtres (Mo)':>17} {'postal (µs)':>12}")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt, label in FORMATS:
+            snapshot_dir = os.path.join(tmp, fmt)
+            path = write_snapshot(fmt, snapshot_dir, centers, timestamp)
+            # Processus neuf : mémoire et caches non partagés entre formats
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_snapshot', '--measure', snapshot_dir,
+                 '--lookups', str(args.lookups)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            result['file_kb'] = round(os.path.getsize(path) / 1024, 1)
+            results[fmt] = result
+            print(f"{label:<28} {result['file_kb']:>11.1f} {result['load_ms']:>10.1f} "
+                  f"{result['rss_delta_mb']:>9.1f} {result['lookup_us']:>12.2f} "
+                  f"{result['inverted_build_ms']:>15.1f} {result['filter_us']:>12.1f} {result['rss_with_filters_mb']:>17.1f} {result['postal_us']:>12.1f}")
+
+    print()
+    print(f"RSS : mémoire résidente ajoutée par CenterIndex.load() ; {SNAPSHOT_DB} est lu à la demande")
+    print("filter, postal : page de 50 centres au plus, index construits à la première recherche")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'parameters': vars(args), 'total_centers': len(centers), 'results': results}, f, indent=2)
+        print(f"📁 Résultats enregistrés dans {args.json}")
+
+
+if __name__ == "__main__":
+    main()
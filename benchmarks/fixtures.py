@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Pages Retrouver_un_CT.aspx de référence pour les benchmarks
+
+Génère des pages au format de la page SharePoint d'utac-otc.com (formulaire
+aspnetForm, __VIEWSTATE volumineux, navigation, GridView de résultats à 9 colonnes
+et pager __doPostBack('...','Page$N')). Les centres sont déterministes pour un
+département donné, ce qui permet de comparer les résultats entre deux runs.
+
+Des pages réellement capturées peuvent être utilisées à la place : voir l'option
+--pages des scripts de benchmark.
+"""
+import base64
+import random
+from html import escape
+
+GRID_TARGET = "ctl00$m$g_6f1c2d4e$ctl00$gvResultats"
+PAGE_SIZE = 10
+
+ENSEIGNES = ['AUTOSUR', 'DEKRA', 'SECURITEST', 'AUTO SECURITE', 'NORISKO', 'CONTROLE TECHNIQUE', 'VERIF AUTO']
+VOIES = ['AVENUE DE LA REPUBLIQUE', 'ROUTE DE PARIS', 'RUE DU COMMERCE', 'ZAC DES GRIPOTS', 'BOULEVARD GAMBETTA']
+VILLES = ['ST SEBASTIEN SUR LOIRE', 'BARCELONNETTE', 'AIX EN PROVENCE', 'LA GARDE', 'VILLEURBANNE', 'METZ', 'REZE']
+OPTIONS = ['', '', 'GAZ*', 'GAZ', 'GAZ - ELECTRIQUE']
+
+
+def generate_centers(department_code, count=None):
+    """
+    Génère les centres (déterministes) d'un département
+
+    Args:
+        department_code (str): Code du département ("04", "971"...)
+        count (int): Nombre de centres, par défaut dépend du département
+
+    Returns:
+        list: Centres au format produit par UTACScraper._extract_center_from_row
+    """
+    rng = random.Random(f"utac-{department_code}")
+    if count is None:
+        count = rng.randint(20, 110)
+
+    dept_num = int(department_code)
+    centers = []
+    for i in range(count):
+        if dept_num >= 971:
+            code_postal = f"{dept_num}{rng.randint(0, 99):02d}"
+        else:
+            code_postal = f"{dept_num:02d}{rng.randint(0, 999):03d}"
+        enseigne = rng.choice(ENSEIGNES)
+        centers.append({
+            'raison_sociale': f"{enseigne} {rng.choice(VILLES)} {i}",
+            'agreement_number': f"S{dept_num % 1000:03d}{chr(65 + i % 26)}{i:03d}",
+            'enseigne': enseigne,
+            'adresse': f"{rng.randint(1, 400)} {rng.choice(VOIES)}",
+            'ville': rng.choice(VILLES),
+            'code_postal': code_postal,
+            'telephone': f"0{rng.randint(1, 5)} {rng.randint(10, 99)} {rng.randint(10, 99)} {rng.randint(10, 99)} {rng.randint(10, 99)}",
+            'option': rng.choice(OPTIONS),
+            'site_internet': ''
+        })
+    return centers
+
+
+def _viewstate(seed, size=48000):
+    rng = random.Random(seed)
+    return base64.b64encode(bytes(rng.getrandbits(8) for _ in range(size * 3 // 4))).decode()
+
+
+def _chrome():
+    """En-tête, scripts et navigation SharePoint (bruit autour des zones utiles)"""
+    scripts = ''.join(
+        f'<script type="text/javascript">var g_{i} = {{"a": {i}, "b": "{"x" * 400}"}};</script>\n'
+        for i in range(40)
+    )
+    menu_items = []
+    for i in range(30):
+        sub_items = ''.join(f'<li><a href="/p/{i}/{j}.aspx"><span>Sous-rubrique {j}</span></a></li>' for j in range(8))
+        menu_items.append(
+            f'<li class="static"><a class="static menu-item" href="/vehicule_leger/Pages/page_{i}.aspx">'
+            f'<span class="additional-background"><span class="menu-item-text">Rubrique {i}</span></span></a>'
+            f'<ul>{sub_items}</ul></li>'
+        )
+    menu = ''.join(menu_items)
+    return scripts, menu
+
+
+def render_page(results_html='', viewstate_seed='search', event_validation=True):
+    """Rend une page Retrouver_un_CT.aspx complète autour d'un bloc de résultats"""
+    scripts, menu = _chrome()
+    hidden = [
+        ('__REQUESTDIGEST', '0x' + 'AB' * 64 + ',18 Oct 2026 10:00:00 -0000'),
+        ('__VIEWSTATE', _viewstate(viewstate_seed)),
+        ('__VIEWSTATEGENERATOR', 'BAB98CB3'),
+    ]
+    if event_validation:
+        hidden.append(('__EVENTVALIDATION', _viewstate(viewstate_seed + '-ev', 2000)))
+    footer = '<p>Mentions légales UTAC-OTC</p>' * 20
+    hidden_html = ''.join(
+        f'<input type="hidden" name="{name}" id="{name}" value="{escape(value)}" />\n' for name, value in hidden
+    )
+    return f'''<!DOCTYPE html>
+<html dir="ltr" lang="fr-FR">
+<head><meta http-equiv="X-UA-Compatible" content="IE=10" />
+<title>Retrouver un centre de contrôle technique</title>
+{scripts}
+<link rel="stylesheet" type="text/css" href="/_layouts/15/1036/styles/Themable/corev15.css"/>
+</head>
+<body>
+<form method="post" action="./Retrouver_un_CT.aspx" id="aspnetForm">
+<div class="aspNetHidden">
+<input type="hidden" name="__EVENTTARGET" id="__EVENTTARGET" value="" />
+<input type="hidden" name="__EVENTARGUMENT" id="__EVENTARGUMENT" value="" />
+{hidden_html}</div>
+<div id="s4-workspace"><div id="s4-bodyContainer">
+<div class="ms-breadcrumb-top"><ul class="root static">{menu}</ul></div>
+<div class="left-nav"><div class="nav">{menu}</div></div>
+<div class="content">
+<div class="recherche">
+<select name="ctl00$m$g_6f1c2d4e$ctl00$ddlCritereField" id="ddlCritereField">
+<option value="Agrement">Agrément</option><option value="Departement">Département</option>
+<option value="Ville">Ville</option><option value="CodePostal">Code postal</option>
+</select>
+<input name="ctl00$m$g_6f1c2d4e$ctl00$critereValueInput" type="text" id="critereValueInput" />
+<input type="submit" name="ctl00$m$g_6f1c2d4e$ctl00$btnRechercher" value="Rechercher" id="btnRechercher" />
+</div>
+{results_html}
+</div>
+<div class="footer">{footer}</div>
+</div></div>
+</form>
+</body>
+</html>'''
+
+
+def _center_row(center):
+    return (
+        '<tr>'
+        f'<td>{escape(center["raison_sociale"])}</td>'
+        f'<td>{center["agreement_number"]}</td>'
+        f'<td style="display:none;">{escape(center["enseigne"])}</td>'
+        f'<td>{escape(center["adresse"])}</td>'
+        f'<td>{escape(center["ville"])} {center["code_postal"]}</td>'
+        f'<td style="display:none;">{center["telephone"]}</td>'
+        f'<td>{escape(center["option"])}</td>'
+        f'<td style="display:none;">{escape(center["site_internet"])}</td>'
+        f'<td><a href="Detail_CT.aspx?agrement={center["agreement_number"]}">Voir le détail</a></td>'
+        '</tr>\n'
+    )
+
+
+def render_results_page(centers, page_number=1, page_size=PAGE_SIZE):
+    """
+    Rend la page N des résultats d'une recherche
+
+    Args:
+        centers (list): Tous les centres de la recherche
+        page_number (int): Page à rendre (à partir de 1)
+        page_size (int): Nombre de lignes par page du GridView
+
+    Returns:
+        str: HTML de la page complète
+    """
+    total_pages = max(1, (len(centers) + page_size - 1) // page_size)
+    page_centers = centers[(page_number - 1) * page_size:page_number * page_size]
+
+    header = (
+        '<tr><th>Raison sociale</th><th>Agrément</th><th style="display:none;">Enseigne</th>'
+        '<th>Adresse</th><th>Ville</th><th style="display:none;">Tél</th><th>Option</th>'
+        '<th style="display:none;">Site internet</th><th>Détails</th></tr>\n'
+    )
+    rows = ''.join(_center_row(center) for center in page_centers)
+
+    pager = ''
+    if total_pages > 1:
+        # Pager ASP.NET : 10 numéros visibles, "..." pour les blocs suivants
+        block_start = (page_number - 1) // 10 * 10 + 1
+        cells = []
+        if block_start > 1:
+            cells.append(f'<td><a href="javascript:__doPostBack(\'{GRID_TARGET}\',\'Page${block_start - 1}\')">...</a></td>')
+        for n in range(block_start, min(block_start + 10, total_pages + 1)):
+            if n == page_number:
+                cells.append(f'<td><span>{n}</span></td>')
+            else:
+                cells.append(f'<td><a href="javascript:__doPostBack(\'{GRID_TARGET}\',\'Page${n}\')">{n}</a></td>')
+        if block_start + 10 <= total_pages:
+            cells.append(f'<td><a href="javascript:__doPostBack(\'{GRID_TARGET}\',\'Page${block_start + 10}\')">...</a></td>')
+        pager = f'<tr class="pager"><td colspan="9"><table><tr>{"".join(cells)}</tr></table></td></tr>\n'
+
+    results_html = (
+        f'<div class="resultats"><p>{len(centers)} centre(s) trouvé(s)</p>'
+        f'<table class="gvResultats" id="gvResultats" cellspacing="0" border="1">\n{header}{rows}{pager}</table></div>'
+    )
+    return render_page(results_html, viewstate_seed=f'results-{page_number}')
+
+
+def render_detail_page(center):
+    """Rend la page de détail d'un centre"""
+    detail_html = (
+        '<div class="detail">'
+        f'<div>Enseigne : {escape(center["enseigne"])}</div>'
+        f'<div>Adresse : {escape(center["adresse"])}</div>'
+        f'<div>Ville : {escape(center["ville"])} {center["code_postal"]}</div>'
+        f'<div>Tél : {center["telephone"]}</div>'
+        '</div>'
+    )
+    return render_page(detail_html, viewstate_seed=f'detail-{center["agreement_number"]}')
+
+
+def sample_pages(departments=('04', '13', '44', '75', '971'), pages_per_department=3):
+    """
+    Jeu de pages de résultats pour les benchmarks de parsing
+
+    Returns:
+        list: Tuples (nom, contenu en bytes)
+    """
+    pages = [('search.html', render_page().encode('utf-8'))]
+    for dept in departments:
+        centers = generate_centers(dept)
+        total_pages = (len(centers) + PAGE_SIZE - 1) // PAGE_SIZE
+        for page_number in range(1, min(pages_per_department, total_pages) + 1):
+            pages.append((
+                f'dept_{dept}_page_{page_number}.html',
+                render_results_page(centers, page_number).encode('utf-8')
+            ))
+    return pages
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Serveur local rejouant Retrouver_un_CT.aspx pour les benchmarks
+
+Sert les pages de benchmarks/fixtures.py comme le ferait utac-otc.com : page de
+recherche (GET), recherche par département ou par agrément (POST), pagination par
+postback ASP.NET (__EVENTARGUMENT=Page$N) et pages de détail. La recherche en cours
+est associée au cookie de session ASP.NET_SessionId, comme côté SharePoint. Une
+latence (et une gigue) configurable est ajoutée à chaque réponse.
+
+Usage:
+    python -m benchmarks.replay_server [--port 8081] [--latency 0.2] [--jitter 0.05]
+
+L'API peut alors être pointée dessus avec UTAC_UPSTREAM_URL=http://127.0.0.1:8081.
+"""
+import argparse
+import random
+import threading
+import time
+import uuid
+from functools import lru_cache
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.fixtures import generate_centers, render_page, render_results_page, render_detail_page
+
+SEARCH_PATH = '/vehicule_leger/Pages/Retrouver_un_CT.aspx'
+DETAIL_PATH = '/vehicule_leger/Pages/Detail_CT.aspx'
+
+
+def _department_of(agreement_number):
+    """Département d'un numéro d'agrément généré par les fixtures (S044A000 -> 44)"""
+    number = agreement_number.strip().upper()
+    if len(number) < 4 or not number[1:4].isdigit():
+        return None
+    dept_num = int(number[1:4])
+    return f"{dept_num:02d}" if dept_num <= 95 else str(dept_num)
+
+
+def find_center(agreement_number):
+    """Centre des fixtures correspondant à un numéro d'agrément, ou None"""
+    dept = _department_of(agreement_number)
+    if not dept:
+        return None
+    for center in generate_centers(dept):
+        if center['agreement_number'] == agreement_number.strip().upper():
+            return center
+    return None
+
+
+@lru_cache(maxsize=None)
+def _search_page():
+    return render_page().encode('utf-8')
+
+
+@lru_cache(maxsize=4096)
+def _department_page(department_code, page_number):
+    return render_results_page(generate_centers(department_code), page_number).encode('utf-8')
+
+
+@lru_cache(maxsize=4096)
+def _agreement_page(agreement_number):
+    center = find_center(agreement_number)
+    return render_results_page([center] if center else []).encode('utf-8')
+
+
+@lru_cache(maxsize=4096)
+def _detail_page(agreement_number):
+    center = find_center(agreement_number)
+    return render_detail_page(center).encode('utf-8') if center else None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _session_id(self):
+        cookie = SimpleCookie(self.headers.get('Cookie', ''))
+        return cookie['ASP.NET_SessionId'].value if 'ASP.NET_SessionId' in cookie else None
+
+    def _send(self, status, body, kind, session_id=None):
+        self.server.replay.wait()
+        self.server.replay.count(kind)
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if session_id:
+            self.send_header('Set-Cookie', f'ASP.NET_SessionId={session_id}; path=/; HttpOnly')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == SEARCH_PATH:
+            session_id = None if self._session_id() else uuid.uuid4().hex
+            return self._send(200, _search_page(), 'form', session_id)
+        if url.path == DETAIL_PATH:
+            agreement = parse_qs(url.query).get('agrement', [''])[0]
+            body = _detail_page(agreement)
+            if body:
+                return self._send(200, body, 'detail')
+        self._send(404, b'Not Found', 'not_found')
+
+    def do_POST(self):
+        if urlparse(self.path).path != SEARCH_PATH:
+            return self._send(404, b'Not Found', 'not_found')
+
+        length = int(self.headers.get('Content-Length', 0))
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode('utf-8'), keep_blank_values=True).items()}
+        if '__VIEWSTATE' not in form:
+            return self._send(500, b'Validation of viewstate MAC failed', 'error')
+
+        session_id = self._session_id() or uuid.uuid4().hex
+        argument = form.get('__EVENTARGUMENT', '')
+
+        # Postback du pager : rejouer la recherche de la session
+        if argument.startswith('Page$'):
+            department = self.server.replay.sessions.get(session_id)
+            if not department:
+                return self._send(500, b'Session expired', 'error')
+            return self._send(200, _department_page(department, int(argument.split('$')[1])), 'postback')
+
+        search_type = next((v for k, v in form.items() if k.endswith('ddlCritereField')), '')
+        value = next((v for k, v in form.items() if k.endswith('critereValueInput')), '').strip()
+
+        if search_type == 'Departement':
+            department = value.zfill(2)
+            self.server.replay.sessions[session_id] = department
+            return self._send(200, _department_page(department, 1), 'search', session_id)
+        if search_type == 'Agrement':
+            return self._send(200, _agreement_page(value.upper()), 'search', session_id)
+        self._send(200, render_results_page([]).encode('utf-8'), 'search', session_id)
+
+
+class ReplayServer:
+    def __init__(self, latency=0.0, jitter=0.0, host='127.0.0.1', port=0):
+        """
+        Args:
+            latency (float): Latence ajoutée à chaque réponse (secondes)
+            jitter (float): Gigue aléatoire ajoutée à la latence (secondes, uniforme)
+            host (str): Adresse d'écoute
+            port (int): Port d'écoute (0 : port libre choisi par le système)
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.sessions = {}
+        self.requests = {}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.replay = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def wait(self):
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def count(self, kind):
+        with self._lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+
+    def reset_counts(self):
+        with self._lock:
+            self.requests = {}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur de rejeu de Retrouver_un_CT.aspx")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help="Latence par réponse (secondes)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Gigue ajoutée à la latence (secondes)")
+    args = parser.parse_args()
+
+    server = ReplayServer(args.latency, args.jitter, args.host, args.port)
+    print(f"🎞️  Rejeu de utac-otc.com sur {server.url} (latence {args.latency * 1000:.0f} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
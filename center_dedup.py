@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Dédoublonnage et normalisation des centres en fin de crawl national
+
+La recherche par département de utac-otc.com est approximative et l'appartenance
+d'une ligne au département est décidée sur le texte de la ligne : un même centre
+peut remonter dans deux départements, ou sous un département qui n'est pas celui de
+son code postal. Avant d'écrire le snapshot, les centres sont donc :
+- normalisés (espaces, casse, code postal sur 5 chiffres),
+- dédoublonnés par numéro d'agrément,
+- rattachés au département de leur code postal.
+
+Les centres sont tenus en colonnes (une liste par champ) plutôt qu'en dictionnaires,
+et ne redeviennent des dictionnaires qu'à la sortie (CenterColumns.to_centers).
+"""
+from snapshot_store import CENTER_COLUMNS
+
+# Champs mis en majuscules (le site publie en majuscules, avec quelques exceptions)
+UPPER_COLUMNS = ('agreement_number', 'raison_sociale', 'enseigne', 'adresse', 'ville', 'option')
+
+
+def normalize_text(value):
+    """Espaces de début/fin supprimés et espaces multiples réduits à un seul"""
+    return ' '.join(str(value or '').split())
+
+
+def normalize_postal_code(code_postal):
+    """
+    Code postal sur 5 chiffres ("4400" -> "04400"), ou None s'il n'en est pas un
+
+    Les codes des départements d'outre-mer (97100-98999) sont déjà sur 5 chiffres.
+    """
+    code_postal = str(code_postal or '').replace(' ', '')
+    if not code_postal.isdigit() or not 4 <= len(code_postal) <= 5:
+        return None
+    return code_postal.zfill(5)
+
+
+def department_from_postal(code_postal):
+    """
+    Département d'un code postal ("44230" -> "44", "97122" -> "971")
+
+    Returns:
+        str: Code département au format de UTACScraper.list_french_departments, ou None
+    """
+    code_postal = normalize_postal_code(code_postal)
+    if not code_postal:
+        return None
+    if code_postal.startswith(('97', '98')):
+        return code_postal[:3]
+    if code_postal.startswith('00'):
+        return None
+    return code_postal[:2]
+
+
+def normalize_values(center):
+    """
+    Champs d'un centre normalisés, dans l'ordre de CENTER_COLUMNS
+
+    Le département n'est pas rattaché à celui du code postal (voir CenterColumns.add).
+    """
+    values = [normalize_text(center.get(column)) for column in CENTER_COLUMNS]
+    for i, column in enumerate(CENTER_COLUMNS):
+        if column in UPPER_COLUMNS:
+            values[i] = values[i].upper()
+    postal_index = CENTER_COLUMNS.index('code_postal')
+    values[postal_index] = normalize_postal_code(values[postal_index]) or values[postal_index]
+    return values
+
+
+def normalize_center(center):
+    """Centre normalisé comme en fin de crawl (snapshots écrits avant la normalisation)"""
+    return dict(center, **dict(zip(CENTER_COLUMNS, normalize_values(center))))
+
+
+class CenterColumns:
+    def __init__(self, departments=None):
+        """
+        Args:
+            departments (list): Départements auxquels un centre peut être rattaché
+                (départements récupérés avec succès) ; tous si None
+        """
+        self.columns = {column: [] for column in CENTER_COLUMNS}
+        self.departments = set(departments) if departments is not None else None
+        # Numéro d'agrément -> indice de ligne
+        self._rows = {}
+        # Ligne trouvée dans le département de son code postal / rattachée à un autre département
+        self._at_home = []
+        self._reassigned = []
+        self._counts = {
+            'input_centers': 0,
+            'duplicates_removed': 0,
+            'missing_agreement': 0
+        }
+
+    def __len__(self):
+        return len(self._at_home)
+
+    @property
+    def stats(self):
+        """Centres reçus, doublons supprimés, centres rattachés à un autre département..."""
+        return dict(self._counts, departments_reassigned=sum(self._reassigned))
+
+    def add(self, center, crawl_department):
+        """
+        Ajoute un centre du crawl, normalisé, sauf s'il est déjà présent
+
+        Un doublon remplace la ligne existante s'il a été trouvé dans le département de
+        son code postal et pas elle.
+
+        Args:
+            center (dict): Centre extrait par UTACScraper
+            crawl_department (str): Département dont la recherche a renvoyé le centre
+        """
+        self._counts['input_centers'] += 1
+        values = normalize_values(center)
+        agreement_index = CENTER_COLUMNS.index('agreement_number')
+        postal_index = CENTER_COLUMNS.index('code_postal')
+        department_index = CENTER_COLUMNS.index('department')
+
+        if not values[agreement_index]:
+            self._counts['missing_agreement'] += 1
+            return
+
+        department = department_from_postal(values[postal_index])
+        at_home = department == crawl_department
+        reassigned = bool(department) and not at_home and (self.departments is None or department in self.departments)
+        values[department_index] = department if reassigned else crawl_department
+
+        row = self._rows.get(values[agreement_index])
+        if row is None:
+            self._rows[values[agreement_index]] = len(self._at_home)
+            self._at_home.append(at_home)
+            self._reassigned.append(reassigned)
+            for column, value in zip(CENTER_COLUMNS, values):
+                self.columns[column].append(value)
+            return
+
+        self._counts['duplicates_removed'] += 1
+        if at_home and not self._at_home[row]:
+            self._at_home[row] = True
+            self._reassigned[row] = False
+            for column, value in zip(CENTER_COLUMNS, values):
+                self.columns[column][row] = value
+
+    def rows(self):
+        """Lignes dans l'ordre de CENTER_COLUMNS"""
+        return zip(*(self.columns[column] for column in CENTER_COLUMNS))
+
+    def to_centers(self):
+        """Centres sous forme de dictionnaires (fichier JSON, flux de changements)"""
+        return [dict(zip(CENTER_COLUMNS, row)) for row in self.rows()]
+
+
+def dedupe_centers(centers_by_department, departments=None):
+    """
+    Normalise et dédoublonne les centres d'un crawl national
+
+    Args:
+        centers_by_department (iterable): Tuples (département du crawl, liste des centres)
+        departments (list): Départements auxquels un centre peut être rattaché
+
+    Returns:
+        CenterColumns: Centres dédoublonnés, avec les statistiques dans .stats
+    """
+    columns = CenterColumns(departments)
+    for crawl_department, centers in centers_by_department:
+        for center in centers:
+            columns.add(center, crawl_department)
+    return columns
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Index local des centres de contrôle technique
+
+Construit à partir des snapshots produits par UTACScraper.get_all_french_centers
+pour répondre aux recherches par numéro d'agrément sans aller-retour vers
+utac-otc.com. Le snapshot national SQLite (centers.sqlite3) est interrogé à la
+demande, sans être chargé en mémoire ; à défaut, all_french_centers.json est lu.
+Seul le dernier snapshot complet est servi : les fichiers dept_*.json d'un crawl en
+cours ou en erreur sont ignorés.
+
+Des index inversés (valeur -> numéros d'agrément) sur les champs extraits par
+UTACScraper._extract_center_from_row répondent aux recherches multi-critères
+(CenterIndex.filter) sans parcourir les centres, et un tableau trié des codes postaux
+répond aux recherches par préfixe (CenterIndex.by_postal_prefix) par dichotomie.
+"""
+import bisect
+import os
+import re
+import time
+import threading
+
+import json_codec
+from snapshot_store import SnapshotStore, SNAPSHOT_DB
+from center_dedup import normalize_postal_code
+
+DEFAULT_SNAPSHOT_DIR = "/tmp/utac_departments"
+DEFAULT_MAX_AGE = 7 * 24 * 3600  # Une semaine
+
+# Champs filtrables par CenterIndex.filter
+FILTER_FIELDS = ('department', 'code_postal', 'ville', 'enseigne', 'option')
+
+
+def normalize_filter_value(field, value):
+    """
+    Clés d'index d'une valeur de champ (casse et espaces ignorés)
+
+    L'option est découpée en mots : "GAZ*" et "GAZ - ELECTRIQUE" répondent tous
+    deux à option=GAZ.
+
+    Returns:
+        list: Clés d'index (plusieurs pour l'option, aucune pour une valeur vide)
+    """
+    value = ' '.join(str(value or '').split()).upper()
+    if field == 'option':
+        return re.findall(r'[A-Z0-9]+', value)
+    if field == 'code_postal':
+        value = normalize_postal_code(value) or value
+    if field == 'department' and value.isdigit() and len(value) == 1:
+        value = f"0{value}"
+    return [value] if value else []
+
+
+class _InvertedIndex:
+    """Index inversés champ -> valeur normalisée -> numéros d'agrément, et codes postaux triés"""
+
+    def __init__(self):
+        self.postings = {field: {} for field in FILTER_FIELDS}
+        self.all_keys = []
+        # (code postal, numéro d'agrément), trié pour les recherches par préfixe
+        self.postal = []
+
+    def add(self, key, center):
+        for field in FILTER_FIELDS:
+            value = center.get(field)
+            if field == 'department' and not value:
+                value = CenterIndex.department_of(key)
+            for term in normalize_filter_value(field, value):
+                self.postings[field].setdefault(term, set()).add(key)
+        self.all_keys.append(key)
+        code_postal = normalize_postal_code(center.get('code_postal'))
+        if code_postal:
+            self.postal.append((code_postal, key))
+
+    def finish(self):
+        self.all_keys.sort()
+        self.postal.sort()
+        return self
+
+    def postal_range(self, prefix):
+        """
+        Bornes [début, fin[ dans self.postal des codes postaux commençant par prefix
+
+        Deux dichotomies : O(log n) quel que soit le nombre de centres correspondants.
+        """
+        # '~' est supérieur à tous les chiffres : borne haute de tous les codes du préfixe
+        return bisect.bisect_left(self.postal, (prefix,)), bisect.bisect_left(self.postal, (prefix + '~',))
+
+    def match(self, criteria):
+        """
+        Numéros d'agrément correspondant à tous les critères, triés
+
+        Args:
+            criteria (dict): Champ -> valeur recherchée
+        """
+        postings = []
+        for field, value in criteria.items():
+            terms = normalize_filter_value(field, value)
+            if not terms:
+                continue
+            for term in terms:
+                posting = self.postings[field].get(term)
+                if not posting:
+                    return []
+                postings.append(posting)
+        if not postings:
+            return self.all_keys
+
+        # Intersection en partant de la liste la plus courte
+        postings.sort(key=len)
+        smallest, others = postings[0], postings[1:]
+        return sorted(key for key in smallest if all(key in posting for posting in others))
+
+
+class CenterIndex:
+    def __init__(self, snapshot_dir=DEFAULT_SNAPSHOT_DIR, max_age=DEFAULT_MAX_AGE, check_interval=30):
+        """
+        Args:
+            snapshot_dir (str): Répertoire contenant les snapshots du crawl
+            max_age (int): Âge maximal (secondes) au-delà duquel une entrée est périmée
+            check_interval (int): Intervalle minimal (secondes) entre deux vérifications
+                des fichiers sur disque
+        """
+        self.snapshot_dir = snapshot_dir
+        self.max_age = max_age
+        self.check_interval = check_interval
+        self.by_agreement = {}
+        self.store = None
+        self.store_timestamp = None
+        self.total_centers = 0
+        self.snapshot_timestamp = None
+        self._inverted = None
+        self._signature = None
+        self._last_check = 0
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    @staticmethod
+    def normalize_agreement(agreement_number):
+        """Normalise un numéro d'agrément pour servir de clé d'index"""
+        return (agreement_number or '').strip().upper()
+
+    @staticmethod
+    def department_of(agreement_number):
+        """
+        Département encodé dans un numéro d'agrément (S044C203 -> "44", S971A001 -> "971")
+
+        Returns:
+            str: Code département au format de UTACScraper.list_french_departments,
+                ou None si le numéro n'a pas le format attendu
+        """
+        number = CenterIndex.normalize_agreement(agreement_number)
+        if len(number) < 5 or not number[0].isalpha() or not number[1:4].isdigit():
+            return None
+        dept_num = int(number[1:4])
+        if 1 <= dept_num <= 95:
+            return f"{dept_num:02d}"
+        if 971 <= dept_num <= 989:
+            return str(dept_num)
+        return None
+
+    def _snapshot_files(self):
+        """Liste les fichiers de snapshot avec leur date de modification"""
+        files = []
+        try:
+            with os.scandir(self.snapshot_dir) as entries:
+                for entry in entries:
+                    if entry.name in ('all_french_centers.json', SNAPSHOT_DB):
+                        files.append((entry.name, entry.stat().st_mtime))
+        except FileNotFoundError:
+            return []
+        return sorted(files)
+
+    def _read_json(self, filename):
+        try:
+            return json_codec.read_file(os.path.join(self.snapshot_dir, filename))
+        except (OSError, ValueError) as e:
+            print(f"Snapshot illisible {filename}: {e}")
+            return None
+
+    def load(self):
+        """
+        (Re)construit l'index depuis les snapshots
+
+        Le snapshot national SQLite, ou à défaut all_french_centers.json (crawls
+        antérieurs), publiés uniquement par un crawl terminé sans erreur.
+
+        Returns:
+            int: Nombre de centres indexés
+        """
+        files = self._snapshot_files()
+        names = {name for name, _ in files}
+        by_agreement = {}
+        base_timestamp = None
+        store = None
+
+        if SNAPSHOT_DB in names:
+            store = SnapshotStore.in_directory(self.snapshot_dir)
+            try:
+                base_timestamp = store.timestamp()
+            except Exception as e:
+                print(f"Snapshot illisible {SNAPSHOT_DB}: {e}")
+                store = None
+
+        if store is None and 'all_french_centers.json' in names:
+            snapshot = self._read_json('all_french_centers.json')
+            if snapshot and snapshot.get('success'):
+                base_timestamp = snapshot.get('timestamp')
+                for center in snapshot.get('data', {}).get('centers', []):
+                    key = self.normalize_agreement(center.get('agreement_number'))
+                    if key:
+                        by_agreement[key] = (center, base_timestamp)
+
+        total_centers = store.count() if store is not None else len(by_agreement)
+        indexed = store is not None or bool(by_agreement)
+
+        with self._lock:
+            self.by_agreement = by_agreement
+            self.store = store
+            self.store_timestamp = base_timestamp if store is not None else None
+            self.total_centers = total_centers
+            self.snapshot_timestamp = (base_timestamp or None) if indexed else None
+            self._inverted = None
+            self._signature = files
+            self._last_check = time.time()
+
+        return total_centers
+
+    def refresh_if_changed(self):
+        """Recharge l'index si les snapshots ont changé sur disque (au plus toutes les check_interval secondes)"""
+        now = time.time()
+        if self._signature is not None and now - self._last_check < self.check_interval:
+            return False
+
+        self._last_check = now
+        if self._snapshot_files() == self._signature:
+            return False
+
+        self.load()
+        return True
+
+    def version(self):
+        """
+        Version des snapshots chargés : fichiers et dates de modification
+
+        Returns:
+            list: Identique tant que les snapshots ne changent pas sur disque
+        """
+        self.refresh_if_changed()
+        return self._signature
+
+    def snapshot_age(self):
+        """Âge (secondes) de l'entrée la plus ancienne de l'index, None si l'index est vide"""
+        self.refresh_if_changed()
+        if self.snapshot_timestamp is None:
+            return None
+        return time.time() - self.snapshot_timestamp
+
+    def lookup(self, agreement_number):
+        """
+        Recherche un centre dans l'index
+
+        Args:
+            agreement_number (str): Numéro d'agrément
+
+        Returns:
+            tuple: (centre, âge en secondes, périmé) ou None si absent de l'index
+        """
+        self.refresh_if_changed()
+
+        key = self.normalize_agreement(agreement_number)
+        entry = self.by_agreement.get(key)
+        if not entry and self.store is not None:
+            center = self.store.get(key)
+            entry = (center, self.store_timestamp) if center else None
+        if not entry:
+            return None
+
+        center, timestamp = entry
+        age = time.time() - timestamp if timestamp else None
+        stale = age is None or age > self.max_age
+        return center, age, stale
+
+    def department(self, department_code):
+        """
+        Centres d'un département dans l'index
+
+        Args:
+            department_code (str): Code département normalisé ("04", "971")
+
+        Returns:
+            tuple: (centres par numéro d'agrément croissant, âge en secondes de l'entrée
+                la plus ancienne, périmé) ou None si le département est absent de l'index
+        """
+        self.refresh_if_changed()
+
+        by_agreement, store_timestamp = self.by_agreement, self.store_timestamp
+        keys = self._inverted_index().match({'department': department_code})
+        if not keys:
+            return None
+
+        timestamps = [by_agreement[key][1] if key in by_agreement else store_timestamp for key in keys]
+        age = time.time() - min(timestamps) if all(timestamps) else None
+        stale = age is None or age > self.max_age
+        return self._centers(keys), age, stale
+
+    def iter_centers(self):
+        """Tous les centres du snapshot national (SQLite, ou JSON des crawls antérieurs)"""
+        self.refresh_if_changed()
+
+        by_agreement, store = self.by_agreement, self.store
+        if store is not None:
+            for center in store.iter_centers():
+                if center['agreement_number'] not in by_agreement:
+                    yield center
+        for center, _ in by_agreement.values():
+            yield center
+
+    def _inverted_index(self):
+        """Index inversés de la version courante des snapshots, construits au premier filtre"""
+        inverted = self._inverted
+        if inverted is not None:
+            return inverted
+
+        with self._build_lock:
+            if self._inverted is not None:
+                return self._inverted
+            by_agreement, store = self.by_agreement, self.store
+
+            inverted = _InvertedIndex()
+            if store is not None:
+                for center in store.iter_centers(('agreement_number',) + FILTER_FIELDS):
+                    if center['agreement_number'] not in by_agreement:
+                        inverted.add(center['agreement_number'], center)
+            for key, (center, _) in by_agreement.items():
+                inverted.add(key, center)
+            inverted.finish()
+
+            with self._lock:
+                # Index rechargé pendant la construction : la prochaine recherche reconstruira
+                if self.by_agreement is by_agreement:
+                    self._inverted = inverted
+        return inverted
+
+    def _centers(self, keys):
+        """Centres des numéros d'agrément donnés, dans le même ordre"""
+        by_agreement, store = self.by_agreement, self.store
+        from_store = store.get_many([key for key in keys if key not in by_agreement]) if store is not None else {}
+        centers = []
+        for key in keys:
+            entry = by_agreement.get(key)
+            center = entry[0] if entry else from_store.get(key)
+            if center:
+                centers.append(center)
+        return centers
+
+    def filter(self, criteria, offset=0, limit=50):
+        """
+        Recherche multi-critères dans les snapshots (sans requête vers utac-otc.com)
+
+        Args:
+            criteria (dict): Valeurs recherchées par champ de FILTER_FIELDS (égalité,
+                casse ignorée ; un ou plusieurs mots pour l'option)
+            offset (int): Nombre de centres à sauter
+            limit (int): Nombre maximal de centres renvoyés
+
+        Returns:
+            dict: total (nombre de centres correspondants) et centers (page demandée,
+                par numéro d'agrément croissant)
+        """
+        self.refresh_if_changed()
+
+        unknown = set(criteria) - set(FILTER_FIELDS)
+        if unknown:
+            raise ValueError(f"Champs non filtrables: {', '.join(sorted(unknown))}")
+
+        keys = self._inverted_index().match(criteria)
+        return {
+            'total': len(keys),
+            'centers': self._centers(keys[offset:offset + limit])
+        }
+
+    def by_postal_prefix(self, prefix, offset=0, limit=50):
+        """
+        Centres dont le code postal commence par prefix ("440", "75016", "971"...)
+
+        Args:
+            prefix (str): 1 à 5 chiffres
+            offset (int): Nombre de centres à sauter
+            limit (int): Nombre maximal de centres renvoyés
+
+        Returns:
+            dict: total et centers (page demandée, par code postal puis numéro d'agrément)
+        """
+        self.refresh_if_changed()
+
+        prefix = (prefix or '').strip()
+        if not prefix.isdigit() or len(prefix) > 5:
+            raise ValueError(f"Préfixe de code postal invalide: {prefix}")
+
+        inverted = self._inverted_index()
+        start, end = inverted.postal_range(prefix)
+        page = inverted.postal[start + offset:min(end, start + offset + limit)]
+        return {
+            'total': end - start,
+            'centers': self._centers([key for _, key in page])
+        }
+
+    def stats(self):
+        """Statistiques de l'index"""
+        age = self.snapshot_age()
+        return {
+            'snapshot_dir': self.snapshot_dir,
+            'total_centers': self.total_centers,
+            'snapshot_timestamp': self.snapshot_timestamp,
+            'snapshot_age_seconds': round(age, 1) if age is not None else None,
+            'max_age_seconds': self.max_age
+        }
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Flux de changements entre deux crawls nationaux
+
+Chaque crawl calcule une empreinte par centre et par département, puis les compare
+au snapshot précédent (snapshot_manifest.json dans le répertoire de sortie). Les
+centres ajoutés, supprimés et modifiés sont ajoutés au journal changes.jsonl,
+exposé par l'API via /changes?since=<timestamp>.
+"""
+import os
+import json
+import time
+import hashlib
+
+import json_codec
+from center_dedup import normalize_center
+
+MANIFEST_FILE = 'snapshot_manifest.json'
+CHANGES_FILE = 'changes.jsonl'
+
+# Champs comparés entre deux crawls (le département est dérivé, pas comparé)
+CENTER_FIELDS = ['raison_sociale', 'agreement_number', 'enseigne', 'adresse', 'ville',
+                 'code_postal', 'telephone', 'option', 'site_internet']
+
+DEFAULT_RETENTION = 90 * 24 * 3600  # 90 jours
+
+# Version 2 : centres normalisés par center_dedup (espaces, casse, code postal)
+MANIFEST_VERSION = 2
+
+
+def center_hash(center):
+    """Empreinte d'un centre sur ses champs publiés"""
+    # json de la bibliothèque standard : l'empreinte ne doit dépendre ni du backend de
+    # json_codec ni de son format, sous peine de marquer tous les centres comme modifiés
+    payload = json.dumps([center.get(field, '') for field in CENTER_FIELDS], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def department_hash(center_hashes):
+    """Empreinte d'un département : indépendante de l'ordre des centres"""
+    return hashlib.sha1(''.join(sorted(center_hashes)).encode('ascii')).hexdigest()[:16]
+
+
+class ChangeFeed:
+    def __init__(self, output_dir, retention=DEFAULT_RETENTION):
+        """
+        Args:
+            output_dir (str): Répertoire de sortie du crawl national
+            retention (int): Durée (secondes) de conservation des changements
+        """
+        self.output_dir = output_dir
+        self.retention = retention
+        self.manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+        self.changes_path = os.path.join(output_dir, CHANGES_FILE)
+        self._changes_cache = (None, [])
+        self._manifest_cache = (None, None)
+
+    def _load_manifest(self):
+        try:
+            return json_codec.read_file(self.manifest_path)
+        except (OSError, ValueError):
+            return None
+
+    def record_snapshot(self, centers, crawled_departments, timestamp=None):
+        """
+        Compare un nouveau crawl au snapshot précédent et journalise les changements
+
+        Seuls les départements récupérés avec succès sont comparés : un département en
+        erreur conserve son état précédent au lieu d'apparaître comme supprimé.
+
+        Args:
+            centers (list): Centres du crawl (avec la clé 'department')
+            crawled_departments (list): Départements récupérés avec succès
+            timestamp (float): Horodatage du crawl
+
+        Returns:
+            dict: Nombre de centres ajoutés, supprimés, modifiés et départements modifiés
+        """
+        timestamp = timestamp or time.time()
+        previous = self._load_manifest()
+        if previous and previous.get('version', 1) < MANIFEST_VERSION:
+            previous = self._normalized_manifest(previous)
+
+        # Regrouper le nouveau crawl par département
+        current_by_dept = {dept: {} for dept in crawled_departments}
+        for center in centers:
+            dept = center.get('department')
+            if dept in current_by_dept and center.get('agreement_number'):
+                current_by_dept[dept][center['agreement_number']] = center
+
+        previous_departments = previous['departments'] if previous else {}
+        manifest_departments = dict(previous_departments)
+
+        added, removed, modified = [], [], []
+        changed_departments = []
+
+        for dept, dept_centers in current_by_dept.items():
+            hashes = {number: center_hash(center) for number, center in dept_centers.items()}
+            dept_entry = {
+                'hash': department_hash(hashes.values()),
+                'center_hashes': hashes,
+                'centers': dept_centers
+            }
+            manifest_departments[dept] = dept_entry
+
+            previous_entry = previous_departments.get(dept)
+            if previous is None or (previous_entry and previous_entry['hash'] == dept_entry['hash']):
+                continue
+
+            changed_departments.append(dept)
+            previous_hashes = previous_entry['center_hashes'] if previous_entry else {}
+            previous_centers = previous_entry['centers'] if previous_entry else {}
+
+            for number, hash_value in hashes.items():
+                if number not in previous_hashes:
+                    added.append(dept_centers[number])
+                elif previous_hashes[number] != hash_value:
+                    before = previous_centers[number]
+                    after = dept_centers[number]
+                    modified.append({
+                        'agreement_number': number,
+                        'changed_fields': [f for f in CENTER_FIELDS if before.get(f, '') != after.get(f, '')],
+                        'before': before,
+                        'after': after
+                    })
+            for number in previous_hashes:
+                if number not in hashes:
+                    removed.append(previous_centers[number])
+
+        # Un centre qui change de département n'est pas une suppression + un ajout
+        removed_by_number = {center['agreement_number']: center for center in removed}
+        for center in list(added):
+            before = removed_by_number.pop(center['agreement_number'], None)
+            if before is not None:
+                added.remove(center)
+                modified.append({
+                    'agreement_number': center['agreement_number'],
+                    'changed_fields': [f for f in CENTER_FIELDS + ['department'] if before.get(f, '') != center.get(f, '')],
+                    'before': before,
+                    'after': center
+                })
+        removed = list(removed_by_number.values())
+
+        # Le journal est complet depuis history_start : avant, il faut resynchroniser
+        history_start = previous['history_start'] if previous else timestamp
+        if added or removed or modified:
+            history_start = self._append_changes({
+                'timestamp': timestamp,
+                'departments': changed_departments,
+                'added': added,
+                'removed': removed,
+                'modified': modified
+            }, history_start)
+
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'timestamp': timestamp,
+            'history_start': history_start,
+            'departments': manifest_departments
+        }
+        json_codec.write_file(self.manifest_path, manifest)
+
+        return {
+            'added': len(added),
+            'removed': len(removed),
+            'modified': len(modified),
+            'changed_departments': len(changed_departments),
+            'baseline': previous is None
+        }
+
+    @staticmethod
+    def _normalized_manifest(manifest):
+        """
+        Manifeste antérieur à la normalisation des centres, normalisé de la même façon
+
+        Sans cela, le premier crawl normalisé signalerait comme modifiés tous les
+        centres dont seuls la casse ou les espaces changent.
+        """
+        departments = {}
+        for dept, entry in manifest['departments'].items():
+            centers = {}
+            for center in entry['centers'].values():
+                center = normalize_center(center)
+                centers[center['agreement_number']] = center
+            hashes = {number: center_hash(center) for number, center in centers.items()}
+            departments[dept] = {
+                'hash': department_hash(hashes.values()),
+                'center_hashes': hashes,
+                'centers': centers
+            }
+        return dict(manifest, departments=departments)
+
+    def _append_changes(self, changeset, history_start):
+        """
+        Ajoute un lot de changements au journal et purge les lots trop anciens
+
+        Returns:
+            float: Nouveau début de l'historique complet
+        """
+        changesets = []
+        for c in self._read_changes():
+            if c['timestamp'] >= changeset['timestamp'] - self.retention:
+                changesets.append(c)
+            else:
+                history_start = max(history_start, c['timestamp'])
+        changesets.append(changeset)
+
+        tmp_path = self.changes_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            for c in changesets:
+                f.write(json_codec.dumps(c) + b'\n')
+        os.replace(tmp_path, self.changes_path)
+        return history_start
+
+    def _read_changes(self):
+        """Lit le journal (mis en cache tant que le fichier ne change pas)"""
+        try:
+            mtime = os.stat(self.changes_path).st_mtime
+        except FileNotFoundError:
+            return []
+
+        if self._changes_cache[0] == mtime:
+            return self._changes_cache[1]
+
+        changesets = []
+        with open(self.changes_path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    changesets.append(json_codec.loads(line))
+        self._changes_cache = (mtime, changesets)
+        return changesets
+
+    def _manifest_header(self):
+        """
+        history_start et timestamp du manifeste, ou None sans manifeste
+
+        Le manifeste contient tous les centres du snapshot : il n'est relu que s'il
+        change, et seuls ces deux horodatages sont gardés en mémoire.
+        """
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime
+        except FileNotFoundError:
+            return None
+
+        if self._manifest_cache[0] == mtime:
+            return self._manifest_cache[1]
+
+        manifest = self._load_manifest()
+        header = {'history_start': manifest['history_start'], 'timestamp': manifest['timestamp']} if manifest else None
+        self._manifest_cache = (mtime, header)
+        return header
+
+    def changes_since(self, since):
+        """
+        Changements nets depuis un horodatage
+
+        Les lots successifs sont fusionnés par numéro d'agrément : un centre ajouté puis
+        supprimé disparaît, un centre supprimé puis réapparu devient une modification.
+
+        Args:
+            since (float): Horodatage Unix du dernier lot déjà synchronisé
+
+        Returns:
+            dict: Centres ajoutés, supprimés, modifiés et horodatages de référence
+        """
+        manifest = self._manifest_header()
+        history_start = manifest['history_start'] if manifest else None
+        changesets = self._read_changes()
+
+        net = {}  # numéro d'agrément -> (type, centre avant, centre après)
+        applied = [c for c in changesets if c['timestamp'] > since]
+        for changeset in applied:
+            for center in changeset['added']:
+                previous = net.get(center['agreement_number'])
+                if previous and previous[0] == 'removed':
+                    net[center['agreement_number']] = ('modified', previous[1], center)
+                else:
+                    net[center['agreement_number']] = ('added', None, center)
+            for change in changeset['modified']:
+                previous = net.get(change['agreement_number'])
+                if previous and previous[0] == 'added':
+                    net[change['agreement_number']] = ('added', None, change['after'])
+                else:
+                    before = previous[1] if previous else change['before']
+                    net[change['agreement_number']] = ('modified', before, change['after'])
+            for center in changeset['removed']:
+                previous = net.get(center['agreement_number'])
+                if previous and previous[0] == 'added':
+                    del net[center['agreement_number']]
+                else:
+                    before = previous[1] if previous else center
+                    net[center['agreement_number']] = ('removed', before, None)
+
+        added, removed, modified = [], [], []
+        for number, (kind, before, after) in sorted(net.items()):
+            if kind == 'added':
+                added.append(after)
+            elif kind == 'removed':
+                removed.append(before)
+            else:
+                modified.append({
+                    'agreement_number': number,
+                    'changed_fields': [f for f in CENTER_FIELDS + ['department'] if before.get(f, '') != after.get(f, '')],
+                    'before': before,
+                    'after': after
+                })
+
+        return {
+            'since': since,
+            'latest_timestamp': applied[-1]['timestamp'] if applied else (manifest['timestamp'] if manifest else None),
+            'history_start': history_start,
+            'full_resync_required': history_start is None or since < history_start,
+            'changesets': len(applied),
+            'added': added,
+            'removed': removed,
+            'modified': modified
+        }
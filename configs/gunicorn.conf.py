@@ -1,14 +1,16 @@
 # Configuration Gunicorn pour API UTAC-OTC
 # Documentation: https://docs.gunicorn.org/en/stable/settings.html
 
+import os
+
 # Binding
 bind = "0.0.0.0:5000"
 
-# Workers
-workers = 4  # Ajustez selon vos ressources (CPU cores * 2 + 1)
-worker_class = "sync"
+# Workers : threads pour l'attente réseau vers utac-otc.com, processus pour le CPU (parsing)
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))  # Ajustez selon vos ressources (CPU cores)
+worker_class = "gthread"
 worker_connections = 1000
-threads = 1
+threads = int(os.environ.get("GUNICORN_THREADS", 16))  # Requêtes simultanées par worker
 
 # Timeouts
 timeout = 120           # Timeout général
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Jobs asynchrones de crawl national
+
+Un job demande un passage anticipé du rafraîchissement du snapshot
+(snapshot_refresher.SnapshotRefresher) : il ne crawle que si le snapshot est dû
+(UTAC_REFRESH_INTERVAL écoulé ou crawl précédent inachevé), avec le même verrou, le
+même budget de requêtes et la même priorité que le processus de rafraîchissement.
+Un snapshot à jour termine le job sans aucune requête vers utac-otc.com.
+
+Le crawl complet (8-10 minutes) ne tient pas dans le timeout des workers gunicorn.
+Un job est donc exécuté dans un processus détaché (`python crawl_jobs.py run <id>`)
+et son état est persisté sur disque : il survit au recyclage des workers
+(max_requests) et peut être consulté depuis n'importe quel worker.
+
+Usage:
+    python crawl_jobs.py run JOB_ID [--jobs-dir DIR]
+"""
+import os
+import sys
+import time
+import uuid
+import fcntl
+import subprocess
+from contextlib import contextmanager
+
+import json_codec
+from center_index import DEFAULT_SNAPSHOT_DIR
+
+DEFAULT_JOBS_DIR = os.path.join(DEFAULT_SNAPSHOT_DIR, 'jobs')
+DEFAULT_BASE_URL = "https://www.utac-otc.com"
+
+
+class CrawlJobStore:
+    def __init__(self, jobs_dir=DEFAULT_JOBS_DIR):
+        self.jobs_dir = jobs_dir
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def _job_file(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def result_file(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}_result.json")
+
+    @contextmanager
+    def _lock(self):
+        """Verrou inter-processus sur le répertoire des jobs"""
+        with open(os.path.join(self.jobs_dir, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write(self, job):
+        """Écriture atomique de l'état d'un job"""
+        json_codec.write_file(self._job_file(job['job_id']), job)
+
+    def _is_valid_id(self, job_id):
+        return bool(job_id) and job_id.isalnum()
+
+    def get(self, job_id):
+        """
+        Lit l'état d'un job
+
+        Returns:
+            dict: État du job ou None s'il n'existe pas
+        """
+        if not self._is_valid_id(job_id):
+            return None
+        try:
+            job = json_codec.read_file(self._job_file(job_id))
+        except (OSError, ValueError):
+            return None
+
+        # Un job "running" dont le processus a disparu a été interrompu
+        if job['status'] in ('pending', 'running') and job.get('pid') and not _pid_alive(job['pid']):
+            job['status'] = 'failed'
+            job['error'] = 'Processus de crawl interrompu'
+            job['finished_at'] = time.time()
+            self._write(job)
+
+        return job
+
+    def list(self, limit=20):
+        """Liste les jobs les plus récents"""
+        jobs = []
+        for name in os.listdir(self.jobs_dir):
+            if name.endswith('.json') and not name.endswith('_result.json'):
+                job = self.get(name[:-len('.json')])
+                if job:
+                    jobs.append(job)
+        jobs.sort(key=lambda j: j['created_at'], reverse=True)
+        return jobs[:limit]
+
+    def update(self, job_id, **fields):
+        with self._lock():
+            job = self.get(job_id)
+            if job is None:
+                return None
+            job.update(fields)
+            self._write(job)
+            return job
+
+    def start(self, output_dir=DEFAULT_SNAPSHOT_DIR, workers=1, base_url=DEFAULT_BASE_URL):
+        """
+        Démarre un crawl national dans un processus détaché
+
+        Un seul crawl tourne à la fois : si un job est déjà en cours, il est renvoyé ;
+        si le processus de rafraîchissement crawle déjà ce répertoire, aucun job n'est créé.
+
+        Args:
+            output_dir (str): Répertoire des snapshots
+            workers (int): Départements crawlés en parallèle
+            base_url (str): Site interrogé (même valeur que l'API : UTAC_UPSTREAM_URL)
+
+        Returns:
+            tuple: (job, créé) où créé vaut False si un job était déjà en cours ;
+                job vaut None si le processus de rafraîchissement crawle déjà
+        """
+        from snapshot_refresher import refresh_in_progress
+
+        with self._lock():
+            for job in self.list(limit=None):
+                if job['status'] in ('pending', 'running'):
+                    return job, False
+            if refresh_in_progress(output_dir):
+                return None, False
+
+            job = {
+                'job_id': uuid.uuid4().hex[:12],
+                'status': 'pending',
+                'created_at': time.time(),
+                'started_at': None,
+                'finished_at': None,
+                'output_dir': output_dir,
+                'workers': workers,
+                'base_url': base_url,
+                'pid': None,
+                'progress': {
+                    'completed_departments': 0,
+                    'total_departments': None,
+                    'total_centers': 0
+                },
+                'departments': {},
+                'summary': None,
+                'error': None
+            }
+            self._write(job)
+
+            log_file = open(os.path.join(self.jobs_dir, f"{job['job_id']}.log"), 'a')
+            process = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), 'run', job['job_id'], '--jobs-dir', self.jobs_dir],
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,  # Détaché du worker gunicorn
+                cwd=os.path.dirname(os.path.abspath(__file__))
+            )
+            log_file.close()
+
+            job['pid'] = process.pid
+            self._write(job)
+            return job, True
+
+    def run(self, job_id):
+        """Exécute le crawl d'un job (dans le processus détaché), s'il est dû"""
+        from snapshot_refresher import (SnapshotRefresher, DEFAULT_INTERVAL, DEFAULT_RETRY_INTERVAL,
+                                        DEFAULT_REQUESTS_PER_MINUTE)
+
+        job = self.update(job_id, status='running', started_at=time.time(), pid=os.getpid())
+        if job is None:
+            print(f"Job introuvable: {job_id}")
+            return False
+
+        def on_progress(dept, stats, completed, total):
+            with self._lock():
+                current = self.get(job_id)
+                current['departments'][dept] = stats
+                current['progress'] = {
+                    'completed_departments': completed,
+                    'total_departments': total,
+                    'total_centers': current['progress']['total_centers'] + stats['centers_count']
+                }
+                self._write(current)
+
+        try:
+            # Mêmes réglages que le processus de rafraîchissement (python -m utac_scraper refresh)
+            refresher = SnapshotRefresher(
+                output_dir=job['output_dir'],
+                interval=int(os.environ.get('UTAC_REFRESH_INTERVAL', DEFAULT_INTERVAL)),
+                retry_interval=int(os.environ.get('UTAC_REFRESH_RETRY_INTERVAL', DEFAULT_RETRY_INTERVAL)),
+                requests_per_minute=float(os.environ.get('UTAC_REFRESH_REQUESTS_PER_MINUTE',
+                                                         DEFAULT_REQUESTS_PER_MINUTE)),
+                workers=job['workers'],
+                base_url=job.get('base_url', DEFAULT_BASE_URL)
+            )
+            if refresher.next_run_at() > time.time():
+                self.update(job_id, status='done', finished_at=time.time(), summary={
+                    'crawled': False,
+                    'snapshot_timestamp': refresher.snapshot_timestamp(),
+                    'next_refresh_at': refresher.next_run_at()
+                })
+                return True
+
+            result = refresher.refresh(progress_callback=on_progress)
+            if result is None:
+                self.update(job_id, status='failed', finished_at=time.time(),
+                            error='Rafraîchissement du snapshot déjà en cours dans un autre processus')
+                return False
+
+            json_codec.write_file(self.result_file(job_id), result)
+
+            self.update(job_id, status='done', finished_at=time.time(), summary=result.get('summary'))
+            return True
+
+        except Exception as e:
+            self.update(job_id, status='failed', finished_at=time.time(), error=str(e))
+            raise
+
+    def load_result(self, job_id):
+        """Charge le résultat complet d'un job terminé"""
+        if not self._is_valid_id(job_id):
+            return None
+        try:
+            return json_codec.read_file(self.result_file(job_id))
+        except (OSError, ValueError):
+            return None
+
+
+def _pid_alive(pid):
+    # Récupère le processus s'il s'agit d'un enfant terminé (évite les zombies)
+    try:
+        reaped_pid, _ = os.waitpid(pid, os.WNOHANG)
+        if reaped_pid == pid:
+            return False
+    except ChildProcessError:
+        pass
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Jobs de crawl national UTAC-OTC")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help="Exécute un job de crawl")
+    run_parser.add_argument('job_id')
+    run_parser.add_argument('--jobs-dir', default=DEFAULT_JOBS_DIR)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        success = CrawlJobStore(args.jobs_dir).run(args.job_id)
+        sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
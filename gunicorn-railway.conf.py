@@ -8,9 +8,12 @@ port = os.environ.get("PORT", "8000")
 bind = f"0.0.0.0:{port}"
 
 # Workers - Railway recommande 1-2 workers pour les petites instances
+# Chaque worker sert plusieurs requêtes en parallèle (threads) : l'essentiel du temps
+# est passé à attendre utac-otc.com
 workers = int(os.environ.get("WEB_CONCURRENCY", 2))
-worker_class = "sync"
+worker_class = "gthread"
 worker_connections = 1000
+threads = int(os.environ.get("GUNICORN_THREADS", 16))
 
 # Timeouts - Configuration Railway-friendly
 timeout = 120
@@ -41,7 +44,7 @@ pythonpath = "."
 def on_starting(server):
     """Called just before the master process is initialized."""
     server.log.info("🚀 Starting API UTAC-OTC on Railway...")
-    server.log.info(f"⚡ Workers: {workers}, Port: {port}")
+    server.log.info(f"⚡ Workers: {workers} x {threads} threads, Port: {port}")
 
 def on_reload(server):
     """Called to recycle workers during a reload via SIGHUP."""
@@ -171,8 +171,9 @@ setup_gunicorn() {
     cat > gunicorn.conf.py << 'GUNICORN_CONF'
 # Configuration Gunicorn pour API UTAC-OTC
 bind = "0.0.0.0:5000"
-workers = 4
-worker_class = "sync"
+workers = 2
+worker_class = "gthread"
+threads = 16
 worker_connections = 1000
 timeout = 120
 keepalive = 5
@@ -213,6 +214,8 @@ User=utac-api
 Group=utac-api
 WorkingDirectory=/home/utac-api/utac-api
 Environment=PATH=/home/utac-api/utac-api/venv/bin
+# Snapshots partagés avec utac-refresher (PrivateTmp : /tmp n'est pas commun aux services)
+Environment=UTAC_SNAPSHOT_DIR=/home/utac-api/utac-api/snapshots
 ExecStart=/home/utac-api/utac-api/venv/bin/gunicorn -c gunicorn.conf.py api:app
 ExecReload=/bin/kill -s HUP $MAINPID
 Restart=always
@@ -229,9 +232,12 @@ ProtectHome=true
 WantedBy=multi-user.target
 SERVICE
     
+    # Rafraîchissement du snapshot national (aucun crawl déclenché par les requêtes)
+    sudo cp /home/utac-api/utac-api/configs/utac-refresher.service /etc/systemd/system/utac-refresher.service
+    
     # Recharger systemd
     sudo systemctl daemon-reload
-    sudo systemctl enable utac-api
+    sudo systemctl enable utac-api utac-refresher
     
     log_success "Service systemd configuré"
 }
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Sérialisation JSON des réponses de l'API et des fichiers du crawl
+
+Deux backends interchangeables :
+- orjson (pip install orjson), utilisé s'il est installé,
+- json de la bibliothèque standard sinon.
+UTAC_JSON_BACKEND force l'un ou l'autre ("orjson", "json").
+
+La sortie est compacte et en UTF-8 (caractères accentués non échappés) ; elle n'est
+indentée (2 espaces) que sur demande : pretty=True, ?pretty=true sur l'API,
+UTAC_JSON_PRETTY=1 pour les fichiers écrits par le crawl.
+"""
+import os
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class StdlibBackend:
+    """Module json de la bibliothèque standard"""
+    name = 'json'
+
+    @staticmethod
+    def dumps(obj, pretty=False, sort_keys=False, default=None):
+        text = json.dumps(obj, ensure_ascii=False, sort_keys=sort_keys, default=default,
+                          indent=2 if pretty else None, separators=None if pretty else (',', ':'))
+        return text.encode('utf-8')
+
+    @staticmethod
+    def loads(data):
+        return json.loads(data)
+
+
+class OrjsonBackend:
+    """orjson : sérialisation en Rust, directement en bytes UTF-8"""
+    name = 'orjson'
+
+    @staticmethod
+    def dumps(obj, pretty=False, sort_keys=False, default=None):
+        option = (orjson.OPT_INDENT_2 if pretty else 0) | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(obj, default=default, option=option)
+
+    @staticmethod
+    def loads(data):
+        return orjson.loads(data)
+
+
+BACKENDS = {StdlibBackend.name: StdlibBackend}
+if orjson is not None:
+    BACKENDS[OrjsonBackend.name] = OrjsonBackend
+
+
+def get_backend(name=None):
+    """
+    Backend de sérialisation
+
+    Args:
+        name (str): "orjson" ou "json" ; par défaut UTAC_JSON_BACKEND, sinon orjson
+            s'il est installé
+
+    Returns:
+        Backend exposant dumps(obj, pretty, sort_keys, default) -> bytes et loads(data)
+    """
+    name = name or os.environ.get('UTAC_JSON_BACKEND') or ('orjson' if orjson is not None else 'json')
+    if name not in BACKENDS:
+        raise ValueError(f"Backend JSON indisponible: {name} (disponibles: {', '.join(BACKENDS)})")
+    return BACKENDS[name]
+
+
+backend = get_backend()
+
+# Fichiers du crawl indentés (lecture humaine), compacts par défaut
+PRETTY_FILES = os.environ.get('UTAC_JSON_PRETTY', '').lower() in ('1', 'true', 'yes')
+
+
+def dumps(obj, pretty=False, sort_keys=False, default=None):
+    """
+    Sérialise un objet en JSON
+
+    Args:
+        obj: Objet à sérialiser
+        pretty (bool): Indenter la sortie (2 espaces)
+        sort_keys (bool): Trier les clés des dictionnaires
+        default (callable): Conversion des types non sérialisables nativement
+
+    Returns:
+        bytes: JSON encodé en UTF-8
+    """
+    return backend.dumps(obj, pretty=pretty, sort_keys=sort_keys, default=default)
+
+
+def loads(data):
+    """Désérialise du JSON (str ou bytes)"""
+    return backend.loads(data)
+
+
+def write_file(path, obj, pretty=None):
+    """
+    Écrit un fichier JSON de façon atomique (jamais de fichier à moitié écrit)
+
+    Args:
+        path (str): Fichier à écrire
+        obj: Objet à sérialiser
+        pretty (bool): Indenter la sortie ; par défaut UTAC_JSON_PRETTY
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(dumps(obj, pretty=PRETTY_FILES if pretty is None else pretty))
+    os.replace(tmp_path, path)
+
+
+def read_file(path):
+    """
+    Lit un fichier JSON
+
+    Raises:
+        OSError: Fichier absent ou illisible
+        ValueError: JSON invalide
+    """
+    with open(path, 'rb') as f:
+        return loads(f.read())
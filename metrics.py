@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Métriques au format Prometheus, agrégées entre les workers gunicorn
+
+Chaque processus accumule ses compteurs et histogrammes en mémoire et les écrit
+périodiquement dans metrics_<pid>.json, depuis un thread d'arrière-plan (inc et observe
+sont aussi appelés depuis la boucle d'événements d'asgi.py). L'endpoint /metrics fusionne les fichiers de
+tous les processus ; ceux des workers terminés (recyclage max_requests) sont repliés
+dans metrics_archive.json pour que les compteurs ne reculent jamais.
+"""
+import os
+import time
+import fcntl
+import atexit
+import threading
+from contextlib import contextmanager
+
+import json_codec
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Nom -> (type, description)
+METRICS = {
+    'utac_http_request_duration_seconds': ('histogram', "Durée des requêtes HTTP par endpoint"),
+    'utac_upstream_phase_duration_seconds': ('histogram', "Durée des phases du scraper (GET formulaire, POST recherche, postbacks, parsing)"),
+    'utac_upstream_errors_total': ('counter', "Erreurs des requêtes vers utac-otc.com par phase"),
+    'utac_upstream_rate_limit_wait_seconds': ('histogram', "Attente d'un jeton du limiteur de débit global, par classe de priorité"),
+    'utac_department_pages_fetched_total': ('counter', "Pages de résultats récupérées par département"),
+    'utac_cache_requests_total': ('counter', "Consultations des caches (index local, cache de résultats) par statut"),
+    'utac_cache_hit_ratio': ('gauge', "Part des consultations servies sans appel upstream (hit, stale ou coalesced)"),
+}
+
+ARCHIVE_FILE = 'metrics_archive.json'
+
+
+def _labels_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+class MetricsRegistry:
+    def __init__(self, directory, flush_interval=5, buckets=DEFAULT_BUCKETS):
+        """
+        Args:
+            directory (str): Répertoire partagé par les workers pour les fichiers de métriques
+            flush_interval (int): Délai maximal (secondes) avant écriture des métriques du processus
+            buckets (tuple): Bornes des histogrammes (secondes)
+        """
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._reset()
+        os.makedirs(directory, exist_ok=True)
+        atexit.register(self.flush)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._counters = {}
+        self._histograms = {}
+        self._last_flush = time.time()
+        self._flushing = False
+
+    def _check_pid(self):
+        # Après un fork (preload_app), le worker repart de zéro : le maître ne compte pas pour lui
+        if self._pid != os.getpid():
+            self._reset()
+
+    @property
+    def _path(self):
+        return os.path.join(self.directory, f"metrics_{os.getpid()}.json")
+
+    def inc(self, name, value=1, **labels):
+        """Incrémente un compteur"""
+        with self._lock:
+            self._check_pid()
+            key = (name, _labels_key(labels))
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._maybe_flush()
+
+    def observe(self, name, value, **labels):
+        """Ajoute une observation (secondes) à un histogramme"""
+        with self._lock:
+            self._check_pid()
+            key = (name, _labels_key(labels))
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram['buckets'][i] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+        self._maybe_flush()
+
+    @contextmanager
+    def time(self, name, **labels):
+        """Mesure la durée d'un bloc dans un histogramme"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def _maybe_flush(self):
+        with self._lock:
+            if self._flushing or time.time() - self._last_flush < self.flush_interval:
+                return
+            self._flushing = True
+        threading.Thread(target=self._background_flush, daemon=True).start()
+
+    def _background_flush(self):
+        try:
+            self.flush()
+        finally:
+            self._flushing = False
+
+    def _snapshot(self):
+        return {
+            'buckets': list(self.buckets),
+            'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+            'histograms': [[name, list(labels), h] for (name, labels), h in self._histograms.items()]
+        }
+
+    def flush(self):
+        """Écrit les métriques du processus dans son fichier"""
+        with self._lock:
+            self._check_pid()
+            payload = self._snapshot()
+            self._last_flush = time.time()
+        if not os.path.isdir(self.directory):
+            return
+        try:
+            json_codec.write_file(self._path, payload, pretty=False)
+        except OSError as e:
+            print(f"Erreur lors de l'écriture des métriques: {e}")
+
+    @staticmethod
+    def _merge(total, payload):
+        """Ajoute les métriques d'un fichier au total"""
+        for name, labels, value in payload.get('counters', []):
+            key = (name, tuple(tuple(pair) for pair in labels))
+            total['counters'][key] = total['counters'].get(key, 0) + value
+        for name, labels, h in payload.get('histograms', []):
+            key = (name, tuple(tuple(pair) for pair in labels))
+            merged = total['histograms'].get(key)
+            if merged is None:
+                merged = total['histograms'][key] = {'buckets': [0] * len(h['buckets']), 'sum': 0.0, 'count': 0}
+            merged['buckets'] = [a + b for a, b in zip(merged['buckets'], h['buckets'])]
+            merged['sum'] += h['sum']
+            merged['count'] += h['count']
+
+    @staticmethod
+    def _pid_alive(pid):
+        try:
+            os.kill(pid, 0)
+            return True
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+
+    def _read(self, path):
+        try:
+            return json_codec.read_file(path)
+        except (OSError, ValueError):
+            return None
+
+    def collect(self):
+        """
+        Fusionne les métriques de tous les processus
+
+        Returns:
+            dict: {'counters': {(nom, labels): valeur}, 'histograms': {(nom, labels): histogramme}}
+        """
+        self.flush()
+        total = {'counters': {}, 'histograms': {}}
+        archive_path = os.path.join(self.directory, ARCHIVE_FILE)
+
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            archive = self._read(archive_path)
+            dead = []
+            for filename in os.listdir(self.directory):
+                if not (filename.startswith('metrics_') and filename.endswith('.json')) or filename == ARCHIVE_FILE:
+                    continue
+                pid_part = filename[len('metrics_'):-len('.json')]
+                if not pid_part.isdigit():
+                    continue
+                payload = self._read(os.path.join(self.directory, filename))
+                if payload is None:
+                    continue
+                if int(pid_part) != os.getpid() and not self._pid_alive(int(pid_part)):
+                    dead.append((filename, payload))
+                else:
+                    self._merge(total, payload)
+
+            # Replier les workers terminés dans l'archive
+            if dead:
+                archived = {'counters': {}, 'histograms': {}}
+                if archive:
+                    self._merge(archived, archive)
+                for _, payload in dead:
+                    self._merge(archived, payload)
+                archive = {
+                    'buckets': list(self.buckets),
+                    'counters': [[n, list(l), v] for (n, l), v in archived['counters'].items()],
+                    'histograms': [[n, list(l), h] for (n, l), h in archived['histograms'].items()]
+                }
+                json_codec.write_file(archive_path, archive, pretty=False)
+                for filename, _ in dead:
+                    os.remove(os.path.join(self.directory, filename))
+
+            if archive:
+                self._merge(total, archive)
+
+        return total
+
+    def render(self):
+        """Métriques de tous les workers au format texte Prometheus"""
+        total = self.collect()
+        lines = []
+
+        by_name = {}
+        for (name, labels), value in total['counters'].items():
+            by_name.setdefault(name, []).append((labels, value))
+        for (name, labels), h in total['histograms'].items():
+            by_name.setdefault(name, []).append((labels, h))
+
+        # Taux de hit des caches, calculé sur les compteurs agrégés
+        cache_totals = {}
+        for labels, value in by_name.get('utac_cache_requests_total', []):
+            labels = dict(labels)
+            key = (('cache', labels.get('cache', '')), ('kind', labels.get('kind', '')))
+            hits, count = cache_totals.get(key, (0, 0))
+            if labels.get('status') in ('hit', 'stale', 'coalesced'):
+                hits += value
+            cache_totals[key] = (hits, count + value)
+        if cache_totals:
+            by_name['utac_cache_hit_ratio'] = [
+                (key, round(hits / count, 4)) for key, (hits, count) in cache_totals.items() if count
+            ]
+
+        for name in sorted(by_name):
+            metric_type, description = METRICS.get(name, ('untyped', name))
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in sorted(by_name[name], key=lambda item: item[0]):
+                if metric_type != 'histogram':
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets, value['buckets']):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', repr(float(bound)))])} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {value['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {round(value['sum'], 6)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+
+        return '\n'.join(lines) + '\n'
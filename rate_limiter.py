@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Limiteur de débit global des requêtes vers utac-otc.com
+
+Seau à jetons partagé par tous les processus d'une machine (workers gunicorn, jobs
+de crawl, processus de rafraîchissement) : son état tient dans un petit fichier
+verrouillé par fcntl, lu et réécrit à chaque requête. Chaque tentative HTTP de
+UpstreamTransport consomme un jeton ; le débit total reste sous `rate` requêtes par
+seconde, avec des rafales d'au plus `burst` requêtes.
+
+Les requêtes ont une classe de priorité. Une classe en attente d'un jeton le signale
+dans l'état partagé et les classes moins prioritaires s'effacent tant qu'elle attend :
+une recherche /agreement passe devant les pages d'un crawl national. Les classes
+moins prioritaires laissent en outre `reserve` jetons dans le seau, pour qu'une
+recherche interactive qui arrive pendant un crawl n'attende pas.
+"""
+import os
+import time
+import fcntl
+import struct
+import asyncio
+import threading
+from contextlib import contextmanager
+
+from async_compat import to_thread
+
+# Classes de priorité, de la plus prioritaire à la moins prioritaire
+PRIORITY_INTERACTIVE = 'interactive'  # Recherches des utilisateurs de l'API
+PRIORITY_REFRESH = 'refresh'  # Rafraîchissements du cache (stale-while-revalidate)
+PRIORITY_CRAWL = 'crawl'  # Crawl national (jobs, processus de rafraîchissement)
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_REFRESH, PRIORITY_CRAWL)
+
+DEFAULT_RATE_LIMITER_FILE = 'upstream_rate.state'
+DEFAULT_RATE = 5.0
+DEFAULT_BURST = 10
+
+# Intervalle maximal entre deux tentatives d'un appelant en attente
+MAX_POLL_INTERVAL = 0.25
+
+# Marge pendant laquelle une classe en attente bloque encore les classes moins prioritaires
+HOLD_MARGIN = 0.05
+
+# Jetons, date de mise à jour, puis fin d'attente annoncée par chaque classe
+_STATE = struct.Struct('<dd' + 'd' * len(PRIORITIES))
+
+
+class RateLimiter:
+    def __init__(self, path, rate=DEFAULT_RATE, burst=DEFAULT_BURST, reserve=1, metrics=None):
+        """
+        Args:
+            path (str): Fichier d'état partagé par les processus
+            rate (float): Requêtes par seconde autorisées vers utac-otc.com
+            burst (int): Taille du seau (requêtes pouvant partir d'un coup)
+            reserve (int): Jetons que les classes non interactives laissent dans le seau
+            metrics (MetricsRegistry): Registre recevant l'attente de chaque requête
+        """
+        if rate <= 0:
+            raise ValueError("Le débit doit être strictement positif")
+        self.path = path
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.reserve = max(0.0, min(float(reserve), self.burst - 1))
+        self.metrics = metrics
+        self._fd = None
+        self._pid = None
+        self._thread_lock = threading.Lock()
+
+    def _file(self):
+        """Descripteur propre au processus (un descripteur hérité d'un fork partagerait le verrou)"""
+        if self._fd is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        return self._fd
+
+    @contextmanager
+    def _locked_state(self):
+        """État partagé, verrouillé entre threads et entre processus"""
+        with self._thread_lock:
+            fd = self._file()
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                raw = os.pread(fd, _STATE.size, 0)
+                if len(raw) == _STATE.size:
+                    tokens, updated, *holds = _STATE.unpack(raw)
+                    tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+                else:
+                    tokens, holds = self.burst, [0.0] * len(PRIORITIES)
+                state = {'now': now, 'tokens': tokens, 'holds': holds}
+                yield state
+                os.pwrite(fd, _STATE.pack(state['tokens'], now, *state['holds']), 0)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def try_acquire(self, priority=PRIORITY_INTERACTIVE):
+        """
+        Prend un jeton s'il est disponible pour cette classe
+
+        Returns:
+            float: 0 si le jeton est pris, sinon délai (secondes) avant de réessayer
+        """
+        rank = PRIORITIES.index(priority)
+        needed = 1 + (self.reserve if rank else 0)
+
+        with self._locked_state() as state:
+            now, tokens, holds = state['now'], state['tokens'], state['holds']
+            # Une classe plus prioritaire attend : lui laisser les jetons
+            held_until = max(holds[:rank], default=0.0)
+            if held_until <= now and tokens >= needed:
+                state['tokens'] = tokens - 1
+                return 0.0
+
+            refill = max(0.0, (needed - tokens) / self.rate)
+            holds[rank] = max(holds[rank], now + refill + HOLD_MARGIN)
+            return max(refill, held_until - now, 0.001)
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE):
+        """
+        Attend un jeton
+
+        Returns:
+            float: Durée d'attente (secondes)
+        """
+        started = time.perf_counter()
+        while True:
+            wait = self.try_acquire(priority)
+            if not wait:
+                break
+            time.sleep(min(wait, MAX_POLL_INTERVAL))
+        return self._waited(priority, started)
+
+    async def acquire_async(self, priority=PRIORITY_INTERACTIVE):
+        """
+        Équivalent asynchrone de acquire() : ni l'attente ni les verrous ne bloquent la
+        boucle d'événements
+
+        try_acquire prend un verrou de thread et le flock du fichier d'état, disputés par
+        les threads et les autres processus : il s'exécute dans le pool de threads.
+        """
+        started = time.perf_counter()
+        while True:
+            wait = await to_thread(self.try_acquire, priority)
+            if not wait:
+                break
+            await asyncio.sleep(min(wait, MAX_POLL_INTERVAL))
+        return self._waited(priority, started)
+
+    def _waited(self, priority, started):
+        waited = time.perf_counter() - started
+        if self.metrics is not None:
+            self.metrics.observe('utac_upstream_rate_limit_wait_seconds', waited, priority=priority)
+        return waited
+
+    def stats(self):
+        """État du seau partagé"""
+        with self._locked_state() as state:
+            now = state['now']
+            return {
+                'rate_per_second': self.rate,
+                'burst': self.burst,
+                'reserve': self.reserve,
+                'tokens': round(state['tokens'], 2),
+                'waiting': [priority for priority, hold in zip(PRIORITIES, state['holds']) if hold > now]
+            }
+
+
+def shared_rate_limiter(snapshot_dir, metrics=None):
+    """
+    Limiteur configuré par l'environnement, commun à l'API, aux jobs de crawl et au
+    processus de rafraîchissement d'un même répertoire de snapshots
+
+    Variables:
+        UTAC_UPSTREAM_RATE: Requêtes par seconde (0 : pas de limite)
+        UTAC_UPSTREAM_BURST: Taille du seau
+        UTAC_UPSTREAM_RATE_FILE: Fichier d'état (défaut <snapshot_dir>/upstream_rate.state)
+
+    Returns:
+        RateLimiter: Limiteur partagé, ou None si UTAC_UPSTREAM_RATE vaut 0
+    """
+    rate = float(os.environ.get('UTAC_UPSTREAM_RATE', DEFAULT_RATE))
+    if rate <= 0:
+        return None
+    return RateLimiter(
+        os.environ.get('UTAC_UPSTREAM_RATE_FILE', os.path.join(snapshot_dir, DEFAULT_RATE_LIMITER_FILE)),
+        rate=rate,
+        burst=float(os.environ.get('UTAC_UPSTREAM_BURST', DEFAULT_BURST)),
+        metrics=metrics
+    )
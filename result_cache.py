@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+Cache de résultats partagé entre les workers gunicorn
+
+Stocké dans une base SQLite (mode WAL) pour que tous les processus d'une même
+machine partagent les résultats des recherches par département et par agrément.
+Supporte une durée de vie par type de recherche, une éviction LRU bornée en nombre
+d'entrées et en taille, et le stale-while-revalidate : une entrée expirée mais
+récente est servie immédiatement pendant qu'un seul worker la rafraîchit.
+
+Les calculs sont dédoublonnés (single-flight) : pour une même clé absente du cache,
+une seule recherche upstream est en cours, dans le processus (les autres threads
+attendent son résultat) comme entre workers (bail dans la table inflight, renouvelé
+tant que le calcul dure ; les autres workers attendent que le résultat arrive dans le
+cache). Un calcul en échec laisse un marqueur bref dans la table failures : les workers
+qui l'attendaient renvoient le même résultat au lieu de relancer chacun la recherche.
+"""
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+from contextlib import asynccontextmanager, contextmanager
+
+import json_codec
+from async_compat import to_thread
+from center_index import DEFAULT_SNAPSHOT_DIR
+
+DEFAULT_CACHE_PATH = os.path.join(DEFAULT_SNAPSHOT_DIR, 'result_cache.sqlite3')
+
+# Délai maximal accordé à un worker pour rafraîchir une entrée avant qu'un autre ne reprenne la main
+REFRESH_LOCK_SECONDS = 120
+
+# Les accès à une entrée ne sont réécrits sur disque qu'au plus toutes les N secondes
+ACCESS_WRITE_INTERVAL = 60
+
+# Durée du bail d'un calcul, renouvelé tous les tiers de bail par le worker qui calcule :
+# un autre worker ne le reprend que si ce worker a été tué en cours de calcul
+INFLIGHT_LEASE_SECONDS = 30
+
+# Durée de vie du marqueur d'échec d'un calcul (résultat non mis en cache ou exception)
+FAILURE_MARKER_SECONDS = 10
+
+# Intervalle de consultation du cache par les workers qui attendent le calcul d'un autre
+INFLIGHT_POLL_INTERVAL = 0.1
+
+
+class _Flight:
+    """Calcul en cours pour une clé, attendu par les autres threads du processus"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResultCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=5000, max_bytes=200 * 1024 * 1024):
+        """
+        Args:
+            path (str): Fichier SQLite du cache
+            max_entries (int): Nombre maximal d'entrées
+            max_bytes (int): Taille maximale cumulée des valeurs (octets)
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._refresh_tasks = set()
+        self._flights = {}
+        self._async_flights = {}
+        self._flights_lock = threading.Lock()
+        self._owner = f"{os.uname().nodename}:{os.getpid()}"
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connect().execute('''
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                refreshing_until REAL
+            )
+        ''')
+        self._connect().execute('CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access)')
+        self._connect().execute('''
+            CREATE TABLE IF NOT EXISTS inflight (
+                key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        self._connect().execute('''
+            CREATE TABLE IF NOT EXISTS failures (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                failed_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+
+    def _connect(self):
+        """Connexion SQLite propre au thread et au processus (jamais partagée après un fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """
+        Lit une entrée du cache
+
+        Returns:
+            tuple: (valeur, âge en secondes) ou None si absente
+        """
+        row = self._connect().execute(
+            'SELECT value, created_at, last_access FROM entries WHERE key = ?', (key,)
+        ).fetchone()
+        if not row:
+            return None
+
+        value, created_at, last_access = row
+        now = time.time()
+        if now - last_access > ACCESS_WRITE_INTERVAL:
+            self._connect().execute('UPDATE entries SET last_access = ? WHERE key = ?', (now, key))
+
+        return json_codec.loads(value), now - created_at
+
+    def set(self, key, value):
+        """Enregistre une entrée puis applique l'éviction LRU si le cache dépasse ses limites"""
+        payload = json_codec.dumps(value)
+        now = time.time()
+        self._connect().execute(
+            'INSERT OR REPLACE INTO entries (key, value, size, created_at, last_access, refreshing_until) '
+            'VALUES (?, ?, ?, ?, ?, NULL)',
+            (key, payload.decode('utf-8'), len(payload), now, now)
+        )
+        self._evict()
+
+    def delete(self, key):
+        self._connect().execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def _evict(self):
+        conn = self._connect()
+        count, total_size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        if count <= self.max_entries and total_size <= self.max_bytes:
+            return
+
+        to_delete = []
+        for key, size in conn.execute('SELECT key, size FROM entries ORDER BY last_access'):
+            if count <= self.max_entries and total_size <= self.max_bytes:
+                break
+            to_delete.append((key,))
+            count -= 1
+            total_size -= size
+
+        conn.executemany('DELETE FROM entries WHERE key = ?', to_delete)
+
+    def _claim_refresh(self, key):
+        """Réserve le rafraîchissement d'une entrée pour ce worker (un seul worker à la fois)"""
+        now = time.time()
+        cursor = self._connect().execute(
+            'UPDATE entries SET refreshing_until = ? '
+            'WHERE key = ? AND (refreshing_until IS NULL OR refreshing_until < ?)',
+            (now + REFRESH_LOCK_SECONDS, key, now)
+        )
+        return cursor.rowcount == 1
+
+    def _release_refresh(self, key):
+        self._connect().execute('UPDATE entries SET refreshing_until = NULL WHERE key = ?', (key,))
+
+    def _claim_inflight(self, key):
+        """Réserve le calcul d'une clé absente pour ce worker (bail expirant si le worker meurt)"""
+        now = time.time()
+        cursor = self._connect().execute(
+            'INSERT INTO inflight (key, owner, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at '
+            'WHERE inflight.expires_at < ?',
+            (key, self._owner, now + INFLIGHT_LEASE_SECONDS, now)
+        )
+        return cursor.rowcount == 1
+
+    def _renew_inflight(self, key):
+        self._connect().execute(
+            'UPDATE inflight SET expires_at = ? WHERE key = ? AND owner = ?',
+            (time.time() + INFLIGHT_LEASE_SECONDS, key, self._owner)
+        )
+
+    def _release_inflight(self, key):
+        self._connect().execute('DELETE FROM inflight WHERE key = ? AND owner = ?', (key, self._owner))
+
+    @contextmanager
+    def _inflight_lease(self, key):
+        """Bail déjà réservé, renouvelé par un thread tant que le calcul dure, puis relâché"""
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(INFLIGHT_LEASE_SECONDS / 3):
+                self._renew_inflight(key)
+
+        renewer = threading.Thread(target=renew, daemon=True)
+        renewer.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            renewer.join()
+            self._release_inflight(key)
+
+    @asynccontextmanager
+    async def _inflight_lease_async(self, key):
+        """Équivalent asynchrone de _inflight_lease() : renouvellement par une tâche"""
+        async def renew():
+            while True:
+                await asyncio.sleep(INFLIGHT_LEASE_SECONDS / 3)
+                await to_thread(self._renew_inflight, key)
+
+        renewer = asyncio.ensure_future(renew())
+        try:
+            yield
+        finally:
+            renewer.cancel()
+            await asyncio.wait({renewer})
+            await to_thread(self._release_inflight, key)
+
+    def _mark_failed(self, key, value):
+        """Marqueur d'échec : résultat renvoyé aux workers qui attendaient ce calcul"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute('DELETE FROM failures WHERE expires_at < ?', (now,))
+        conn.execute(
+            'INSERT OR REPLACE INTO failures (key, value, failed_at, expires_at) VALUES (?, ?, ?, ?)',
+            (key, json_codec.dumps(value).decode('utf-8'), now, now + FAILURE_MARKER_SECONDS)
+        )
+
+    def _failed_since(self, key, since):
+        """
+        Résultat d'un calcul en échec depuis `since` (début de l'attente), ou None
+
+        Les requêtes arrivées après l'échec ne le voient pas et relancent le calcul.
+        """
+        row = self._connect().execute(
+            'SELECT value FROM failures WHERE key = ? AND failed_at >= ? AND expires_at >= ?',
+            (key, since, time.time())
+        ).fetchone()
+        return json_codec.loads(row[0]) if row else None
+
+    def _fresh(self, key, ttl):
+        """Valeur fraîche en cache, ou None"""
+        cached = self.get(key)
+        if cached and cached[1] < ttl:
+            return cached[0]
+        return None
+
+    def get_or_compute(self, key, compute, ttl, stale_ttl=0, cacheable=None, refresh=None):
+        """
+        Renvoie la valeur en cache ou la calcule
+
+        Args:
+            key (str): Clé normalisée
+            compute (callable): Calcule la valeur (appel upstream)
+            ttl (int): Durée de fraîcheur (secondes)
+            stale_ttl (int): Durée supplémentaire pendant laquelle une valeur expirée est
+                servie en attendant son rafraîchissement en arrière-plan
+            cacheable (callable): Indique si une valeur calculée peut être mise en cache
+                (par défaut toute valeur non vide)
+            refresh (callable): Fonction utilisée pour le rafraîchissement en arrière-plan
+                (par défaut compute)
+
+        Returns:
+            tuple: (valeur, statut) avec statut "hit", "stale", "miss" ou "coalesced"
+                (valeur calculée par une requête concurrente, de ce worker ou d'un autre)
+        """
+        cacheable = cacheable or bool
+        cached = self.get(key)
+
+        if cached:
+            value, age = cached
+            if age < ttl:
+                return value, 'hit'
+            if age < ttl + stale_ttl:
+                if self._claim_refresh(key):
+                    threading.Thread(
+                        target=self._refresh,
+                        args=(key, refresh or compute, cacheable),
+                        daemon=True
+                    ).start()
+                return value, 'stale'
+
+        # Un seul calcul par clé dans le processus : les autres threads attendent son résultat
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, 'coalesced'
+
+        try:
+            flight.value, status = self._compute_once(key, compute, ttl, cacheable)
+            return flight.value, status
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _compute_once(self, key, compute, ttl, cacheable):
+        """
+        Calcule une clé, sauf si un autre worker la calcule déjà : son résultat est alors
+        attendu tant que son bail est renouvelé, y compris un résultat en échec
+        """
+        since = time.time()
+        while not self._claim_inflight(key):
+            time.sleep(INFLIGHT_POLL_INTERVAL)
+            value = self._fresh(key, ttl)
+            if value is None:
+                value = self._failed_since(key, since)
+            if value is not None:
+                return value, 'coalesced'
+
+        with self._inflight_lease(key):
+            # Le calcul d'un autre worker a pu se terminer entre la lecture du cache et le bail
+            value = self._fresh(key, ttl)
+            if value is None:
+                value = self._failed_since(key, since)
+            if value is not None:
+                return value, 'coalesced'
+            try:
+                value = compute()
+            except Exception as e:
+                self._mark_failed(key, {'error': str(e)})
+                raise
+            if cacheable(value):
+                self.set(key, value)
+            else:
+                self._mark_failed(key, value)
+            return value, 'miss'
+
+    async def get_or_compute_async(self, key, compute, ttl, stale_ttl=0, cacheable=None, refresh=None):
+        """
+        Équivalent asynchrone de get_or_compute() : compute et refresh sont des fonctions
+        renvoyant une coroutine, le rafraîchissement en arrière-plan est une tâche asyncio
+        et les accès SQLite se font hors de la boucle d'événements.
+
+        Returns:
+            tuple: (valeur, statut) avec statut "hit", "stale", "miss" ou "coalesced"
+        """
+        cacheable = cacheable or bool
+        cached = await to_thread(self.get, key)
+
+        if cached:
+            value, age = cached
+            if age < ttl:
+                return value, 'hit'
+            if age < ttl + stale_ttl:
+                if await to_thread(self._claim_refresh, key):
+                    task = asyncio.create_task(self._refresh_async(key, refresh or compute, cacheable))
+                    # Garder une référence jusqu'à la fin de la tâche
+                    self._refresh_tasks.add(task)
+                    task.add_done_callback(self._refresh_tasks.discard)
+                return value, 'stale'
+
+        # Un seul calcul par clé dans la boucle d'événements : les autres tâches attendent son résultat
+        flight_key = (asyncio.get_running_loop(), key)
+        while flight_key in self._async_flights:
+            flight = self._async_flights[flight_key]
+            # asyncio.wait ne lève CancelledError que si cette tâche est annulée, et
+            # n'annule pas le calcul attendu
+            await asyncio.wait({flight})
+            if not flight.cancelled():
+                return flight.result(), 'coalesced'
+            # Requête à l'origine du calcul annulée : reprendre le calcul
+
+        flight = self._async_flights[flight_key] = asyncio.get_running_loop().create_future()
+        try:
+            value, status = await self._compute_once_async(key, compute, ttl, cacheable)
+            flight.set_result(value)
+            return value, status
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except Exception as e:
+            flight.set_exception(e)
+            # Erreur déjà remontée à cet appelant : ne pas la signaler comme jamais récupérée
+            flight.exception()
+            raise
+        finally:
+            del self._async_flights[flight_key]
+
+    async def _compute_once_async(self, key, compute, ttl, cacheable):
+        """Équivalent asynchrone de _compute_once()"""
+        since = time.time()
+        while not await to_thread(self._claim_inflight, key):
+            await asyncio.sleep(INFLIGHT_POLL_INTERVAL)
+            value = await to_thread(self._fresh, key, ttl)
+            if value is None:
+                value = await to_thread(self._failed_since, key, since)
+            if value is not None:
+                return value, 'coalesced'
+
+        async with self._inflight_lease_async(key):
+            value = await to_thread(self._fresh, key, ttl)
+            if value is None:
+                value = await to_thread(self._failed_since, key, since)
+            if value is not None:
+                return value, 'coalesced'
+            try:
+                value = await compute()
+            except Exception as e:
+                await to_thread(self._mark_failed, key, {'error': str(e)})
+                raise
+            if cacheable(value):
+                await to_thread(self.set, key, value)
+            else:
+                await to_thread(self._mark_failed, key, value)
+            return value, 'miss'
+
+    async def _refresh_async(self, key, compute, cacheable):
+        try:
+            value = await compute()
+            if cacheable(value):
+                await to_thread(self.set, key, value)
+                return
+        except Exception as e:
+            print(f"Erreur lors du rafraîchissement du cache {key}: {e}")
+        await to_thread(self._release_refresh, key)
+
+    def _refresh(self, key, compute, cacheable):
+        try:
+            value = compute()
+            if cacheable(value):
+                self.set(key, value)
+                return
+        except Exception as e:
+            print(f"Erreur lors du rafraîchissement du cache {key}: {e}")
+        self._release_refresh(key)
+
+    def stats(self):
+        """Statistiques du cache"""
+        count, total_size = self._connect().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries'
+        ).fetchone()
+        return {
+            'path': self.path,
+            'entries': count,
+            'size_bytes': total_size,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes
+        }
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Rafraîchissement du snapshot national en arrière-plan
+
+Le crawl national (8-10 minutes) n'est jamais déclenché par une requête utilisateur :
+un processus dédié le relance quand le snapshot atteint son intervalle de
+rafraîchissement, en limitant le débit de requêtes vers utac-otc.com. L'API se
+contente de lire le dernier snapshot complet (centers.sqlite3) via CenterIndex.
+
+Un crawl interrompu (processus tué) ou terminé avec des départements en erreur est
+repris au démarrage suivant, ou après retry_interval, depuis ses checkpoints.
+
+Usage:
+    python -m utac_scraper refresh [--output-dir DIR] [--interval 86400]
+        [--requests-per-minute 60] [--workers 1] [--once]
+"""
+import os
+import time
+import fcntl
+import argparse
+import threading
+from contextlib import contextmanager
+
+import json_codec
+from center_index import DEFAULT_SNAPSHOT_DIR
+from snapshot_store import SnapshotStore
+from upstream import UpstreamTransport
+from rate_limiter import PRIORITY_CRAWL, shared_rate_limiter
+
+DEFAULT_INTERVAL = 24 * 3600
+DEFAULT_RETRY_INTERVAL = 15 * 60
+DEFAULT_REQUESTS_PER_MINUTE = 60
+
+# Verrou partagé par le processus de rafraîchissement et les jobs POST /all-centers/jobs
+REFRESH_LOCK = 'refresher.lock'
+
+
+@contextmanager
+def exclusive_refresh(output_dir):
+    """
+    Verrou inter-processus : un seul crawl national à la fois par répertoire
+
+    Yields:
+        bool: False si un autre processus crawle déjà ce répertoire
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, REFRESH_LOCK), 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def refresh_in_progress(output_dir):
+    """Vrai si un crawl national (rafraîchissement ou job) est en cours dans ce répertoire"""
+    with exclusive_refresh(output_dir) as acquired:
+        return not acquired
+
+
+class RequestBudget:
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE):
+        """
+        Débit maximal de requêtes vers utac-otc.com, partagé par les threads du crawl
+
+        Args:
+            requests_per_minute (float): Requêtes autorisées par minute (0 : illimité)
+        """
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0
+        self.requests = 0
+        self._next_slot = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Attend le prochain créneau libre (requêtes espacées régulièrement)"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+            self.requests += 1
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class BudgetedTransport(UpstreamTransport):
+    def __init__(self, budget, **kwargs):
+        """
+        Transport dont chaque requête consomme un créneau du budget
+
+        Les nouvelles tentatives d'une même requête sont espacées par le backoff du
+        transport et ne consomment pas de créneau supplémentaire.
+
+        Args:
+            budget (RequestBudget): Budget partagé par les scrapers du crawl
+            **kwargs: Arguments de UpstreamTransport
+        """
+        super().__init__(**kwargs)
+        self.budget = budget
+
+    def request(self, session, method, url, **kwargs):
+        self.budget.acquire()
+        return super().request(session, method, url, **kwargs)
+
+
+class SnapshotRefresher:
+    def __init__(self, output_dir=DEFAULT_SNAPSHOT_DIR, interval=DEFAULT_INTERVAL,
+                 retry_interval=DEFAULT_RETRY_INTERVAL, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 workers=1, scraper=None, base_url="https://www.utac-otc.com"):
+        """
+        Args:
+            output_dir (str): Répertoire des snapshots lu par l'API (UTAC_SNAPSHOT_DIR)
+            interval (int): Âge (secondes) du snapshot à partir duquel il est recrawlé
+            retry_interval (int): Délai (secondes) avant de reprendre un crawl terminé
+                avec des départements en erreur
+            requests_per_minute (float): Budget de requêtes vers utac-otc.com
+            workers (int): Départements crawlés en parallèle (même budget pour tous)
+            scraper (UTACScraper): Scraper à utiliser ; par défaut un UTACScraper dont le
+                transport respecte requests_per_minute et le limiteur de débit partagé
+                avec l'API, en priorité crawl
+            base_url (str): Site interrogé par le scraper par défaut
+        """
+        from utac_scraper import UTACScraper
+
+        self.output_dir = output_dir
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self.workers = workers
+        self.scraper = scraper or UTACScraper(
+            transport=BudgetedTransport(RequestBudget(requests_per_minute),
+                                        rate_limiter=shared_rate_limiter(output_dir)),
+            base_url=base_url,
+            priority=PRIORITY_CRAWL
+        )
+        self.store = SnapshotStore.in_directory(output_dir)
+        self._retry_at = None
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _crawl_unfinished(self):
+        """Vrai si le dernier crawl a été interrompu ou s'est terminé avec des erreurs"""
+        try:
+            return not json_codec.read_file(os.path.join(self.output_dir, 'crawl_state.json')).get('finished')
+        except (OSError, ValueError):
+            return False
+
+    def snapshot_timestamp(self):
+        """Fin du crawl ayant produit le snapshot courant, None s'il n'y en a pas"""
+        if not self.store.exists():
+            return None
+        try:
+            return self.store.timestamp()
+        except Exception as e:
+            print(f"Snapshot illisible {self.store.path}: {e}")
+            return None
+
+    def next_run_at(self):
+        """Date (timestamp) du prochain crawl : 0 s'il est dû immédiatement"""
+        if self._crawl_unfinished():
+            return self._retry_at or 0
+        timestamp = self.snapshot_timestamp()
+        return timestamp + self.interval if timestamp else 0
+
+    def _exclusive(self):
+        """Verrou du répertoire (voir exclusive_refresh)"""
+        return exclusive_refresh(self.output_dir)
+
+    def refresh(self, progress_callback=None):
+        """
+        Crawl national (reprise du précédent s'il n'est pas terminé)
+
+        Args:
+            progress_callback (callable): Appelé après chaque département
+                (voir UTACScraper.get_all_french_centers)
+
+        Returns:
+            dict: Résultat de get_all_french_centers, ou None si un autre processus
+                rafraîchit déjà le snapshot
+        """
+        with self._exclusive() as acquired:
+            if not acquired:
+                print(f"🔒 Rafraîchissement déjà en cours dans {self.output_dir}")
+                return None
+            result = self.scraper.get_all_french_centers(self.output_dir, workers=self.workers,
+                                                         progress_callback=progress_callback)
+
+        self._retry_at = time.time() + self.retry_interval
+        budget = getattr(self.scraper.transport, 'budget', None)
+        if budget is not None:
+            print(f"📨 {budget.requests} requêtes vers utac-otc.com depuis le démarrage")
+        return result
+
+    def run(self, once=False, poll_interval=60):
+        """
+        Boucle de rafraîchissement
+
+        Args:
+            once (bool): Un seul passage : crawl s'il est dû, puis retour
+            poll_interval (int): Intervalle maximal (secondes) entre deux vérifications
+                du snapshot (un crawl lancé à la main est pris en compte)
+
+        Returns:
+            dict: Résultat du crawl en mode once (None s'il n'était pas dû)
+        """
+        while True:
+            wait = self.next_run_at() - time.time()
+            if wait <= 0:
+                result = self.refresh()
+                if once:
+                    return result
+                if result is None:
+                    time.sleep(poll_interval)
+                continue
+
+            if once:
+                print(f"✅ Snapshot à jour, prochain rafraîchissement dans {wait / 60:.0f} min")
+                return None
+            time.sleep(min(wait, poll_interval))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m utac_scraper refresh',
+                                     description="Rafraîchit le snapshot national en arrière-plan")
+    parser.add_argument('--output-dir', default=os.environ.get('UTAC_SNAPSHOT_DIR', DEFAULT_SNAPSHOT_DIR),
+                        help="Répertoire des snapshots lu par l'API")
+    parser.add_argument('--interval', type=int,
+                        default=int(os.environ.get('UTAC_REFRESH_INTERVAL', DEFAULT_INTERVAL)),
+                        help="Âge du snapshot (secondes) déclenchant un nouveau crawl")
+    parser.add_argument('--retry-interval', type=int,
+                        default=int(os.environ.get('UTAC_REFRESH_RETRY_INTERVAL', DEFAULT_RETRY_INTERVAL)),
+                        help="Délai (secondes) avant de reprendre un crawl en erreur")
+    parser.add_argument('--requests-per-minute', type=float,
+                        default=float(os.environ.get('UTAC_REFRESH_REQUESTS_PER_MINUTE', DEFAULT_REQUESTS_PER_MINUTE)),
+                        help="Budget de requêtes vers utac-otc.com (0 : illimité)")
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('UTAC_CRAWL_WORKERS', 1)),
+                        help="Départements crawlés en parallèle")
+    parser.add_argument('--base-url', default=os.environ.get('UTAC_UPSTREAM_URL', 'https://www.utac-otc.com'),
+                        help="Site interrogé")
+    parser.add_argument('--once', action='store_true', help="Crawler si le snapshot est dû, puis quitter")
+    args = parser.parse_args(argv)
+
+    refresher = SnapshotRefresher(
+        output_dir=args.output_dir,
+        interval=args.interval,
+        retry_interval=args.retry_interval,
+        requests_per_minute=args.requests_per_minute,
+        workers=args.workers,
+        base_url=args.base_url
+    )
+    print(f"🔄 Rafraîchissement de {args.output_dir} toutes les {args.interval / 3600:g} h, "
+          f"{args.requests_per_minute:g} requêtes/min au plus")
+    refresher.run(once=args.once)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Snapshot compact des centres de contrôle technique (SQLite)
+
+Écrit par UTACScraper.get_all_french_centers à la fin d'un crawl national, dans
+centers.sqlite3 à côté des checkpoints par département. Une ligne par centre,
+indexée par numéro d'agrément, département et code postal : un centre ou un
+département se lit par requête, sans charger ni désérialiser le snapshot entier.
+
+Le fichier est construit à part puis remplacé atomiquement (os.replace) : les
+lecteurs l'ouvrent en lecture seule et ne voient jamais de snapshot à moitié écrit.
+"""
+import os
+import sqlite3
+import threading
+
+SNAPSHOT_DB = 'centers.sqlite3'
+
+# Colonnes d'un centre, dans l'ordre de UTACScraper._extract_center_from_row
+CENTER_COLUMNS = (
+    'agreement_number', 'raison_sociale', 'enseigne', 'adresse', 'ville',
+    'code_postal', 'telephone', 'option', 'site_internet', 'department'
+)
+
+_SELECT_CENTERS = f"SELECT {', '.join(CENTER_COLUMNS)} FROM centers"
+
+
+class SnapshotStore:
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Fichier SQLite du snapshot (ex: <snapshot_dir>/centers.sqlite3)
+        """
+        self.path = path
+        self._local = threading.local()
+
+    @classmethod
+    def in_directory(cls, snapshot_dir):
+        return cls(os.path.join(snapshot_dir, SNAPSHOT_DB))
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def write(self, centers, timestamp):
+        """
+        Remplace le snapshot par une nouvelle liste de centres
+
+        Args:
+            centers (list): Centres du crawl national (avec leur clé 'department')
+            timestamp (float): Fin du crawl
+        """
+        self.write_rows((self._row(center) for center in centers), timestamp)
+
+    def write_rows(self, rows, timestamp):
+        """
+        Remplace le snapshot par des lignes déjà ordonnées selon CENTER_COLUMNS
+        (ex: center_dedup.CenterColumns.rows())
+
+        Args:
+            rows (iterable): Lignes des centres
+            timestamp (float): Fin du crawl
+        """
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.execute(f'''
+                CREATE TABLE centers (
+                    agreement_number TEXT PRIMARY KEY,
+                    {', '.join(f'{column} TEXT' for column in CENTER_COLUMNS[1:])}
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value) WITHOUT ROWID')
+            # Un centre présent deux fois (pagination décalée) : la dernière occurrence l'emporte
+            conn.executemany(
+                f"INSERT OR REPLACE INTO centers VALUES ({', '.join('?' * len(CENTER_COLUMNS))})",
+                rows
+            )
+            conn.execute('CREATE INDEX idx_centers_department ON centers (department)')
+            conn.execute('CREATE INDEX idx_centers_code_postal ON centers (code_postal)')
+            count = conn.execute('SELECT COUNT(*) FROM centers').fetchone()[0]
+            conn.executemany('INSERT INTO meta VALUES (?, ?)', [
+                ('timestamp', timestamp),
+                ('total_centers', count)
+            ])
+            conn.commit()
+        finally:
+            conn.close()
+
+        os.replace(tmp_path, self.path)
+        # Les connexions ouvertes pointent sur l'ancien fichier
+        self._local = threading.local()
+
+    @staticmethod
+    def _row(center):
+        row = [center.get(column) or '' for column in CENTER_COLUMNS]
+        row[0] = row[0].strip().upper()
+        return row
+
+    def _connect(self):
+        """Connexion en lecture seule propre au thread et au processus"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            # immutable : le fichier n'est jamais modifié en place, seulement remplacé
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro&immutable=1", uri=True)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _center(row):
+        return dict(zip(CENTER_COLUMNS, row))
+
+    def _meta(self, key):
+        row = self._connect().execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def timestamp(self):
+        """Fin du crawl ayant produit le snapshot"""
+        return self._meta('timestamp')
+
+    def count(self):
+        return self._meta('total_centers') or 0
+
+    def get(self, agreement_number):
+        """
+        Centre d'un numéro d'agrément
+
+        Returns:
+            dict: Centre, ou None s'il est absent du snapshot
+        """
+        row = self._connect().execute(
+            f"{_SELECT_CENTERS} WHERE agreement_number = ?",
+            ((agreement_number or '').strip().upper(),)
+        ).fetchone()
+        return self._center(row) if row else None
+
+    def get_many(self, agreement_numbers):
+        """
+        Centres de plusieurs numéros d'agrément, en une requête
+
+        Returns:
+            dict: Numéro d'agrément -> centre, pour les numéros présents dans le snapshot
+        """
+        numbers = [(number or '').strip().upper() for number in agreement_numbers]
+        if not numbers:
+            return {}
+        rows = self._connect().execute(
+            f"{_SELECT_CENTERS} WHERE agreement_number IN ({', '.join('?' * len(numbers))})", numbers
+        )
+        return {row[0]: self._center(row) for row in rows}
+
+    def department(self, department_code):
+        """Centres d'un département, dans l'ordre des numéros d'agrément"""
+        rows = self._connect().execute(
+            f"{_SELECT_CENTERS} WHERE department = ? ORDER BY agreement_number", (department_code,)
+        )
+        return [self._center(row) for row in rows]
+
+    def iter_centers(self, columns=CENTER_COLUMNS):
+        """
+        Parcourt tous les centres sans les charger en mémoire d'un coup
+
+        Args:
+            columns (tuple): Colonnes lues (toutes par défaut)
+        """
+        columns = [column for column in columns if column in CENTER_COLUMNS]
+        query = f"SELECT {', '.join(columns)} FROM centers ORDER BY agreement_number"
+        for row in self._connect().execute(query):
+            yield dict(zip(columns, row))
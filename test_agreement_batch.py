@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Test de la recherche d'agréments par lot (POST /agreements) contre le serveur de rejeu local
+"""
+
+import contextlib
+import io
+import os
+import tempfile
+
+import api
+from center_index import CenterIndex
+from result_cache import ResultCache
+from utac_scraper import UTACScraper
+from benchmarks.fixtures import generate_centers
+from benchmarks.replay_server import ReplayServer
+
+
+def test_agreement_batch():
+    assert CenterIndex.department_of('S044C203') == '44'
+    assert CenterIndex.department_of('s004s062') == '04'
+    assert CenterIndex.department_of('S971A001') == '971'
+    assert CenterIndex.department_of('S500A001') is None
+    assert CenterIndex.department_of('ABC') is None
+
+    with ReplayServer() as server, tempfile.TemporaryDirectory() as tmp, \
+            contextlib.redirect_stdout(io.StringIO()):
+        api.scraper = UTACScraper(transport=api.upstream, base_url=server.url)
+        api.center_index = CenterIndex(tmp)
+        api.result_cache = ResultCache(os.path.join(tmp, 'result_cache.sqlite3'))
+        client = api.app.test_client()
+
+        centers_44 = generate_centers('44')
+        centers_13 = generate_centers('13')
+        numbers = [
+            centers_44[0]['agreement_number'],
+            centers_13[-1]['agreement_number'],
+            centers_44[5]['agreement_number'].lower(),  # casse ignorée
+            centers_44[0]['agreement_number'],          # doublon
+            'S044Z999',                                 # absent du département
+            'INCONNU'                                   # département non reconnu
+        ]
+        response = client.post('/agreements', json={'agreement_numbers': numbers})
+        assert response.status_code == 200
+        body = response.get_json()
+
+        # Une seule recherche par département, quel que soit le nombre de numéros
+        assert body['departments_fetched'] == ['13', '44']
+        assert server.requests['search'] == 2
+        assert body['total'] == 5 and body['found'] == 3 and body['failed'] == 2
+
+        results = {result['agreement_number']: result for result in body['results']}
+        assert [result['agreement_number'] for result in body['results']][:3] == [
+            centers_44[0]['agreement_number'], centers_13[-1]['agreement_number'], centers_44[5]['agreement_number']
+        ]
+        assert results[centers_13[-1]['agreement_number']]['data']['ville'] == centers_13[-1]['ville']
+        assert results['S044Z999']['status'] == 404
+        assert results['S044Z999']['department_code'] == '44'
+        assert results['INCONNU']['status'] == 400
+
+        # Deuxième lot : départements servis par le cache partagé avec /department
+        server.reset_counts()
+        response = client.post('/agreements', json={'agreement_numbers': [centers_44[7]['agreement_number']]})
+        assert response.get_json()['results'][0]['cache'] == 'hit'
+        assert server.requests.get('search', 0) == 0
+
+        # Requêtes invalides
+        assert client.post('/agreements', json={'agreement_numbers': 'S044C203'}).status_code == 400
+        assert client.post('/agreements', json={}).status_code == 400
+        too_many = ['S044C203'] * (api.BATCH_MAX_AGREEMENTS + 1)
+        assert client.post('/agreements', json={'agreement_numbers': too_many}).status_code == 400
+
+    print("✅ Recherche par lot: tous les tests réussis!")
+
+
+if __name__ == "__main__":
+    test_agreement_batch()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Test du scraper asyncio et des routes ASGI contre le serveur de rejeu local
+"""
+
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import threading
+
+import httpx
+
+import api
+import asgi
+from async_scraper import AsyncUTACScraper
+from center_index import CenterIndex
+from result_cache import ResultCache
+from snapshot_store import SnapshotStore
+from benchmarks.fixtures import generate_centers
+from benchmarks.replay_server import ReplayServer
+
+
+class _SubsetScraper(AsyncUTACScraper):
+    @staticmethod
+    def list_french_departments():
+        return ['04', '13', '44', '971']
+
+
+async def _check_scraper(server, output_dir):
+    scraper = _SubsetScraper(base_url=server.url)
+
+    # Recherches simultanées : chacune a sa propre session ASP.NET (pagination par cookie)
+    departments = ['04', '13', '44', '971']
+    results = await asyncio.gather(*[scraper.search_by_department(dept) for dept in departments])
+    for dept, result in zip(departments, results):
+        expected = [c['agreement_number'] for c in generate_centers(dept)]
+        assert [c['agreement_number'] for c in result['centers']] == expected, dept
+
+    center = generate_centers('44')[3]
+    details = await scraper.search_by_agreement_number(center['agreement_number'])
+    assert details['ville'] == center['ville']
+
+    assert (await scraper.search_by_department('xx'))['error'].startswith('Code département invalide')
+
+    # Crawl national : départements concurrents, checkpoints et fichier final du crawl synchrone
+    result = await scraper.get_all_french_centers(output_dir, workers=3, resume=False)
+    assert not result['errors']
+    assert result['data']['total_centers'] == sum(len(generate_centers(d)) for d in departments)
+    assert [c['department'] for c in result['data']['centers']][0] == '04'
+    assert os.path.exists(os.path.join(output_dir, 'dept_971.json'))
+    assert SnapshotStore.in_directory(output_dir).count() == result['data']['total_centers']
+
+    # Annulation : le crawl s'arrête sans laisser de tâche en cours
+    crawl = asyncio.create_task(scraper.get_all_french_centers(os.path.join(output_dir, 'cancelled'),
+                                                               workers=2, resume=False))
+    await asyncio.sleep(0.05)
+    crawl.cancel()
+    try:
+        await crawl
+        raise AssertionError("Le crawl aurait dû être annulé")
+    except asyncio.CancelledError:
+        pass
+    assert all(task.done() for task in asyncio.all_tasks() if task is not asyncio.current_task())
+
+    await scraper.aclose()
+
+
+async def _check_asgi():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi.app), base_url='http://test') as client:
+        responses = await asyncio.gather(client.get('/department/4'), client.get('/department/13'))
+        for response, dept in zip(responses, ['04', '13']):
+            assert response.status_code == 200
+            assert response.headers['X-Cache'] == 'MISS'
+            assert response.json()['data']['total_centers'] == len(generate_centers(dept))
+
+        response = await client.get('/department/04')
+        assert response.headers['X-Cache'] == 'HIT'
+
+        center = generate_centers('44')[1]
+        response = await client.get(f"/agreement/{center['agreement_number']}")
+        assert response.status_code == 200
+        assert response.json()['data']['code_postal'] == center['code_postal']
+
+        # Index local, cache, écriture des métriques et hooks Flask : jamais dans la boucle
+        loop_thread = threading.get_ident()
+        blocking_calls = []
+        patched = [(api.center_index, ['lookup', 'department', 'refresh_if_changed']),
+                   (api.result_cache, ['get', 'set', '_claim_inflight']),
+                   (api.metrics, ['flush'])]
+
+        def recording(name, func):
+            def wrapper(*args, **kwargs):
+                blocking_calls.append((name, threading.get_ident()))
+                return func(*args, **kwargs)
+            return wrapper
+
+        for obj, names in patched:
+            for name in names:
+                setattr(obj, name, recording(name, getattr(obj, name)))
+        flush_interval, api.metrics.flush_interval = api.metrics.flush_interval, 0
+        try:
+            assert (await client.get('/department/971')).status_code == 200
+            assert (await client.get(f"/agreement/{generate_centers('13')[2]['agreement_number']}")).status_code == 200
+            await asyncio.sleep(0.05)
+        finally:
+            api.metrics.flush_interval = flush_interval
+            for obj, names in patched:
+                for name in names:
+                    delattr(obj, name)
+        assert {name for name, _ in blocking_calls} >= {'lookup', 'department', 'get', 'set', 'flush'}
+        assert all(thread != loop_thread for _, thread in blocking_calls), \
+            [call for call in blocking_calls if call[1] == loop_thread]
+
+        # Entrée expirée : servie, puis rafraîchie par le scraper d'arrière-plan comme en WSGI
+        background = []
+        background_search = api._background_search
+        api._background_search = lambda method_name, *args: background.append((method_name, args)) or {}
+        try:
+            response = await client.get('/department/04')
+            ttl = api.CACHE_TTL_DEPARTMENT
+            api.CACHE_TTL_DEPARTMENT = 0
+            try:
+                response = await client.get('/department/04')
+                assert response.headers['X-Cache'] == 'STALE'
+                for _ in range(50):
+                    if background:
+                        break
+                    await asyncio.sleep(0.02)
+            finally:
+                api.CACHE_TTL_DEPARTMENT = ttl
+        finally:
+            api._background_search = background_search
+        assert background == [('search_by_department', ('04',))]
+
+        # Routes non asynchrones : servies par l'application Flask
+        response = await client.get('/health')
+        assert response.status_code == 200
+        response = await client.get('/metrics')
+        assert 'endpoint="/department/<string:department_code>"' in response.text
+
+    await asgi.scraper.aclose()
+
+
+def test_async_scraper():
+    with ReplayServer(latency=0.01) as server, tempfile.TemporaryDirectory() as tmp, \
+            contextlib.redirect_stdout(io.StringIO()):
+        asyncio.run(_check_scraper(server, tmp))
+
+        asgi.scraper = AsyncUTACScraper(transport=api.upstream, metrics=api.metrics, base_url=server.url)
+        api.center_index = CenterIndex(os.path.join(tmp, 'api'))
+        api.result_cache = ResultCache(os.path.join(tmp, 'api', 'result_cache.sqlite3'))
+        asyncio.run(_check_asgi())
+
+    print("✅ Scraper asyncio: tous les tests réussis!")
+
+
+if __name__ == "__main__":
+    test_async_scraper()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Test du dédoublonnage et de la normalisation des centres en fin de crawl national
+"""
+
+import tempfile
+
+from center_dedup import dedupe_centers, department_from_postal, normalize_postal_code
+from snapshot_store import SnapshotStore
+
+
+def _center(agreement_number, code_postal, **fields):
+    center = {
+        'raison_sociale': 'BA CONTROLE', 'agreement_number': agreement_number, 'enseigne': 'BA CONTROLE',
+        'adresse': '3 AVENUE EMILE AUBERT', 'ville': 'BARCELONNETTE', 'code_postal': code_postal,
+        'telephone': '04 92 81 15 89', 'option': '', 'site_internet': ''
+    }
+    center.update(fields)
+    return center
+
+
+def test_center_dedup():
+    assert normalize_postal_code('4400') == '04400'
+    assert normalize_postal_code('44 230') == '44230'
+    assert normalize_postal_code('ABC') is None
+    assert department_from_postal('44230') == '44'
+    assert department_from_postal('4400') == '04'
+    assert department_from_postal('97122') == '971'
+    assert department_from_postal('98800') == '988'
+    assert department_from_postal('') is None
+
+    columns = dedupe_centers([
+        ('04', [
+            _center(' s004s062 ', '04400', raison_sociale='  ba   controle ', telephone=' 04  92 81 15 89'),
+            # Centre du 05 renvoyé par la recherche du 04
+            _center('S005A001', '05000', ville='gap'),
+            _center('', '04000'),
+        ]),
+        ('05', [
+            _center('S005A001', '05000', ville='GAP', telephone='04 92 00 00 00'),
+        ]),
+        ('44', [
+            # Doublon trouvé hors de son département : la ligne du 04 est conservée
+            _center('S004S062', '04400', telephone='00 00 00 00 00'),
+            # Département 13 non récupéré : le centre reste dans le 44
+            _center('S013A001', '13090'),
+            _center('S044C203', '4423O'),
+            # Centre du 05 trouvé seulement par la recherche du 44
+            _center('S005B002', '05100', ville='briancon'),
+        ]),
+    ], departments=['04', '05', '44'])
+
+    centers = {center['agreement_number']: center for center in columns.to_centers()}
+    assert len(columns) == len(centers) == 5
+
+    assert centers['S004S062']['raison_sociale'] == 'BA CONTROLE'
+    assert centers['S004S062']['telephone'] == '04 92 81 15 89'
+    assert centers['S004S062']['department'] == '04'
+
+    # La ligne trouvée dans le département du code postal remplace la première
+    assert centers['S005A001']['department'] == '05'
+    assert centers['S005A001']['telephone'] == '04 92 00 00 00'
+
+    assert centers['S005B002']['department'] == '05'
+    assert centers['S013A001']['department'] == '44'
+    # Code postal illisible : département du crawl
+    assert centers['S044C203']['department'] == '44'
+
+    assert columns.stats == {
+        'input_centers': 8,
+        'duplicates_removed': 2,
+        'departments_reassigned': 1,
+        'missing_agreement': 1
+    }
+
+    # Snapshot écrit directement depuis les colonnes
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        store = SnapshotStore.in_directory(snapshot_dir)
+        store.write_rows(columns.rows(), 1.0)
+        assert store.count() == 5
+        assert store.get('S005A001')['ville'] == 'GAP'
+        assert [c['agreement_number'] for c in store.department('04')] == ['S004S062']
+
+    print("✅ Dédoublonnage et normalisation: tous les tests réussis!")
+
+
+if __name__ == "__main__":
+    test_center_dedup()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Test des recherches dans le snapshot local (GET /centers, GET /postal/<prefix>)
+"""
+
+import tempfile
+import time
+
+import api
+from center_index import CenterIndex
+from snapshot_store import SnapshotStore
+from benchmarks.fixtures import generate_centers
+
+DEPARTMENTS = ['04', '13', '44', '971']
+
+
+def _brute_force(centers, **criteria):
+    """Filtrage de référence, centre par centre"""
+    def matches(center):
+        for field, value in criteria.items():
+            if field == 'option':
+                if value.upper() not in center['option'].replace('*', ' ').replace('-', ' ').split():
+                    return False
+            elif center[field].upper() != value.upper():
+                return False
+        return True
+    return sorted(center['agreement_number'] for center in centers if matches(center))
+
+
+def _by_prefix(centers, prefix):
+    """Recherche par préfixe de référence, triée par code postal puis numéro d'agrément"""
+    matching = [c for c in centers if c['code_postal'].zfill(5).startswith(prefix)]
+    return [c['agreement_number'] for c in sorted(matching, key=lambda c: (c['code_postal'].zfill(5), c['agreement_number']))]
+
+
+def test_center_filter():
+    now = time.time()
+    centers = []
+    for dept in DEPARTMENTS:
+        centers.extend(dict(center, department=dept) for center in generate_centers(dept))
+    # Code postal sans son zéro initial (04400 saisi comme nombre)
+    centers.append({'agreement_number': 'S004Z900', 'raison_sociale': 'BA CONTROLE', 'ville': 'BARCELONNETTE',
+                    'code_postal': '4400', 'option': '', 'enseigne': 'BA CONTROLE', 'department': '04'})
+
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        SnapshotStore.in_directory(snapshot_dir).write(centers, now - 3600)
+        index = CenterIndex(snapshot_dir, check_interval=0)
+        index.load()
+
+        sample = centers[10]
+        for criteria in [
+            {'code_postal': sample['code_postal']},
+            {'department': '13', 'enseigne': 'autosur'},
+            {'option': 'gaz', 'department': '44'},
+            {'option': 'ELECTRIQUE'},
+            {'ville': ' la  garde ', 'option': 'GAZ', 'department': '971'},
+        ]:
+            result = index.filter(criteria, limit=1000)
+            expected = _brute_force(centers, **{k: ' '.join(v.split()) for k, v in criteria.items()})
+            assert [c['agreement_number'] for c in result['centers']] == expected, criteria
+            assert result['total'] == len(expected) > 0
+
+        # Pagination
+        everything = _brute_force(centers, department='13')
+        page = index.filter({'department': '13'}, offset=5, limit=10)
+        assert page['total'] == len(everything)
+        assert [c['agreement_number'] for c in page['centers']] == everything[5:15]
+        assert index.filter({}, limit=3)['total'] == len(centers)
+        assert index.filter({'enseigne': 'INCONNUE', 'department': '13'})['total'] == 0
+
+        # Préfixe de code postal, outre-mer compris
+        for prefix in ['0', '04', '044', '04400', '13', '9', '97', '971', sample['code_postal'], '972', '5']:
+            expected = _by_prefix(centers, prefix)
+            result = index.by_postal_prefix(prefix, limit=1000)
+            assert [c['agreement_number'] for c in result['centers']] == expected, prefix
+            assert result['total'] == len(expected)
+        assert 'S004Z900' in _by_prefix(centers, '04400')
+        assert index.by_postal_prefix('971', limit=1000)['total'] == len(generate_centers('971'))
+        page = index.by_postal_prefix('1', offset=3, limit=4)
+        assert [c['agreement_number'] for c in page['centers']] == _by_prefix(centers, '1')[3:7]
+        assert index.by_postal_prefix('1', offset=10000)['centers'] == []
+
+        # Nouveau snapshot publié : les index inversés suivent le rechargement
+        moved = dict(centers[0], ville='DIGNE LES BAINS')
+        SnapshotStore.in_directory(snapshot_dir).write([moved] + centers[1:], now)
+        result = index.filter({'ville': 'DIGNE LES BAINS'})
+        assert [c['agreement_number'] for c in result['centers']] == [moved['agreement_number']]
+        assert moved['agreement_number'] not in [
+            c['agreement_number'] for c in index.filter({'ville': centers[0]['ville'], 'department': '04'}, limit=1000)['centers']
+        ]
+
+        # API
+        api.center_index = index
+        client = api.app.test_client()
+        response = client.get('/centers?department=4&ville=digne%20les%20bains')
+        assert response.status_code == 200
+        body = response.get_json()
+        assert body['source'] == 'snapshot'
+        assert body['filters'] == {'department': '04', 'ville': 'digne les bains'}
+        assert body['data']['total'] == 1
+        assert body['data']['centers'][0]['agreement_number'] == moved['agreement_number']
+
+        response = client.get('/centers?department=13&limit=2&offset=1')
+        assert [c['agreement_number'] for c in response.get_json()['data']['centers']] == everything[1:3]
+        assert client.get('/centers?limit=0').status_code == 400
+        assert client.get('/centers?offset=abc').status_code == 400
+
+        response = client.get('/postal/971?limit=5')
+        assert response.status_code == 200
+        body = response.get_json()
+        assert body['prefix'] == '971'
+        assert body['data']['total'] == len(generate_centers('971'))
+        assert [c['agreement_number'] for c in body['data']['centers']] == _by_prefix(centers, '971')[:5]
+        assert client.get('/postal/44a').status_code == 400
+        assert client.get('/postal/123456').status_code == 400
+
+    with tempfile.TemporaryDirectory() as empty_dir:
+        api.center_index = CenterIndex(empty_dir)
+        api.center_index.load()
+        assert api.app.test_client().get('/centers?department=13').status_code == 404
+        assert api.app.test_client().get('/postal/13').status_code == 404
+
+    print("✅ Recherche multi-critères: tous les tests réussis!")
+
+
+if __name__ == "__main__":
+    test_center_filter()
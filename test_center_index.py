@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test de l'index local des centres
+"""
+
+import json
+import os
+import tempfile
+import time
+
+from center_index import CenterIndex
+from snapshot_store import SnapshotStore
+
+
+def _write(path, payload):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f)
+
+
+def test_center_index():
+    now = time.time()
+
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        _write(os.path.join(snapshot_dir, 'all_french_centers.json'), {
+            'success': True,
+            'timestamp': now - 3600,
+            'data': {
+                'total_centers': 2,
+                'centers': [
+                    {'agreement_number': 'S044C203', 'raison_sociale': 'CONTROLE TECHNIQUE SAINT SEB',
+                     'ville': 'ST SEBASTIEN SUR LOIRE', 'code_postal': '44230', 'department': '44'},
+                    {'agreement_number': 'S004S062', 'raison_sociale': 'BA CONTROLE',
+                     'ville': 'BARCELONNETTE', 'code_postal': '04400', 'department': '04'},
+                ]
+            }
+        })
+        # Département d'un crawl en cours (ou en erreur) : ignoré, seul le snapshot publié est servi
+        _write(os.path.join(snapshot_dir, 'dept_04.json'), {
+            'department_code': '04',
+            'total_centers': 1,
+            'centers': [
+                {'agreement_number': 'S004S062', 'raison_sociale': 'BA CONTROLE SARL',
+                 'ville': 'BARCELONNETTE', 'code_postal': '04400', 'department': '04'},
+            ],
+            'timestamp': now
+        })
+
+        index = CenterIndex(snapshot_dir, max_age=1800)
+        assert index.load() == 2
+
+        center, age, stale = index.lookup(' s044c203 ')
+        assert center['raison_sociale'] == 'CONTROLE TECHNIQUE SAINT SEB'
+        assert age >= 3600
+        assert stale
+
+        center, age, stale = index.lookup('S004S062')
+        assert center['raison_sociale'] == 'BA CONTROLE'
+        assert stale
+
+        assert index.lookup('S999X999') is None
+        assert index.stats()['total_centers'] == 2
+
+    # Snapshot SQLite : prioritaire sur le JSON, lu à la demande
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        store = SnapshotStore.in_directory(snapshot_dir)
+        store.write([
+            {'agreement_number': 'S044C203', 'raison_sociale': 'CONTROLE TECHNIQUE SAINT SEB',
+             'ville': 'ST SEBASTIEN SUR LOIRE', 'code_postal': '44230', 'department': '44'},
+            {'agreement_number': 's004s062', 'raison_sociale': 'BA CONTROLE',
+             'ville': 'BARCELONNETTE', 'code_postal': '04400', 'department': '04'},
+            {'agreement_number': 'S044C999', 'raison_sociale': 'AUTO BILAN NANTES',
+             'ville': 'NANTES', 'code_postal': '44000', 'department': '44'},
+        ], now - 3600)
+        assert store.count() == 3
+        assert store.get('S004S062')['ville'] == 'BARCELONNETTE'
+        assert [c['agreement_number'] for c in store.department('44')] == ['S044C203', 'S044C999']
+        assert store.get('S999X999') is None
+
+        _write(os.path.join(snapshot_dir, 'dept_04.json'), {
+            'department_code': '04',
+            'centers': [
+                {'agreement_number': 'S004S062', 'raison_sociale': 'BA CONTROLE SARL', 'department': '04'},
+                {'agreement_number': 'S004S070', 'raison_sociale': 'SISTERON CONTROLE', 'department': '04'},
+            ],
+            'timestamp': now
+        })
+
+        index = CenterIndex(snapshot_dir, max_age=1800)
+        assert index.load() == 3
+        assert not index.by_agreement
+        assert index.lookup('S004S070') is None
+
+        center, age, stale = index.lookup('s044c999')
+        assert center['code_postal'] == '44000'
+        assert stale
+
+        center, age, stale = index.lookup('S004S062')
+        assert center['raison_sociale'] == 'BA CONTROLE'
+        assert stale
+        assert index.stats()['total_centers'] == 3
+
+    print("✅ Index local: tous les tests réussis!")
+
+
+if __name__ == "__main__":
+    test_center_index()
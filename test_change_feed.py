@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Test du flux de changements entre deux crawls nationaux
+"""
+
+import copy
+import os
+import tempfile
+
+import json_codec
+from center_dedup import normalize_center
+from change_feed import ChangeFeed, MANIFEST_FILE
+from benchmarks.fixtures import generate_centers
+
+
+def _with_department(dept, count):
+    centers = generate_centers(dept, count=count)
+    for center in centers:
+        center['department'] = dept
+    return centers
+
+
+def test_change_feed():
+    with tempfile.TemporaryDirectory() as output_dir:
+        feed = ChangeFeed(output_dir, retention=1000)
+        dept_04 = _with_department('04', 5)
+        dept_13 = _with_department('13', 5)
+
+        # Premier crawl : snapshot de référence, aucun changement journalisé
+        summary = feed.record_snapshot(dept_04 + dept_13, ['04', '13'], timestamp=100)
+        assert summary['baseline']
+        assert feed.changes_since(0)['full_resync_required']
+        assert feed.changes_since(100)['changesets'] == 0
+
+        # Second crawl : une modification, un ajout, une suppression dans le 04 ;
+        # le 13 en erreur n'est pas considéré comme supprimé
+        new_04 = copy.deepcopy(dept_04)
+        new_04[0]['telephone'] = '04 00 00 00 00'
+        removed = new_04.pop(1)
+        added = _with_department('04', 7)[6]
+        new_04.append(added)
+        summary = feed.record_snapshot(new_04, ['04'], timestamp=200)
+        assert (summary['added'], summary['removed'], summary['modified']) == (1, 1, 1)
+        assert summary['changed_departments'] == 1
+
+        changes = feed.changes_since(100)
+        assert not changes['full_resync_required']
+        assert changes['latest_timestamp'] == 200
+        assert [c['agreement_number'] for c in changes['added']] == [added['agreement_number']]
+        assert [c['agreement_number'] for c in changes['removed']] == [removed['agreement_number']]
+        assert changes['modified'][0]['changed_fields'] == ['telephone']
+
+        # Troisième crawl : le centre ajouté disparaît, le 13 est inchangé
+        summary = feed.record_snapshot(new_04[:-1] + dept_13, ['04', '13'], timestamp=300)
+        assert (summary['added'], summary['removed'], summary['modified']) == (0, 1, 0)
+
+        # Changements nets depuis le premier crawl : l'ajout puis la suppression s'annulent
+        changes = feed.changes_since(100)
+        assert changes['changesets'] == 2
+        assert changes['added'] == []
+        assert [c['agreement_number'] for c in changes['removed']] == [removed['agreement_number']]
+        assert len(changes['modified']) == 1
+
+        # Le manifeste (tous les centres) n'est relu par changes_since que s'il change
+        loads = []
+        load_manifest = feed._load_manifest
+        feed._load_manifest = lambda: loads.append(1) or load_manifest()
+        feed.changes_since(100)
+        feed.changes_since(200)
+        assert len(loads) <= 1
+        feed._load_manifest = load_manifest
+
+        # Au-delà de la rétention, les lots purgés imposent une resynchronisation complète
+        feed.record_snapshot(dept_04 + dept_13, ['04', '13'], timestamp=2000)
+        assert feed.changes_since(100)['full_resync_required']
+        assert not feed.changes_since(300)['full_resync_required']
+
+    # Manifeste écrit avant la normalisation des centres : normalisé avant la comparaison,
+    # seuls les vrais changements sont journalisés
+    with tempfile.TemporaryDirectory() as output_dir:
+        feed = ChangeFeed(output_dir)
+        raw_04 = _with_department('04', 5)
+        for center in raw_04:
+            center['ville'] = f"  {center['ville'].title()} "
+            center['adresse'] = center['adresse'].lower()
+        feed.record_snapshot(raw_04, ['04'], timestamp=100)
+        manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+        manifest = json_codec.read_file(manifest_path)
+        del manifest['version']
+        json_codec.write_file(manifest_path, manifest)
+
+        normalized_04 = [normalize_center(center) for center in raw_04]
+        normalized_04[2]['telephone'] = '04 00 00 00 00'
+        summary = feed.record_snapshot(normalized_04, ['04'], timestamp=200)
+        assert (summary['added'], summary['removed'], summary['modified']) == (0, 0, 1)
+        assert feed.changes_since(100)['modified'][0]['changed_fields'] == ['telephone']
+        assert json_codec.read_file(manifest_path)['version'] == 2
+
+    print("✅ Flux de changements: tous les tests réussis!")
+
+
+if __name__ == "__main__":
+    test_change_feed()
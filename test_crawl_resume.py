@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Test de la reprise du crawl national à partir des checkpoints
+"""
+
+import contextlib
+import io
+import json
+import os
+import tempfile
+
+import requests
+
+from snapshot_store import SnapshotStore
+from utac_scraper import UTACScraper
+from upstream import UpstreamTransport
+from benchmarks.fixtures import generate_centers, render_page, render_results_page
+
+
+class _Response:
+    def __init__(self, html):
+        self.content = html.encode('utf-8')
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+
+class _ReplaySession:
+    """Session simulant Retrouver_un_CT.aspx, avec une coupure réseau optionnelle"""
+
+    def __init__(self, fail_at=None):
+        self.fail_at = fail_at
+        self.posts = []
+        self.department = None
+
+    def get(self, url, **kwargs):
+        return _Response(render_page())
+
+    def post(self, url, data=None, **kwargs):
+        argument = data.get('__EVENTARGUMENT', '')
+        self.posts.append(argument)
+        if not argument:
+            self.department = next(v for k, v in data.items() if k.endswith('critereValueInput'))
+            return _Response(render_results_page(generate_centers(self.department), 1))
+        if self.fail_at == (self.department, argument):
+            raise requests.ConnectionError("Coupure réseau simulée")
+        return _Response(render_results_page(generate_centers(self.department), int(argument.split('$')[1])))
+
+
+class _ThreeDepartmentsScraper(UTACScraper):
+    @staticmethod
+    def list_french_departments():
+        return ['04', '13', '44']
+
+
+def _crawl(output_dir, session):
+    scraper = _ThreeDepartmentsScraper(transport=UpstreamTransport(backoff=0))
+    scraper.session = session
+    with contextlib.redirect_stdout(io.StringIO()):
+        return scraper.get_all_french_centers(output_dir)
+
+
+def test_crawl_resume():
+    expected = sum(len(generate_centers(dept)) for dept in ['04', '13', '44'])
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        # Premier crawl : coupure sur la page 4 du département 13
+        result = _crawl(output_dir, _ReplaySession(fail_at=('13', 'Page$4')))
+        assert result['department_statistics']['13']['status'] == 'error'
+        assert result['department_statistics']['13']['pages_completed'] == 3
+        assert os.path.exists(os.path.join(output_dir, 'dept_13.json.partial'))
+        with open(os.path.join(output_dir, 'crawl_state.json')) as f:
+            assert not json.load(f)['finished']
+        # Crawl incomplet : le snapshot publié n'est pas remplacé
+        assert not result['summary']['published']
+        assert result['summary']['changes'] is None
+        assert not os.path.exists(os.path.join(output_dir, 'all_french_centers.json'))
+        assert not os.path.exists(SnapshotStore.in_directory(output_dir).path)
+
+        # Reprise : 04 et 44 sautés, 13 repris à la page 4 (recherche + un seul postback)
+        session = _ReplaySession()
+        result = _crawl(output_dir, session)
+        assert session.posts == ['', 'Page$4']
+        assert result['errors'] == []
+        assert result['department_statistics']['04']['from_checkpoint']
+        assert result['data']['total_centers'] == expected
+        assert len({c['agreement_number'] for c in result['data']['centers']}) == expected
+        assert not os.path.exists(os.path.join(output_dir, 'dept_13.json.partial'))
+        assert result['summary']['published']
+        assert SnapshotStore.in_directory(output_dir).count() == expected
+
+        # Crawl terminé : un nouvel appel repart de zéro
+        session = _ReplaySession()
+        _crawl(output_dir, session)
+        assert session.posts.count('') == 3
+
+    print("✅ Reprise du crawl: tous les tests réussis!")
+
+
+if __name__ == "__main__":
+    test_crawl_resume()
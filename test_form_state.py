@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Test du gabarit de formulaire en cache : nouvel essai seulement s'il provenait du cache
+"""
+
+import contextlib
+import io
+import time
+
+import requests
+
+from utac_scraper import UTACScraper
+from upstream import UpstreamTransport
+from benchmarks.fixtures import generate_centers, render_page, render_results_page
+
+
+class _Response:
+    def __init__(self, html):
+        self.content = html.encode('utf-8')
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+
+class _FlakySession:
+    """Session simulant Retrouver_un_CT.aspx, dont les prochains POST échouent sur demande"""
+
+    def __init__(self):
+        self.gets = 0
+        self.posts = 0
+        self.failures = 0
+
+    def get(self, url, **kwargs):
+        self.gets += 1
+        return _Response(render_page())
+
+    def post(self, url, data=None, **kwargs):
+        self.posts += 1
+        if self.failures:
+            self.failures -= 1
+            raise requests.ConnectionError("Session ASP.NET expirée")
+        return _Response(render_results_page(generate_centers('04'), 1))
+
+
+def _search(scraper, session, failures=0):
+    session.gets = session.posts = 0
+    session.failures = failures
+    with contextlib.redirect_stdout(io.StringIO()):
+        return scraper._submit_search('Departement', '04')
+
+
+def test_form_state():
+    scraper = UTACScraper(form_state_ttl=0.2, transport=UpstreamTransport(retries=0, backoff=0))
+    session = scraper.session = _FlakySession()
+
+    # Gabarit récupéré à l'instant : pas de nouvel essai
+    soup, error = _search(scraper, session, failures=1)
+    assert soup is None and error
+    assert (session.gets, session.posts) == (1, 1)
+
+    # Gabarit en cache : nouvel essai avec un gabarit frais
+    assert _search(scraper, session)[1] is None
+    soup, error = _search(scraper, session, failures=1)
+    assert soup is not None and error is None
+    assert (session.gets, session.posts) == (1, 2)
+
+    # Gabarit en cache mais expiré : récupéré à l'instant, donc pas de nouvel essai
+    assert _search(scraper, session)[1] is None
+    time.sleep(0.25)
+    soup, error = _search(scraper, session, failures=1)
+    assert soup is None and error
+    assert (session.gets, session.posts) == (1, 1)
+
+    print("✅ Gabarit de formulaire: tous les tests réussis!")
+
+
+if __name__ == "__main__":
+    test_form_state()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test de la compression des réponses JSON et des requêtes conditionnelles
+(ETag, If-None-Match, 304 Not Modified)
+"""
+
+import gzip
+import json
+import os
+import tempfile
+import time
+
+import api
+from center_index import CenterIndex
+from snapshot_store import SnapshotStore
+from benchmarks.fixtures import generate_centers
+
+DEPARTMENTS = ['04', '13']
+
+
+def _write_snapshot(snapshot_dir, centers, timestamp):
+    SnapshotStore.in_directory(snapshot_dir).write(centers, timestamp)
+    # Date de modification distincte même si deux écritures tombent dans la même seconde
+    path = os.path.join(snapshot_dir, 'centers.sqlite3')
+    os.utime(path, (timestamp, timestamp))
+
+
+def test_http_caching():
+    now = time.time()
+    centers = []
+    for dept in DEPARTMENTS:
+        centers.extend(dict(center, department=dept) for center in generate_centers(dept))
+
+    live_index = api.center_index
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        _write_snapshot(snapshot_dir, centers, now - 3600)
+        api.center_index = CenterIndex(snapshot_dir, check_interval=0)
+        api.center_index.load()
+        client = api.app.test_client()
+        try:
+            # Compression négociée : même contenu, ETag distinct par encodage
+            plain = client.get('/all-centers')
+            assert plain.status_code == 200
+            assert 'Content-Encoding' not in plain.headers
+            assert 'Accept-Encoding' in plain.headers['Vary']
+            compressed = client.get('/all-centers', headers={'Accept-Encoding': 'gzip, deflate'})
+            assert compressed.headers['Content-Encoding'] == 'gzip'
+            assert len(compressed.data) < len(plain.data) / 3
+            assert json.loads(gzip.decompress(compressed.data)) == plain.get_json()
+            etag = compressed.headers['ETag']
+            assert etag.startswith('"') and etag != plain.headers['ETag']
+            assert client.get('/all-centers', headers={'Accept-Encoding': 'gzip;q=0'}).headers['ETag'] == plain.headers['ETag']
+
+            # Client à jour : 304 sans relire ni sérialiser le snapshot
+            api.center_index.iter_centers = None
+            response = client.get('/all-centers', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+            assert response.status_code == 304
+            assert response.data == b''
+            assert response.headers['ETag'] == etag
+            del api.center_index.iter_centers
+            response = client.get('/all-centers', headers={'If-None-Match': etag})
+            assert response.status_code == 200
+
+            # Département et pages du snapshot
+            department = client.get('/department/13', headers={'Accept-Encoding': 'gzip'})
+            assert department.headers['Content-Encoding'] == 'gzip'
+            headers = {'Accept-Encoding': 'gzip', 'If-None-Match': department.headers['ETag']}
+            assert client.get('/department/13', headers=headers).status_code == 304
+            assert client.get('/department/04', headers=headers).status_code == 200
+            # POST : compressé comme le GET, sans ETag
+            posted = client.post('/department', json={'department_code': '13'}, headers={'Accept-Encoding': 'gzip'})
+            assert posted.status_code == 200
+            assert posted.headers['Content-Encoding'] == 'gzip'
+            assert 'Accept-Encoding' in posted.headers['Vary']
+            assert 'ETag' not in posted.headers
+            assert json.loads(gzip.decompress(posted.data))['data']['total_centers'] == \
+                json.loads(gzip.decompress(department.data))['data']['total_centers']
+            assert 'Content-Encoding' not in client.post('/department', json={'department_code': '13'}).headers
+            page = client.get('/centers?department=13&limit=5')
+            assert client.get('/centers?department=13&limit=5',
+                              headers={'If-None-Match': page.headers['ETag']}).status_code == 304
+            assert client.get('/centers?department=13&limit=6',
+                              headers={'If-None-Match': page.headers['ETag']}).status_code == 200
+
+            # Streaming NDJSON : ETag posé sans consommer le générateur
+            consumed = []
+            iter_centers = api.center_index.iter_centers
+            api.center_index.iter_centers = lambda: (consumed.append(c) or c for c in iter_centers())
+            stream = client.get('/all-centers?format=ndjson', buffered=False)
+            assert stream.is_streamed and 'ETag' in stream.headers and 'Content-Length' not in stream.headers
+            assert len(consumed) <= 1
+            lines = stream.get_data().splitlines()
+            stream.close()
+            assert len(lines) == len(centers) == len(consumed)
+            del api.center_index.iter_centers
+            assert client.get('/all-centers?format=ndjson',
+                              headers={'If-None-Match': stream.headers['ETag']}).status_code == 304
+
+            # Nouveau snapshot : nouvel ETag
+            _write_snapshot(snapshot_dir, centers[:-1], now)
+            response = client.get('/all-centers', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+            assert response.status_code == 200
+            assert response.headers['ETag'] != etag
+            assert json.loads(gzip.decompress(response.data))['data']['total_centers'] == len(centers) - 1
+
+            # Autres réponses JSON : ETag calculé sur le contenu
+            home = client.get('/')
+            assert client.get('/', headers={'If-None-Match': home.headers['ETag']}).status_code == 304
+            assert client.get('/', headers={'If-None-Match': '*'}).status_code == 304
+
+            # Erreurs : pas d'ETag ; petites réponses : pas de compression
+            invalid = client.get('/centers?limit=abc', headers={'Accept-Encoding': 'gzip'})
+            assert invalid.status_code == 400
+            assert 'ETag' not in invalid.headers and 'Content-Encoding' not in invalid.headers
+            small = client.get('/postal/13?limit=1', headers={'Accept-Encoding': 'gzip'})
+            assert small.status_code == 200 and len(small.data) < api.COMPRESSION_MIN_SIZE
+            assert 'Content-Encoding' not in small.headers and 'ETag' in small.headers
+        finally:
+            api.center_index = live_index
+
+    print("✅ Compression et ETag: tous les tests réussis!")
+
+
+if __name__ == "__main__":
+    test_http_caching()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Test de la sérialisation JSON (json_codec) et des réponses de l'API
+"""
+
+import datetime
+import json
+import os
+import tempfile
+
+import api
+import json_codec
+from benchmarks.fixtures import generate_centers
+
+
+def test_json_codec():
+    payload = {'ville': 'SAINT-ÉTIENNE', 'b': [1, 2.5, None, True], 'a': {'z': 1, 'y': ''}}
+
+    for name, backend in json_codec.BACKENDS.items():
+        compact = backend.dumps(payload)
+        assert isinstance(compact, bytes)
+        assert json.loads(compact) == payload
+        assert b' ' not in compact.replace('SAINT-ÉTIENNE'.encode('utf-8'), b''), name
+        assert 'ÉTIENNE'.encode('utf-8') in compact
+        assert backend.loads(compact) == backend.loads(compact.decode('utf-8')) == payload
+
+        pretty = backend.dumps(payload, pretty=True)
+        assert pretty.startswith(b'{\n  "') and json.loads(pretty) == payload
+
+        assert list(json.loads(backend.dumps(payload, sort_keys=True))) == ['a', 'b', 'ville']
+        assert json.loads(backend.dumps({'d': datetime.date(2024, 1, 2)}, default=str)) == {'d': '2024-01-02'}
+
+    # Les backends produisent le même JSON compact
+    centers = generate_centers('13')
+    outputs = {backend.dumps(centers, sort_keys=True) for backend in json_codec.BACKENDS.values()}
+    assert len(outputs) == 1
+
+    try:
+        json_codec.get_backend('simplejson')
+        assert False, "Backend inconnu accepté"
+    except ValueError:
+        pass
+
+    # Fichiers : écriture atomique, compacte par défaut
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'dept_13.json')
+        json_codec.write_file(path, {'centers': centers})
+        assert json_codec.read_file(path) == {'centers': centers}
+        assert os.listdir(tmp) == ['dept_13.json']
+        compact_size = os.path.getsize(path)
+        json_codec.write_file(path, {'centers': centers}, pretty=True)
+        assert os.path.getsize(path) > compact_size
+
+        with open(path, 'w') as f:
+            f.write('{"centers": [')
+        try:
+            json_codec.read_file(path)
+            assert False, "JSON tronqué accepté"
+        except ValueError:
+            pass
+
+    # Réponses de l'API : compactes, indentées avec ?pretty=true
+    client = api.app.test_client()
+    compact = client.get('/')
+    assert compact.data.count(b'\n') == 1
+    pretty = client.get('/?pretty=true')
+    assert pretty.data.count(b'\n') > 10
+    assert pretty.get_json() == compact.get_json()
+    assert 'contrôle'.encode('utf-8') in compact.data
+
+    print("✅ Sérialisation JSON: tous les tests réussis!")
+
+
+if __name__ == "__main__":
+    test_json_codec()
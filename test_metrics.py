@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Test des métriques Prometheus agrégées entre processus
+"""
+
+import multiprocessing
+import os
+import tempfile
+
+from metrics import MetricsRegistry, ARCHIVE_FILE
+
+
+def _worker(registry):
+    # Processus distinct (autre worker gunicorn) : repart de zéro après le fork
+    registry.inc('utac_department_pages_fetched_total', 3, department='13')
+    registry.observe('utac_upstream_phase_duration_seconds', 0.2, phase='search_post')
+    registry.inc('utac_cache_requests_total', cache='result', kind='department', status='miss')
+    registry.flush()
+
+
+def test_metrics():
+    with tempfile.TemporaryDirectory() as metrics_dir:
+        registry = MetricsRegistry(metrics_dir, flush_interval=3600)
+        registry.inc('utac_department_pages_fetched_total', 2, department='13')
+        registry.observe('utac_upstream_phase_duration_seconds', 0.03, phase='search_post')
+        registry.inc('utac_cache_requests_total', cache='result', kind='department', status='hit')
+
+        process = multiprocessing.get_context('fork').Process(target=_worker, args=(registry,))
+        process.start()
+        process.join()
+
+        text = registry.render()
+        assert 'utac_department_pages_fetched_total{department="13"} 5' in text
+        assert 'utac_upstream_phase_duration_seconds_bucket{phase="search_post",le="0.05"} 1' in text
+        assert 'utac_upstream_phase_duration_seconds_bucket{phase="search_post",le="0.25"} 2' in text
+        assert 'utac_upstream_phase_duration_seconds_count{phase="search_post"} 2' in text
+        assert 'utac_cache_hit_ratio{cache="result",kind="department"} 0.5' in text
+        assert '# TYPE utac_upstream_phase_duration_seconds histogram' in text
+
+        # Le worker terminé est replié dans l'archive, sans double comptage
+        assert os.path.exists(os.path.join(metrics_dir, ARCHIVE_FILE))
+        assert not os.path.exists(os.path.join(metrics_dir, f"metrics_{process.pid}.json"))
+        assert 'utac_department_pages_fetched_total{department="13"} 5' in registry.render()
+
+    print("✅ Métriques: tous les tests réussis!")
+
+
+if __name__ == "__main__":
+    test_metrics()
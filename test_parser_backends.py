@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Test des backends de parsing : le parsing par zones doit donner les mêmes résultats
+que le parsing complet historique (html.parser)
+"""
+
+from utac_scraper import UTACScraper
+from benchmarks.fixtures import generate_centers, render_page, render_results_page
+
+
+def test_parser_backends():
+    centers = generate_centers('44', count=25)
+    results_page = render_results_page(centers, page_number=2).encode('utf-8')
+    search_page = render_page().encode('utf-8')
+
+    reference = UTACScraper(parser='html.parser', scoped_parsing=False)
+    scoped = UTACScraper(parser='lxml', scoped_parsing=True)
+
+    outputs = []
+    for scraper in (reference, scoped):
+        soup = scraper._parse_html(results_page, scope='results')
+        page = scraper._read_results_page(soup, '44')
+        assert page.current_page == 2
+        assert sorted(page.pager_links) == [1, 3]
+        outputs.append((page.centers, page.next_page_link, sorted(page.hidden_fields)))
+
+        form_data = scraper._postback_form_data(page, page.hop(3))
+        assert form_data['__EVENTARGUMENT'] == 'Page$3'
+        assert form_data['__VIEWSTATE'] == page.hidden_fields['__VIEWSTATE']
+
+        search_form = scraper._find_aspnet_form(scraper._parse_html(search_page, scope='results'))
+        assert search_form.find('select').get('name').endswith('ddlCritereField')
+
+    assert outputs[0] == outputs[1]
+    assert [c['agreement_number'] for c in outputs[1][0]] == [c['agreement_number'] for c in centers[10:20]]
+    assert "Page$3" in outputs[1][1]
+
+    # Pages 11 et suivantes : le texte de la ligne du pager ("...1112131415...") contient
+    # un code du département, elle ne doit pas être prise pour un centre
+    centers = generate_centers('13', count=500)
+    for scraper in (reference, scoped):
+        soup = scraper._parse_html(render_results_page(centers, page_number=11).encode('utf-8'), scope='results')
+        page = scraper._read_results_page(soup, '13')
+        assert [c['agreement_number'] for c in page.centers] == [c['agreement_number'] for c in centers[100:110]]
+        assert page.current_page == 11 and "Page$12" in page.next_page_link
+
+    print("✅ Backends de parsing: résultats identiques")
+
+
+if __name__ == "__main__":
+    test_parser_backends()
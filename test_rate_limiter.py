@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Test du limiteur de débit global (seau à jetons partagé entre processus, priorités)
+"""
+
+import asyncio
+import contextlib
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+import requests
+
+from rate_limiter import RateLimiter, PRIORITY_INTERACTIVE, PRIORITY_CRAWL
+from upstream import UpstreamTransport
+
+
+class _ScriptedSession:
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+
+    def get(self, url, **kwargs):
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        response = requests.Response()
+        response.status_code = outcome
+        return response
+
+
+def _acquire_many(path, count):
+    limiter = RateLimiter(path, rate=50, burst=1)
+    for _ in range(count):
+        limiter.acquire(PRIORITY_CRAWL)
+
+
+def test_rate_limiter():
+    with tempfile.TemporaryDirectory() as tmp:
+        # Rafale de burst jetons, puis un jeton tous les 1/rate
+        limiter = RateLimiter(os.path.join(tmp, 'burst.state'), rate=50, burst=5)
+        started = time.perf_counter()
+        for _ in range(5):
+            assert limiter.try_acquire() == 0
+        assert limiter.try_acquire() > 0
+        for _ in range(10):
+            limiter.acquire()
+        assert 0.18 <= time.perf_counter() - started < 1
+
+        # Seau partagé entre processus (descripteur rouvert après le fork)
+        path = os.path.join(tmp, 'shared.state')
+        RateLimiter(path, rate=50, burst=1).stats()
+        started = time.perf_counter()
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=_acquire_many, args=(path, 10)) for _ in range(2)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            assert process.exitcode == 0
+        # 20 requêtes à 50/s depuis deux processus : au moins 19 intervalles
+        assert time.perf_counter() - started >= 19 / 50 * 0.95
+
+        # Une classe prioritaire en attente bloque les autres, même si des jetons se libèrent
+        path = os.path.join(tmp, 'priority.state')
+        slow = RateLimiter(path, rate=1, burst=2, reserve=0)
+        assert slow.try_acquire(PRIORITY_INTERACTIVE) == 0
+        assert slow.try_acquire(PRIORITY_INTERACTIVE) == 0
+        assert slow.try_acquire(PRIORITY_INTERACTIVE) > 0
+        assert slow.stats()['waiting'] == [PRIORITY_INTERACTIVE]
+        fast = RateLimiter(path, rate=1000, burst=2, reserve=0)
+        time.sleep(0.01)
+        assert fast.try_acquire(PRIORITY_CRAWL) > 0
+        assert fast.try_acquire(PRIORITY_INTERACTIVE) == 0
+
+        # Réserve : le crawl laisse un jeton pour les recherches interactives
+        reserved = RateLimiter(os.path.join(tmp, 'reserve.state'), rate=1, burst=3, reserve=1)
+        assert reserved.try_acquire(PRIORITY_CRAWL) == 0
+        assert reserved.try_acquire(PRIORITY_CRAWL) == 0
+        assert reserved.try_acquire(PRIORITY_CRAWL) > 0
+        assert reserved.try_acquire(PRIORITY_INTERACTIVE) == 0
+
+        # Crawl saturant le débit : les recherches interactives attendent au plus ~1 jeton
+        limiter = RateLimiter(os.path.join(tmp, 'load.state'), rate=40, burst=2)
+        stop = threading.Event()
+        crawled = []
+
+        def crawl():
+            while not stop.is_set():
+                limiter.acquire(PRIORITY_CRAWL)
+                crawled.append(1)
+
+        threads = [threading.Thread(target=crawl) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.3)
+        waits = []
+        for _ in range(5):
+            waits.append(limiter.acquire(PRIORITY_INTERACTIVE))
+            time.sleep(0.05)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        assert max(waits) < 0.15, waits
+        assert len(crawled) > 10
+
+        # Version asynchrone : un flock disputé par un autre processus ne bloque pas la boucle
+        path = os.path.join(tmp, 'async.state')
+        limiter = RateLimiter(path, rate=50, burst=5)
+        holder = RateLimiter(path, rate=50, burst=5)
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            with holder._locked_state():
+                locked.set()
+                release.wait(5)
+
+        async def acquire_while_locked():
+            ticks = []
+
+            async def ticker():
+                while not release.is_set():
+                    ticks.append(1)
+                    await asyncio.sleep(0.01)
+
+            thread = threading.Thread(target=hold_lock)
+            thread.start()
+            locked.wait(5)
+            ticking = asyncio.ensure_future(ticker())
+            asyncio.get_running_loop().call_later(0.2, release.set)
+            await limiter.acquire_async(PRIORITY_INTERACTIVE)
+            await ticking
+            thread.join()
+            return len(ticks)
+
+        assert asyncio.run(acquire_while_locked()) > 5
+
+        # Chaque tentative du transport consomme un jeton
+        limiter = RateLimiter(os.path.join(tmp, 'transport.state'), rate=1, burst=5)
+        transport = UpstreamTransport(retries=2, backoff=0, rate_limiter=limiter)
+        with contextlib.redirect_stdout(io.StringIO()):
+            session = _ScriptedSession([requests.ConnectionError('reset'), 503, 200])
+            assert transport.request(session, 'GET', 'https://www.utac-otc.com/', priority=PRIORITY_CRAWL).status_code == 200
+        assert limiter.stats()['tokens'] < 2.1
+
+    print("✅ Limiteur de débit: tous les tests réussis!")
+
+
+if __name__ == "__main__":
+    test_rate_limiter()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Test de bout en bout du scraper contre le serveur de rejeu local
+"""
+
+import contextlib
+import io
+
+from utac_scraper import UTACScraper
+from benchmarks.fixtures import generate_centers
+from benchmarks.replay_server import ReplayServer
+
+
+def test_replay_server():
+    with ReplayServer() as server, contextlib.redirect_stdout(io.StringIO()):
+        scraper = UTACScraper(base_url=server.url)
+
+        # Département sur plusieurs pages : recherche puis postbacks Page$N
+        expected = generate_centers('13')
+        result = scraper.search_by_department('13')
+        assert [c['agreement_number'] for c in result['centers']] == [c['agreement_number'] for c in expected]
+        assert server.requests['search'] == 1
+        assert server.requests['postback'] == (len(expected) - 1) // 10
+
+        # Agrément : informations extraites de la page de résultats
+        center = generate_centers('44')[3]
+        details = scraper.search_by_agreement_number(center['agreement_number'])
+        assert details['ville'] == center['ville']
+        assert details['code_postal'] == center['code_postal']
+
+        # Le gabarit du formulaire est réutilisé entre les recherches
+        assert server.requests['form'] == 1
+
+    print("✅ Serveur de rejeu: tous les tests réussis!")
+
+
+if __name__ == "__main__":
+    test_replay_server()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Test du cache de résultats partagé (SQLite)
+"""
+
+import asyncio
+import contextvars
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import result_cache
+from result_cache import ResultCache
+
+
+def test_result_cache():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = ResultCache(os.path.join(tmp_dir, 'cache.sqlite3'), max_entries=2)
+        calls = []
+
+        def compute(value, delay=0):
+            def _compute():
+                time.sleep(delay)
+                calls.append(value)
+                return {'centers': [value]}
+            return _compute
+
+        # Miss puis hit
+        assert cache.get_or_compute('department:04', compute('a'), ttl=60) == ({'centers': ['a']}, 'miss')
+        assert cache.get_or_compute('department:04', compute('b'), ttl=60) == ({'centers': ['a']}, 'hit')
+        assert calls == ['a']
+
+        # Les erreurs ne sont pas mises en cache
+        cache.get_or_compute('department:13', lambda: {'error': 'boom'}, ttl=60,
+                             cacheable=lambda r: 'error' not in r)
+        assert cache.get('department:13') is None
+
+        # Une autre instance (autre worker) voit les mêmes entrées
+        other_worker = ResultCache(cache.path, max_entries=2)
+        assert other_worker.get('department:04')[0] == {'centers': ['a']}
+
+        # Stale-while-revalidate : valeur expirée servie, rafraîchie en arrière-plan
+        value, status = cache.get_or_compute('department:04', compute('c', delay=0.1), ttl=0, stale_ttl=60)
+        assert (value, status) == ({'centers': ['a']}, 'stale')
+        # Un seul rafraîchissement à la fois
+        assert other_worker.get_or_compute('department:04', compute('d'), ttl=0, stale_ttl=60)[1] == 'stale'
+        for _ in range(50):
+            if cache.get('department:04')[0] == {'centers': ['c']}:
+                break
+            time.sleep(0.02)
+        assert cache.get('department:04')[0] == {'centers': ['c']}
+        assert 'd' not in calls
+
+        # Éviction LRU au-delà de max_entries
+        access_write_interval = result_cache.ACCESS_WRITE_INTERVAL
+        result_cache.ACCESS_WRITE_INTERVAL = 0
+        try:
+            cache.set('agreement:S044C203', {'ville': 'ST SEBASTIEN SUR LOIRE'})
+            time.sleep(0.01)
+            cache.get('department:04')
+            cache.set('agreement:S004S062', {'ville': 'BARCELONNETTE'})
+        finally:
+            result_cache.ACCESS_WRITE_INTERVAL = access_write_interval
+        assert cache.get('agreement:S044C203') is None
+        assert cache.get('department:04') is not None
+        assert cache.stats()['entries'] == 2
+
+        # Single-flight : requêtes simultanées sur la même clé, un seul calcul
+        calls.clear()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(cache.get_or_compute, 'department:75', compute('e', delay=0.2), 60)
+                       for _ in range(8)]
+            results = [future.result() for future in futures]
+        assert calls == ['e']
+        assert all(value == {'centers': ['e']} for value, _ in results)
+        assert sorted(status for _, status in results) == ['coalesced'] * 7 + ['miss']
+
+        # Les erreurs sont partagées avec les requêtes en attente, puis oubliées
+        started = threading.Event()
+
+        def failing():
+            started.set()
+            time.sleep(0.1)
+            raise RuntimeError('upstream')
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(cache.get_or_compute, 'department:69', failing, 60)
+            started.wait()
+            follower = executor.submit(cache.get_or_compute, 'department:69', compute('never'), 60)
+            for future in (leader, follower):
+                try:
+                    future.result()
+                    raise AssertionError("L'erreur aurait dû être propagée")
+                except RuntimeError:
+                    pass
+        assert cache.get_or_compute('department:69', compute('f'), ttl=60)[1] == 'miss'
+
+        # Entre workers : le bail d'un autre worker fait attendre son résultat dans le cache
+        assert other_worker._claim_inflight('department:33')
+        threading.Timer(0.2, lambda: (other_worker.set('department:33', {'centers': ['g']}),
+                                      other_worker._release_inflight('department:33'))).start()
+        assert cache.get_or_compute('department:33', compute('h'), ttl=60) == ({'centers': ['g']}, 'coalesced')
+        assert 'h' not in calls
+
+        # Bail relâché sans résultat (erreur non mise en cache) : le calcul est repris
+        assert other_worker._claim_inflight('department:31')
+        threading.Timer(0.2, other_worker._release_inflight, args=('department:31',)).start()
+        assert cache.get_or_compute('department:31', compute('i'), ttl=60) == ({'centers': ['i']}, 'miss')
+
+        # Bail renouvelé pendant un calcul plus long que le bail : l'autre worker attend
+        lease_seconds = result_cache.INFLIGHT_LEASE_SECONDS
+        result_cache.INFLIGHT_LEASE_SECONDS = 0.3
+        try:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                leader = executor.submit(other_worker.get_or_compute, 'department:29', compute('l', delay=1), 60)
+                time.sleep(0.1)
+                follower = executor.submit(cache.get_or_compute, 'department:29', compute('m'), 60)
+                assert leader.result() == ({'centers': ['l']}, 'miss')
+                assert follower.result() == ({'centers': ['l']}, 'coalesced')
+            assert 'm' not in calls
+        finally:
+            result_cache.INFLIGHT_LEASE_SECONDS = lease_seconds
+
+        # Calcul en échec dans un autre worker : ceux qui l'attendaient renvoient son
+        # résultat sans relancer la recherche, les requêtes suivantes la relancent
+        def upstream_error():
+            time.sleep(0.2)
+            return {'error': 'Erreur de connexion'}
+
+        not_error = lambda r: 'error' not in r
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(other_worker.get_or_compute, 'department:56', upstream_error, 60,
+                                     cacheable=not_error)
+            time.sleep(0.05)
+            follower = executor.submit(cache.get_or_compute, 'department:56', compute('n'), 60,
+                                       cacheable=not_error)
+            assert follower.result() == ({'error': 'Erreur de connexion'}, 'coalesced')
+            assert leader.result()[1] == 'miss'
+        assert 'n' not in calls
+        assert cache.get_or_compute('department:56', compute('o'), 60)[1] == 'miss'
+
+        # Version asynchrone : une seule coroutine de calcul pour des tâches simultanées
+        async_calls = []
+
+        async def compute_async():
+            await asyncio.sleep(0.1)
+            async_calls.append(1)
+            return {'centers': ['j']}
+
+        async def burst():
+            return await asyncio.gather(*[cache.get_or_compute_async('department:35', compute_async, 60)
+                                          for _ in range(5)])
+
+        results = asyncio.run(burst())
+        assert len(async_calls) == 1
+        assert sorted(status for _, status in results) == ['coalesced'] * 4 + ['miss']
+
+        # Appels SQLite hors de la boucle : le contexte (contextvars) de la tâche est conservé
+        request_id = contextvars.ContextVar('request_id', default=None)
+        seen = []
+        cache_set = cache.set
+        cache.set = lambda key, value: seen.append(request_id.get()) or cache_set(key, value)
+
+        async def with_context():
+            request_id.set('r1')
+            return await cache.get_or_compute_async('department:85', compute_async, 60)
+
+        try:
+            asyncio.run(with_context())
+        finally:
+            del cache.set
+        assert seen == ['r1']
+
+        # Annulations : une requête en attente annulée n'interrompt pas le calcul, une
+        # requête à l'origine du calcul annulée le laisse reprendre par les autres
+        async def cancellations():
+            gate = asyncio.Event()
+
+            async def slow():
+                await gate.wait()
+                async_calls.append(1)
+                return {'centers': ['k']}
+
+            leader = asyncio.ensure_future(cache.get_or_compute_async('department:22', slow, 60))
+            await asyncio.sleep(0.05)
+            follower = asyncio.ensure_future(cache.get_or_compute_async('department:22', slow, 60))
+            waiting = asyncio.ensure_future(cache.get_or_compute_async('department:22', slow, 60))
+            await asyncio.sleep(0.05)
+            waiting.cancel()
+            await asyncio.sleep(0.05)
+            assert waiting.cancelled() and not leader.done()
+            leader.cancel()
+            await asyncio.sleep(0.05)
+            gate.set()
+            assert await follower == ({'centers': ['k']}, 'miss')
+            assert leader.cancelled()
+
+        async_calls.clear()
+        asyncio.run(cancellations())
+        assert len(async_calls) == 1
+
+    print("✅ Cache de résultats: tous les tests réussis!")
+
+
+if __name__ == "__main__":
+    test_result_cache()
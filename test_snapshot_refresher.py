@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Test du processus de rafraîchissement du snapshot national et des réponses servies
+depuis le snapshot (GET /department/<code>, GET /all-centers)
+"""
+
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+
+import api
+from center_index import CenterIndex
+from crawl_jobs import CrawlJobStore
+from snapshot_refresher import BudgetedTransport, RequestBudget, SnapshotRefresher
+from snapshot_store import SnapshotStore
+from utac_scraper import UTACScraper
+from benchmarks.fixtures import generate_centers
+from benchmarks.replay_server import ReplayServer
+
+DEPARTMENTS = ['04', '13', '971']
+
+
+class _SubsetScraper(UTACScraper):
+    @staticmethod
+    def list_french_departments():
+        return DEPARTMENTS
+
+
+def _pending_job(store, snapshot_dir, base_url):
+    """Job enregistré sans lancer de processus détaché (exécuté ensuite par store.run)"""
+    job = {
+        'job_id': f"job{len(os.listdir(store.jobs_dir))}", 'status': 'pending', 'created_at': time.time(),
+        'started_at': None, 'finished_at': None, 'output_dir': snapshot_dir, 'workers': 1,
+        'base_url': base_url, 'pid': None, 'departments': {}, 'summary': None, 'error': None,
+        'progress': {'completed_departments': 0, 'total_departments': None, 'total_centers': 0}
+    }
+    store._write(job)
+    return job['job_id']
+
+
+class _NoUpstreamScraper:
+    """Scraper de l'API : toute requête vers utac-otc.com fait échouer le test"""
+    def __getattr__(self, name):
+        raise AssertionError(f"Requête vers utac-otc.com ({name}) au lieu du snapshot")
+
+
+def test_snapshot_refresher():
+    # Budget : 3 requêtes à 600/min prennent au moins 0,2 s
+    budget = RequestBudget(600)
+    started = time.monotonic()
+    for _ in range(3):
+        budget.acquire()
+    assert time.monotonic() - started >= 0.19
+    assert budget.requests == 3
+
+    with ReplayServer() as server, tempfile.TemporaryDirectory() as snapshot_dir, \
+            contextlib.redirect_stdout(io.StringIO()):
+        scraper = _SubsetScraper(transport=BudgetedTransport(RequestBudget(0)), base_url=server.url)
+        refresher = SnapshotRefresher(snapshot_dir, interval=3600, scraper=scraper)
+        assert refresher.next_run_at() == 0
+
+        result = refresher.run(once=True)
+        total = sum(len(generate_centers(dept)) for dept in DEPARTMENTS)
+        assert result['data']['total_centers'] == total
+        assert SnapshotStore.in_directory(snapshot_dir).count() == total
+        assert scraper.transport.budget.requests == sum(server.requests.values())
+
+        # Snapshot à jour : pas de nouveau crawl avant l'intervalle
+        assert refresher.next_run_at() > time.time() + 3500
+        requests_made = scraper.transport.budget.requests
+        assert refresher.run(once=True) is None
+        assert scraper.transport.budget.requests == requests_made
+
+        # Un autre processus rafraîchit déjà ce répertoire
+        with refresher._exclusive() as acquired:
+            assert acquired
+            assert SnapshotRefresher(snapshot_dir, scraper=scraper).refresh() is None
+
+        # POST /all-centers/jobs : simple déclencheur du rafraîchissement
+        jobs = CrawlJobStore(os.path.join(snapshot_dir, 'jobs'))
+        requests_made = sum(server.requests.values())
+        job_id = _pending_job(jobs, snapshot_dir, server.url)
+        assert jobs.run(job_id)
+        job = jobs.get(job_id)
+        assert job['status'] == 'done' and job['summary']['crawled'] is False
+        assert sum(server.requests.values()) == requests_made
+
+        with refresher._exclusive():
+            assert jobs.start(output_dir=snapshot_dir) == (None, False)
+            os.environ['UTAC_REFRESH_INTERVAL'] = '0'
+            try:
+                job_id = _pending_job(jobs, snapshot_dir, server.url)
+                assert not jobs.run(job_id)
+            finally:
+                del os.environ['UTAC_REFRESH_INTERVAL']
+            assert jobs.get(job_id)['status'] == 'failed'
+        assert sum(server.requests.values()) == requests_made
+
+        # L'API ne lit que le snapshot
+        api.center_index = CenterIndex(snapshot_dir)
+        api.center_index.load()
+        live_scraper, api.scraper = api.scraper, _NoUpstreamScraper()
+        client = api.app.test_client()
+        try:
+            response = client.get('/department/4')
+            assert response.status_code == 200
+            body = response.get_json()
+            assert body['source'] == 'snapshot'
+            assert 0 <= body['snapshot_age_seconds'] < 60
+            assert body['data']['department_code'] == '04'
+            assert [c['agreement_number'] for c in body['data']['centers']] == sorted(
+                c['agreement_number'] for c in generate_centers('04'))
+
+            lines = client.get('/department/971?format=ndjson').get_data(as_text=True).splitlines()
+            assert len(lines) == len(generate_centers('971'))
+
+            # Département absent du snapshot : même code normalisé vers utac-otc.com qu'en JSON
+            searched = []
+
+            class _RecordingScraper:
+                def iter_department_centers(self, department_code):
+                    searched.append(department_code)
+                    return iter(generate_centers('02', count=2))
+
+            api.scraper = _RecordingScraper()
+            lines = client.get('/department/2?format=ndjson').get_data(as_text=True).splitlines()
+            assert searched == ['02'] and len(lines) == 2
+            api.scraper = _NoUpstreamScraper()
+
+            response = client.get('/all-centers')
+            body = response.get_json()
+            assert body['source'] == 'snapshot'
+            assert body['data']['total_centers'] == total
+            assert 'snapshot_age_seconds' in body
+
+            lines = client.get('/all-centers?format=ndjson').get_data(as_text=True).splitlines()
+            assert len(lines) == total
+            assert json.loads(lines[0])['department'] in DEPARTMENTS
+        finally:
+            api.scraper = live_scraper
+
+    with tempfile.TemporaryDirectory() as empty_dir:
+        api.center_index = CenterIndex(empty_dir, check_interval=0)
+        api.center_index.load()
+        client = api.app.test_client()
+        assert client.get('/all-centers').status_code == 404
+
+        # Snapshot publié par le rafraîchissement après le démarrage du worker
+        centers = [dict(center, department='04') for center in generate_centers('04')]
+        SnapshotStore.in_directory(empty_dir).write(centers, time.time())
+        assert client.get('/health').get_json()['snapshot']['total_centers'] == len(centers)
+        assert client.get('/all-centers').get_json()['data']['total_centers'] == len(centers)
+
+    print("✅ Rafraîchissement du snapshot: tous les tests réussis!")
+
+
+if __name__ == "__main__":
+    test_snapshot_refresher()
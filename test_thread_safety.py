@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Test du scraper partagé entre threads (workers gunicorn gthread) et après un fork
+"""
+
+import contextlib
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import api
+from utac_scraper import UTACScraper
+from benchmarks.fixtures import generate_centers
+from benchmarks.replay_server import ReplayServer
+
+
+def _session_in_child(scraper, parent_session, queue):
+    queue.put(scraper.session is not parent_session)
+
+
+def test_thread_safety():
+    departments = ['04', '2', '44', '971', '13', '59']
+
+    with ReplayServer(latency=0.01) as server, contextlib.redirect_stdout(io.StringIO()):
+        # Un seul scraper pour tout le worker, comme dans api.py
+        scraper = UTACScraper(base_url=server.url)
+
+        def search(dept):
+            return scraper.search_by_department(dept), (threading.get_ident(), id(scraper.session))
+
+        with ThreadPoolExecutor(max_workers=len(departments)) as executor:
+            results = list(executor.map(search, departments))
+
+        for dept, (result, _) in zip(departments, results):
+            expected = [c['agreement_number'] for c in generate_centers(dept.zfill(2))]
+            assert [c['agreement_number'] for c in result['centers']] == expected, dept
+
+        # Une session par thread, jamais partagée
+        sessions = {thread_session for _, thread_session in results}
+        assert len({thread for thread, _ in sessions}) == len({session for _, session in sessions}) > 1
+
+        # Après un fork (preload_app), le processus enfant crée sa propre session
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        process = context.Process(target=_session_in_child, args=(scraper, scraper.session, queue))
+        process.start()
+        assert queue.get(timeout=10)
+        process.join()
+
+    # Rafraîchissements en arrière-plan de clés différentes : en parallèle
+    class _BlockingScraper:
+        def __init__(self):
+            self.barrier = threading.Barrier(2, timeout=5)
+
+        def search_by_department(self, dept):
+            self.barrier.wait()
+            return {'department_code': dept}
+
+    background_scraper = api._background_scraper
+    api._background_scraper = _BlockingScraper()
+    try:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = list(executor.map(lambda dept: api._background_search('search_by_department', dept), ['04', '13']))
+    finally:
+        api._background_scraper = background_scraper
+    assert results == [{'department_code': '04'}, {'department_code': '13'}]
+
+    print("✅ Scraper multi-threads: tous les tests réussis!")
+
+
+if __name__ == "__main__":
+    test_thread_safety()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Test du transport vers utac-otc.com : nouvelles tentatives et disjoncteur
+"""
+
+import asyncio
+import contextlib
+import io
+import time
+
+import httpx
+import requests
+
+from upstream import UpstreamTransport, CircuitBreaker, CircuitOpenError
+
+
+class _Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error", response=self)
+
+
+class _FailingLimiter:
+    def acquire(self, priority):
+        raise RuntimeError("Limiteur indisponible")
+
+
+class _ScriptedSession:
+    """Session qui rejoue une suite de réponses ou d'exceptions"""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def get(self, url, **kwargs):
+        self.calls.append(kwargs)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return _Response(outcome)
+
+
+def test_upstream_transport():
+    transport = UpstreamTransport(retries=2, backoff=0, connect_timeout=1, read_timeout=5,
+                                  breaker=CircuitBreaker(failure_threshold=3, reset_timeout=0.2))
+    url = 'https://www.utac-otc.com/'
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Erreurs transitoires puis succès, avec timeouts connexion/lecture distincts
+        session = _ScriptedSession([requests.ConnectionError('reset'), 503, 200])
+        assert transport.request(session, 'GET', url).status_code == 200
+        assert session.calls[0]['timeout'] == (1, 5)
+        assert transport.breaker.state() == 'closed'
+
+        # Erreur client : pas de nouvelle tentative
+        session = _ScriptedSession([404])
+        try:
+            transport.request(session, 'GET', url)
+            assert False, "HTTPError attendue"
+        except requests.HTTPError:
+            pass
+        assert len(session.calls) == 1
+
+        # Tentatives épuisées : le disjoncteur s'ouvre au 3e échec consécutif
+        session = _ScriptedSession([requests.Timeout('lent')] * 3)
+        try:
+            transport.request(session, 'GET', url)
+            assert False, "Timeout attendu"
+        except requests.Timeout:
+            pass
+        assert transport.breaker.state() == 'open'
+
+        # Disjoncteur ouvert : échec immédiat sans appel réseau
+        session = _ScriptedSession([200])
+        try:
+            transport.request(session, 'GET', url)
+            assert False, "CircuitOpenError attendue"
+        except CircuitOpenError:
+            pass
+        assert session.calls == []
+
+        # Après reset_timeout, une requête de test réussie referme le disjoncteur
+        time.sleep(0.25)
+        assert transport.breaker.state() == 'half_open'
+        assert transport.request(session, 'GET', url).status_code == 200
+        assert transport.breaker.stats()['state'] == 'closed'
+        assert transport.breaker.stats()['times_opened'] == 1
+
+        # Requête de test en échec hors erreurs réseau : le disjoncteur se rouvre
+        # au lieu de rester bloqué en attente d'un résultat
+        transport.breaker.record_failure()
+        transport.breaker.record_failure()
+        transport.breaker.record_failure()
+        time.sleep(0.25)
+        for error in [requests.exceptions.ChunkedEncodingError('tronqué'),
+                      requests.exceptions.ContentDecodingError('gzip'),
+                      requests.TooManyRedirects('boucle')]:
+            session = _ScriptedSession([error])
+            try:
+                transport.request(session, 'GET', url)
+                assert False, "RequestException attendue"
+            except requests.RequestException:
+                pass
+            assert len(session.calls) == 1
+            assert transport.breaker.state() == 'open'
+            time.sleep(0.25)
+
+        # Limiteur en erreur pendant la requête de test : libérée sans conclure
+        transport.rate_limiter = _FailingLimiter()
+        try:
+            transport.request(_ScriptedSession([200]), 'GET', url)
+            assert False, "RuntimeError attendue"
+        except RuntimeError:
+            pass
+        transport.rate_limiter = None
+        assert transport.breaker.state() == 'half_open'
+        assert transport.request(_ScriptedSession([200]), 'GET', url).status_code == 200
+        assert transport.breaker.state() == 'closed'
+
+    # Client asynchrone : DecodingError et TooManyRedirects pendant la requête de test
+    async def probe(error):
+        def handler(request):
+            raise error
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            try:
+                await transport.request_async(client, 'GET', url)
+                assert False, "httpx.RequestError attendue"
+            except httpx.RequestError:
+                pass
+
+    for _ in range(3):
+        transport.breaker.record_failure()
+    for error in [httpx.DecodingError('gzip'), httpx.TooManyRedirects('boucle')]:
+        time.sleep(0.25)
+        assert transport.breaker.state() == 'half_open'
+        asyncio.run(probe(error))
+        assert transport.breaker.state() == 'open'
+
+    print("✅ Transport upstream: tous les tests réussis!")
+
+
+if __name__ == "__main__":
+    test_upstream_transport()
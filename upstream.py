@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Transport HTTP vers utac-otc.com
+
+Toutes les requêtes du scraper passent par UpstreamTransport : délais de connexion et
+de lecture distincts, nouvelles tentatives bornées avec backoff exponentiel aléatoire
+sur les erreurs transitoires (coupure réseau, timeout, 429/5xx), disjoncteur qui
+échoue immédiatement quand le site est indisponible au lieu de bloquer les workers, et
+limiteur de débit partagé entre processus (rate_limiter.RateLimiter) dont chaque
+tentative consomme un jeton selon sa classe de priorité.
+"""
+import time
+import random
+import asyncio
+import threading
+
+import requests
+
+from rate_limiter import PRIORITY_INTERACTIVE
+
+# Client HTTP asynchrone (AsyncUTACScraper) : optionnel
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Codes HTTP considérés comme transitoires
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.RequestException):
+    """Requête refusée sans appel réseau : le disjoncteur est ouvert"""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        """
+        Args:
+            failure_threshold (int): Échecs consécutifs avant ouverture du disjoncteur
+            reset_timeout (int): Durée (secondes) d'ouverture avant une requête de test
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+        self._open_count = 0
+
+    def state(self):
+        """État du disjoncteur : "closed", "open" ou "half_open" """
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.time() - self._opened_at < self.reset_timeout:
+            return 'open'
+        return 'half_open'
+
+    def is_open(self):
+        return self.state() != 'closed'
+
+    def retry_after(self):
+        """Secondes avant la prochaine requête de test (0 si fermé)"""
+        with self._lock:
+            if self._opened_at is None:
+                return 0
+            return max(0, self.reset_timeout - (time.time() - self._opened_at))
+
+    def before_request(self):
+        """
+        Autorise ou refuse une requête
+
+        Disjoncteur ouvert : refus immédiat. Semi-ouvert : une seule requête de test à la
+        fois, les autres sont refusées jusqu'à son résultat.
+
+        Raises:
+            CircuitOpenError: Si la requête est refusée
+        """
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return
+            if state == 'half_open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+        raise CircuitOpenError(
+            f"utac-otc.com indisponible (disjoncteur ouvert après {self.failure_threshold} échecs consécutifs)"
+        )
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            # Ouverture au seuil, ou réouverture si la requête de test échoue
+            if self._probe_in_flight or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._open_count += 1
+                self._opened_at = time.time()
+            self._probe_in_flight = False
+
+    def abandon(self):
+        """Requête interrompue avant son résultat : libère la requête de test sans conclure"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self._state(),
+                'consecutive_failures': self._failures,
+                'times_opened': self._open_count,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout': self.reset_timeout
+            }
+
+
+class UpstreamTransport:
+    def __init__(self, retries=3, backoff=0.5, max_backoff=8, connect_timeout=3.05, read_timeout=20,
+                 breaker=None, rate_limiter=None):
+        """
+        Args:
+            retries (int): Nombre de nouvelles tentatives après un échec transitoire
+            backoff (float): Délai de base (secondes) du backoff exponentiel
+            max_backoff (float): Délai maximal entre deux tentatives
+            connect_timeout (float): Délai maximal d'établissement de la connexion
+            read_timeout (float): Délai maximal d'attente de la réponse
+            breaker (CircuitBreaker): Disjoncteur, partageable entre plusieurs scrapers
+            rate_limiter (RateLimiter): Limiteur de débit global (aucune limite si None)
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker()
+        self.rate_limiter = rate_limiter
+
+    def _delay(self, attempt, response=None):
+        """Backoff exponentiel avec jitter complet, en respectant Retry-After si présent"""
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(self.max_backoff, int(retry_after)))
+        return delay
+
+    def request(self, session, method, url, priority=PRIORITY_INTERACTIVE, **kwargs):
+        """
+        Exécute une requête avec nouvelles tentatives, disjoncteur et limiteur de débit
+
+        Args:
+            session (requests.Session): Session HTTP (cookies ASP.NET)
+            method (str): "GET" ou "POST"
+            url (str): URL cible
+            priority (str): Classe de priorité auprès du limiteur (rate_limiter.PRIORITIES)
+            **kwargs: Arguments passés à session.request (data, ...)
+
+        Returns:
+            requests.Response: Réponse en succès (2xx/3xx)
+
+        Raises:
+            requests.RequestException: Erreur définitive, tentatives épuisées ou
+                disjoncteur ouvert (CircuitOpenError)
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        method = method.lower()
+
+        for attempt in range(self.retries + 1):
+            self.breaker.before_request()
+            response = None
+            try:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire(priority)
+                response = getattr(session, method)(url, **kwargs)
+                response.raise_for_status()
+                self.breaker.record_success()
+                return response
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            except requests.HTTPError as e:
+                if response.status_code not in RETRY_STATUS_CODES:
+                    # Erreur client : le site répond, inutile de réessayer
+                    self.breaker.record_success()
+                    raise
+                error = e
+            except requests.RequestException:
+                # Réponse inexploitable (transfert tronqué, encodage invalide, redirections
+                # en boucle) : échec compté, sans nouvelle tentative
+                self.breaker.record_failure()
+                raise
+            except BaseException:
+                # Requête jamais aboutie (limiteur de débit, interruption) : libère
+                # l'éventuelle requête de test sans conclure
+                self.breaker.abandon()
+                raise
+
+            self.breaker.record_failure()
+            if attempt == self.retries:
+                raise error
+            delay = self._delay(attempt, response)
+            print(f"Erreur transitoire ({error}), nouvelle tentative {attempt + 1}/{self.retries} dans {delay:.1f}s")
+            time.sleep(delay)
+
+    async def request_async(self, client, method, url, priority=PRIORITY_INTERACTIVE, **kwargs):
+        """
+        Équivalent asynchrone de request() pour un client httpx.AsyncClient
+
+        Mêmes nouvelles tentatives, délais et disjoncteur (partagé avec les requêtes
+        synchrones du même processus). L'annulation de la tâche interrompt aussi
+        l'attente entre deux tentatives.
+
+        Raises:
+            httpx.HTTPError: Erreur définitive ou tentatives épuisées
+            CircuitOpenError: Disjoncteur ouvert
+        """
+        connect_timeout, read_timeout = self.timeout
+        kwargs.setdefault('timeout', httpx.Timeout(read_timeout, connect=connect_timeout))
+
+        for attempt in range(self.retries + 1):
+            self.breaker.before_request()
+            response = None
+            try:
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.acquire_async(priority)
+                response = await client.request(method.upper(), url, **kwargs)
+                response.raise_for_status()
+                self.breaker.record_success()
+                return response
+            except httpx.TransportError as e:
+                error = e
+            except httpx.HTTPStatusError as e:
+                if response.status_code not in RETRY_STATUS_CODES:
+                    self.breaker.record_success()
+                    raise
+                error = e
+            except httpx.RequestError:
+                # DecodingError, TooManyRedirects : échec compté, sans nouvelle tentative
+                self.breaker.record_failure()
+                raise
+            except BaseException:
+                # Annulation de la tâche ou erreur du limiteur : libère la requête de test
+                self.breaker.abandon()
+                raise
+
+            self.breaker.record_failure()
+            if attempt == self.retries:
+                raise error
+            delay = self._delay(attempt, response)
+            print(f"Erreur transitoire ({error}), nouvelle tentative {attempt + 1}/{self.retries} dans {delay:.1f}s")
+            await asyncio.sleep(delay)
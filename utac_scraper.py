@@ -1,36 +1,191 @@
 #!/usr/bin/env python3
+import os
+import re
+import threading
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer
 import urllib3
 from urllib.parse import urljoin
+from contextlib import nullcontext
+
+from upstream import UpstreamTransport, CircuitOpenError
+from rate_limiter import PRIORITY_INTERACTIVE
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Backend de parsing : lxml si disponible (beaucoup plus rapide), sinon le parser de la stdlib
+try:
+    import lxml  # noqa: F401
+    DEFAULT_PARSER = 'lxml'
+except ImportError:
+    DEFAULT_PARSER = 'html.parser'
+
+# Zones utiles d'une page de résultats : champs du formulaire ASP.NET et tableaux
+# (grille de résultats et pager). Le reste de la page SharePoint est ignoré.
+RESULTS_PAGE_REGIONS = SoupStrainer(['input', 'select', 'table'])
+
+# Argument d'un lien du pager ASP.NET : javascript:__doPostBack('...','Page$N')
+PAGER_ARGUMENT = re.compile(r"Page\$(\d+)")
+POSTBACK_CALL = re.compile(r"__doPostBack\('([^']+)','([^']+)'\)")
+
+# Un thread n'a qu'une requête en cours à la fois : une connexion keep-alive par thread
+# suffit. Le nombre total de connexions vers utac-otc.com reste ainsi égal au nombre de
+# threads (gunicorn threads x workers), sans "Connection pool is full" ni connexions
+# inutilisées.
+SESSION_POOL_MAXSIZE = 1
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+
+class UTACScraperError(Exception):
+    """Erreur de recherche levée par les générateurs du scraper"""
+
 class UTACScraper:
-    def __init__(self):
-        self.base_url = "https://www.utac-otc.com"
-        self.session = requests.Session()
-        self.session.verify = False
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
+    """
+    Scraper utilisable depuis plusieurs threads : chaque thread (et chaque processus
+    après un fork) a sa propre session HTTP et son propre gabarit de formulaire ASP.NET.
+    """
+    
+    def __init__(self, form_state_ttl=300, parser=DEFAULT_PARSER, scoped_parsing=True, transport=None,
+                 metrics=None, base_url="https://www.utac-otc.com", priority=PRIORITY_INTERACTIVE):
+        """
+        Args:
+            form_state_ttl (int): Durée (secondes) pendant laquelle le gabarit du
+                formulaire de recherche ASP.NET est réutilisé sans nouveau GET
+            parser (str): Backend BeautifulSoup ("lxml" ou "html.parser")
+            scoped_parsing (bool): Ne construire que les zones utiles des pages de
+                résultats (champs de formulaire, tableaux) au lieu de la page entière
+            transport (UpstreamTransport): Transport HTTP (nouvelles tentatives, timeouts,
+                disjoncteur), partageable entre scrapers
+            metrics (MetricsRegistry): Registre recevant la durée de chaque phase
+                (GET formulaire, POST recherche, postbacks, parsing) et les erreurs
+            base_url (str): Racine du site interrogé (utac-otc.com, ou serveur de rejeu
+                des benchmarks)
+            priority (str): Classe de priorité des requêtes auprès du limiteur de débit
+                du transport (rate_limiter.PRIORITIES)
+        """
+        self.base_url = base_url.rstrip('/')
+        self.search_url = f"{self.base_url}/vehicule_leger/Pages/Retrouver_un_CT.aspx"
+        self.form_state_ttl = form_state_ttl
+        self.parser = parser
+        self.scoped_parsing = scoped_parsing
+        self.transport = transport or UpstreamTransport()
+        self.metrics = metrics
+        self.priority = priority
+        self._local = threading.local()
+        self._shared_session = None
+    
+    def _new_session(self):
+        """Crée une session HTTP (jamais partagée entre threads ni héritée d'un fork)"""
+        session = requests.Session()
+        session.verify = False
+        session.headers.update({'User-Agent': USER_AGENT})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=SESSION_POOL_MAXSIZE)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+    
+    def _thread_state(self):
+        """État propre au thread courant : session HTTP et gabarit du formulaire"""
+        state = self._local.__dict__
+        if state.get('pid') != os.getpid():
+            # Nouveau thread, ou processus forké (preload_app) : ne rien réutiliser
+            state.clear()
+            state.update(pid=os.getpid(), session=None, form_state=None, form_state_time=0)
+        return state
+    
+    @property
+    def session(self):
+        """Session HTTP du thread courant, créée à la première requête"""
+        if self._shared_session is not None:
+            return self._shared_session
+        state = self._thread_state()
+        if state['session'] is None:
+            state['session'] = self._new_session()
+        return state['session']
+    
+    @session.setter
+    def session(self, session):
+        """Impose une session (tests, session préconfigurée), partagée par tous les threads"""
+        self._shared_session = session
+    
+    @property
+    def _form_state(self):
+        return self._thread_state()['form_state']
+    
+    @_form_state.setter
+    def _form_state(self, form_state):
+        self._thread_state()['form_state'] = form_state
+    
+    @property
+    def _form_state_time(self):
+        return self._thread_state()['form_state_time']
+    
+    @_form_state_time.setter
+    def _form_state_time(self, value):
+        self._thread_state()['form_state_time'] = value
     
-    def get_page(self, url):
+    def _phase(self, phase):
+        """Mesure la durée d'une phase du scraper (sans effet sans registre de métriques)"""
+        if self.metrics is None:
+            return nullcontext()
+        return self.metrics.time('utac_upstream_phase_duration_seconds', phase=phase)
+    
+    def _request(self, method, url, phase, **kwargs):
+        """Requête HTTP via le transport (nouvelles tentatives, timeouts, disjoncteur)"""
+        try:
+            with self._phase(phase):
+                return self.transport.request(self.session, method, url, priority=self.priority, **kwargs)
+        except requests.RequestException as e:
+            if self.metrics is not None:
+                self.metrics.inc('utac_upstream_errors_total', phase=phase, error=type(e).__name__)
+            raise
+    
+    def get_page(self, url, scope='page', phase='page_get'):
         try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            return BeautifulSoup(response.content, 'html.parser')
+            response = self._request('GET', url, phase)
+            return self._parse_html(response.content, scope)
         except requests.RequestException as e:
             print(f"Erreur lors de la récupération de la page: {e}")
             return None
     
+    def _parse_html(self, content, scope='page'):
+        """
+        Parse une page HTML avec le backend configuré
+        
+        Args:
+            content (bytes): Contenu HTML
+            scope (str): "page" pour la page entière, "results" pour ne construire que
+                les champs de formulaire et les tableaux (pages de recherche/résultats)
+            
+        Returns:
+            BeautifulSoup: Arbre de la page
+        """
+        with self._phase('parse'):
+            if scope == 'results' and self.scoped_parsing:
+                return BeautifulSoup(content, self.parser, parse_only=RESULTS_PAGE_REGIONS)
+            return BeautifulSoup(content, self.parser)
+    
+    def _find_aspnet_form(self, soup):
+        """Trouve le formulaire ASP.NET principal (la racine si la page a été parsée par zones)"""
+        form = soup.find('form', {'id': 'aspnetForm'})
+        if form is None and soup.find('input', {'name': '__VIEWSTATE'}):
+            # Parsing restreint aux zones utiles : les champs sont directement sous la racine
+            return soup
+        return form
+    
     def scrape_ct_search_page(self):
-        url = "https://www.utac-otc.com/vehicule_leger/Pages/Retrouver_un_CT.aspx"
+        url = self.search_url
         soup = self.get_page(url)
         
         if not soup:
             return None
         
+        return self._describe_search_page(soup, url)
+    
+    def _describe_search_page(self, soup, url):
+        """Structure de la page de recherche : formulaires, champs, tableaux et liens"""
         result = {
             'page_title': soup.title.text.strip() if soup.title else '',
             'forms': [],
@@ -107,32 +262,64 @@ class UTACScraper:
         """
         Recherche un centre de contrôle technique par numéro d'agrément
         """
-        url = "https://www.utac-otc.com/vehicule_leger/Pages/Retrouver_un_CT.aspx"
-        soup = self.get_page(url)
+        result_soup, error = self._submit_search('Agrement', agreement_number)
+        
+        if not result_soup:
+            print(error)
+            return None
+        
+        return self._parse_search_results(result_soup, agreement_number)
+    
+    def _get_search_form_state(self):
+        """
+        Retourne le gabarit du formulaire de recherche ASP.NET
+        
+        Le gabarit (champs cachés __VIEWSTATE etc., noms des champs critère, dropdown
+        et bouton) est mis en cache pendant form_state_ttl secondes pour éviter un GET
+        et un parsing complet de Retrouver_un_CT.aspx avant chaque recherche.
         
+        Returns:
+            dict: Gabarit du formulaire, dict avec 'error' si la page est inexploitable,
+                ou None si la page n'a pas pu être récupérée
+        """
+        import time
+        
+        if self._form_state and time.time() - self._form_state_time < self.form_state_ttl:
+            return self._form_state
+        
+        soup = self.get_page(self.search_url, scope='results', phase='form_get')
         if not soup:
             return None
         
+        return self._store_form_state(soup)
+    
+    def _store_form_state(self, soup):
+        """
+        Extrait le gabarit du formulaire de recherche d'une page et le met en cache
+        
+        Returns:
+            dict: Gabarit du formulaire, ou dict avec 'error' si la page est inexploitable
+        """
+        import time
+        
         # Trouver le formulaire principal
-        form = soup.find('form', {'id': 'aspnetForm'})
+        form = self._find_aspnet_form(soup)
         if not form:
-            print("Formulaire principal non trouvé")
-            return None
+            return {"error": "Formulaire principal non trouvé"}
         
         # Récupérer tous les champs cachés nécessaires pour ASP.NET
-        form_data = {}
+        hidden_fields = {}
         hidden_inputs = form.find_all('input', {'type': 'hidden'})
         for inp in hidden_inputs:
             name = inp.get('name')
             value = inp.get('value', '')
             if name:
-                form_data[name] = value
+                hidden_fields[name] = value
         
         # Trouver le champ de critère et le dropdown
         criteria_field = None
         dropdown_field = None
         
-        # Rechercher tous les inputs et selects
         all_inputs = form.find_all(['input', 'select'])
         for inp in all_inputs:
             inp_name = inp.get('name', '')
@@ -144,39 +331,90 @@ class UTACScraper:
             # Chercher le dropdown qui contient "ddlCritereField"
             if inp.name == 'select' and 'ddlCritereField' in inp_name:
                 dropdown_field = inp_name
-                # Sélectionner l'option "Agrement"
-                form_data[dropdown_field] = 'Agrement'
         
         if not criteria_field or not dropdown_field:
             print("Champs de recherche non trouvés")
-            return self._debug_form_fields(form)
+            self._debug_form_fields(form)
+            return {"error": "Champs de recherche non trouvés"}
+        
+        # Trouver le bouton de recherche
+        button = None
+        search_button = form.find('input', {'type': 'submit', 'value': 'Rechercher'})
+        if search_button and search_button.get('name'):
+            button = (search_button.get('name'), search_button.get('value', 'Rechercher'))
+        
+        self._form_state = {
+            'hidden_fields': hidden_fields,
+            'criteria_field': criteria_field,
+            'dropdown_field': dropdown_field,
+            'button': button
+        }
+        self._form_state_time = time.time()
+        return self._form_state
+    
+    def invalidate_form_state(self):
+        """Oublie le gabarit du formulaire (ex: après une erreur upstream)"""
+        self._form_state = None
+        self._form_state_time = 0
+    
+    def _build_search_form_data(self, form_state, search_type, value):
+        """Construit les données POST d'une recherche à partir du gabarit du formulaire"""
+        form_data = dict(form_state['hidden_fields'])
         
         # Remplir le formulaire
-        form_data[criteria_field] = agreement_number
+        form_data[form_state['dropdown_field']] = search_type
+        form_data[form_state['criteria_field']] = value
         
-        # Trouver et ajouter le bouton de recherche
-        search_button = form.find('input', {'type': 'submit', 'value': 'Rechercher'})
-        if search_button:
-            button_name = search_button.get('name')
-            if button_name:
-                form_data[button_name] = search_button.get('value', 'Rechercher')
+        # Ajouter le bouton de recherche
+        if form_state['button']:
+            button_name, button_value = form_state['button']
+            form_data[button_name] = button_value
         
         # Ajouter les données de soumission ASP.NET
         form_data['__EVENTTARGET'] = ''
         form_data['__EVENTARGUMENT'] = ''
         
-        # Envoyer la requête POST
-        try:
-            response = self.session.post(url, data=form_data, timeout=10)
-            response.raise_for_status()
+        return form_data
+    
+    def _submit_search(self, search_type, value):
+        """
+        Soumet une recherche sur Retrouver_un_CT.aspx
+        
+        Avec un gabarit de formulaire en cache, la recherche se fait en un seul POST.
+        En cas d'erreur upstream le gabarit est invalidé, et si il provenait du cache
+        la recherche est retentée une fois avec un gabarit frais.
+        
+        Args:
+            search_type (str): Valeur du dropdown ("Agrement", "Departement")
+            value (str): Valeur du critère de recherche
             
-            # Parser la réponse
-            result_soup = BeautifulSoup(response.content, 'html.parser')
-            return self._parse_search_results(result_soup, agreement_number)
+        Returns:
+            tuple: (BeautifulSoup de la page de résultats ou None, message d'erreur ou None)
+        """
+        for attempt in range(2):
+            cached_form_state = self._form_state
+            form_state = self._get_search_form_state()
+            # Gabarit réutilisé, et non récupéré à l'instant (cache vide ou expiré)
+            from_cache = form_state is not None and form_state is cached_form_state
             
-        except requests.RequestException as e:
-            print(f"Erreur lors de la recherche: {e}")
-            return None
+            if not form_state:
+                return None, "Impossible de récupérer la page de recherche"
+            if 'error' in form_state:
+                return None, form_state['error']
+            
+            form_data = self._build_search_form_data(form_state, search_type, value)
+            
+            try:
+                response = self._request('POST', self.search_url, 'search_post', data=form_data)
+                return self._parse_html(response.content, scope='results'), None
+                
+            except requests.RequestException as e:
+                self.invalidate_form_state()
+                if not from_cache or attempt == 1 or isinstance(e, CircuitOpenError):
+                    return None, f"Erreur lors de la recherche: {e}"
+                print(f"Erreur avec le formulaire en cache, nouvel essai: {e}")
+        
+        return None, "Erreur lors de la recherche"
     
     def _debug_form_fields(self, form):
         """Fonction de debug pour afficher tous les champs du formulaire"""
@@ -192,11 +430,25 @@ class UTACScraper:
     
     def _parse_search_results(self, soup, agreement_number):
         """Parse les résultats de recherche et trouve les informations"""
+        result, detail_url = self._results_or_detail_url(soup, agreement_number)
+        if result is not None:
+            return result
+        
+        # Récupérer la page de détail
+        return self._get_agreement_details(detail_url, agreement_number)
+    
+    def _results_or_detail_url(self, soup, agreement_number):
+        """
+        Exploite la page de résultats d'une recherche par agrément
         
+        Returns:
+            tuple: (informations ou dict d'erreur, None) si la page suffit,
+                (None, URL de la page de détail) sinon
+        """
         # D'abord, regarder si on a des informations directement dans les résultats
         result_info = self._extract_info_from_results_page(soup, agreement_number)
         if result_info and any(result_info[key] for key in ['raison_sociale', 'enseigne', 'adresse', 'ville', 'telephone']):
-            return result_info
+            return result_info, None
         
         # Chercher le tableau de résultats et les liens JavaScript
         tables = soup.find_all('table')
@@ -234,16 +486,12 @@ class UTACScraper:
                         cells = [cell.get_text().strip() for cell in row.find_all(['td', 'th'])]
                         tables_info.append(f"  Row {j}: {cells}")
             
-            return {"error": "Lien détail non trouvé", "debug_tables": tables_info}
+            return {"error": "Lien détail non trouvé", "debug_tables": tables_info}, None
         
         # Construire l'URL complète du lien détail
         if detail_link.startswith('http'):
-            detail_url = detail_link
-        else:
-            detail_url = urljoin("https://www.utac-otc.com/vehicule_leger/Pages/", detail_link)
-        
-        # Récupérer la page de détail
-        return self._get_agreement_details(detail_url, agreement_number)
+            return None, detail_link
+        return None, urljoin(self.search_url, detail_link)
     
     def _extract_info_from_results_page(self, soup, agreement_number):
         """Essaie d'extraire les informations directement de la page de résultats"""
@@ -335,10 +583,14 @@ class UTACScraper:
     def _get_agreement_details(self, detail_url, agreement_number):
         """Récupère les détails du centre d'agrément"""
         
-        detail_soup = self.get_page(detail_url)
+        detail_soup = self.get_page(detail_url, phase='detail_get')
         if not detail_soup:
             return {"error": "Impossible de récupérer la page de détail"}
         
+        return self._extract_agreement_details(detail_soup, detail_url, agreement_number)
+    
+    def _extract_agreement_details(self, detail_soup, detail_url, agreement_number):
+        """Extrait les informations d'un centre de sa page de détail"""
         details = {
             'agreement_number': agreement_number,
             'enseigne': '',
@@ -403,107 +655,109 @@ class UTACScraper:
         Returns:
             list: Liste des centres trouvés avec toutes leurs informations
         """
-        # Valider le format du département
-        if not self._validate_department_code(department_code):
-            return {"error": f"Code département invalide: {department_code}"}
-        
-        url = "https://www.utac-otc.com/vehicule_leger/Pages/Retrouver_un_CT.aspx"
-        soup = self.get_page(url)
-        
-        if not soup:
-            return {"error": "Impossible de récupérer la page de recherche"}
-        
-        # Trouver le formulaire principal
-        form = soup.find('form', {'id': 'aspnetForm'})
-        if not form:
-            return {"error": "Formulaire principal non trouvé"}
+        try:
+            all_centers = list(self.iter_department_centers(department_code))
+        except UTACScraperError as e:
+            return {"error": str(e)}
         
-        # Préparer les données du formulaire
-        form_data = {}
-        hidden_inputs = form.find_all('input', {'type': 'hidden'})
-        for inp in hidden_inputs:
-            name = inp.get('name')
-            value = inp.get('value', '')
-            if name:
-                form_data[name] = value
+        return {
+            "department_code": department_code,
+            "total_centers": len(all_centers),
+            "centers": all_centers
+        }
+    
+    def iter_department_centers(self, department_code):
+        """
+        Génère les centres d'un département au fil de la pagination
         
-        # Trouver les champs de recherche
-        criteria_field = None
-        dropdown_field = None
+        Les centres d'une page sont produits dès que la page est récupérée, sans
+        attendre la fin de la pagination ni accumuler toute la liste en mémoire.
         
-        all_inputs = form.find_all(['input', 'select'])
-        for inp in all_inputs:
-            inp_name = inp.get('name', '')
+        Args:
+            department_code (str): Code du département (ex: "04", "75", "971")
             
-            if inp.name == 'input' and inp.get('type') == 'text' and 'critereValueInput' in inp_name:
-                criteria_field = inp_name
+        Yields:
+            dict: Informations d'un centre
             
-            if inp.name == 'select' and 'ddlCritereField' in inp_name:
-                dropdown_field = inp_name
-        
-        if not criteria_field or not dropdown_field:
-            return {"error": "Champs de recherche non trouvés"}
-        
-        # Remplir le formulaire pour recherche par département
-        form_data[criteria_field] = department_code
-        form_data[dropdown_field] = 'Departement'
-        
-        # Ajouter le bouton de recherche
-        search_button = form.find('input', {'type': 'submit', 'value': 'Rechercher'})
-        if search_button:
-            button_name = search_button.get('name')
-            if button_name:
-                form_data[button_name] = search_button.get('value', 'Rechercher')
+        Raises:
+            UTACScraperError: Code département invalide, recherche impossible ou
+                pagination interrompue
+        """
+        for _, page_centers in self.iter_department_pages(department_code):
+            yield from page_centers
+    
+    def iter_department_pages(self, department_code, start_page=1):
+        """
+        Génère les pages de résultats d'un département
         
-        form_data['__EVENTTARGET'] = ''
-        form_data['__EVENTARGUMENT'] = ''
+        Args:
+            department_code (str): Code du département (ex: "04", "75", "971")
+            start_page (int): Première page à produire (reprise d'un crawl interrompu)
+            
+        Yields:
+            tuple: (numéro de page, liste des centres de la page)
+            
+        Raises:
+            UTACScraperError: Code département invalide, recherche impossible ou
+                pagination interrompue
+        """
+        # Valider le format du département
+        if not self._validate_department_code(department_code):
+            raise UTACScraperError(f"Code département invalide: {department_code}")
         
         # Effectuer la recherche initiale
-        try:
-            response = self.session.post(url, data=form_data, timeout=10)
-            response.raise_for_status()
+        result_soup, error = self._submit_search('Departement', department_code)
+        if not result_soup:
+            raise UTACScraperError(error)
+        
+        page_number = 1
+        if start_page > 1:
+            print(f"Reprise à la page {start_page}...")
+            result_soup = self._navigate_to_page(result_soup, start_page)
+            if not result_soup:
+                raise UTACScraperError(f"Impossible de reprendre à la page {start_page}")
+            page_number = start_page
+        
+        # Extraire tous les résultats avec pagination
+        total_centers = 0
+        
+        while True:
+            print(f"Traitement de la page {page_number}...")
             
-            result_soup = BeautifulSoup(response.content, 'html.parser')
+            page = self._process_results_page(result_soup, department_code)
+            total_centers += len(page.centers)
             
-            # Extraire tous les résultats avec pagination
-            all_centers = []
-            page_number = 1
+            yield page_number, page.centers
             
-            while True:
-                print(f"Traitement de la page {page_number}...")
-                
-                # Extraire les centres de la page actuelle
-                page_centers = self._extract_all_centers_from_page(result_soup, department_code)
-                all_centers.extend(page_centers)
-                
-                # Chercher le lien vers la page suivante
-                next_page_link = self._find_next_page_link(result_soup)
-                
-                if not next_page_link:
-                    print(f"Pas de page suivante trouvée. Total: {len(all_centers)} centres")
-                    break
-                
-                # Naviguer vers la page suivante
-                result_soup = self._navigate_to_next_page(result_soup, next_page_link)
-                if not result_soup:
-                    print("Erreur lors de la navigation vers la page suivante")
-                    break
-                
-                page_number += 1
-                
-                # Sécurité : éviter les boucles infinies
-                if page_number > 50:
-                    print("Limite de 50 pages atteinte, arrêt de la pagination")
-                    break
+            if not page.next_page_link:
+                print(f"Pas de page suivante trouvée. Total: {total_centers} centres")
+                break
             
-            return {
-                "department_code": department_code,
-                "total_centers": len(all_centers),
-                "centers": all_centers
-            }
+            # Sécurité : éviter les boucles infinies
+            if page_number >= 50:
+                print("Limite de 50 pages atteinte, arrêt de la pagination")
+                break
             
-        except requests.RequestException as e:
-            return {"error": f"Erreur lors de la recherche: {e}"}
+            # Naviguer vers la page suivante
+            result_soup = self._navigate_to_next_page(page, page.next_page_link)
+            if not result_soup:
+                # Ne pas tronquer silencieusement le département
+                raise UTACScraperError(f"Erreur lors de la navigation vers la page {page_number + 1}")
+            
+            page_number += 1
+    
+    def _process_results_page(self, soup, department_code):
+        """
+        Exploite une page de résultats d'un département
+        
+        Returns:
+            _ResultsPage: Centres de la page, pager et champs du postback vers la page suivante
+        """
+        with self._phase('extract'):
+            page = self._read_results_page(soup, department_code)
+        if self.metrics is not None:
+            self.metrics.inc('utac_department_pages_fetched_total', department=department_code)
+        return page
     
     def _validate_department_code(self, code):
         """Valide le format du code département"""
@@ -521,25 +775,60 @@ class UTACScraper:
         
         return False
     
-    def _extract_all_centers_from_page(self, soup, department_code):
-        """Extrait tous les centres de la page actuelle"""
-        centers = []
+    def _read_results_page(self, soup, department_code=None):
+        """
+        Extrait en un seul parcours de l'arbre tout ce dont la pagination a besoin
         
-        tables = soup.find_all('table')
-        for table in tables:
-            rows = table.find_all('tr')
-            for row in rows:
-                cells = row.find_all(['td', 'th'])
+        Les lignes de centres, le pager (liens et page courante) et les champs cachés
+        du postback sont relevés au fil d'un unique parcours, au lieu d'un parcours
+        par information (tableaux, liens, spans, champs du formulaire). Seules les
+        cellules directes d'une ligne comptent : la ligne du pager, qui contient le
+        tableau des numéros de page, n'est plus prise pour un centre.
+        
+        Args:
+            soup (BeautifulSoup): Page de résultats
+            department_code (str): Département recherché (None : pager et formulaire seulement)
+            
+        Returns:
+            _ResultsPage: Contenu utile de la page
+        """
+        page = _ResultsPage()
+        
+        # Parcours direct des descendants : find_all avec plusieurs noms passe par un
+        # SoupStrainer, plus lent que quatre find_all d'un seul nom
+        for tag in soup.descendants:
+            name = tag.name
+            
+            if name == 'tr':
+                if department_code is None:
+                    continue
+                cells = tag.find_all(['td', 'th'], recursive=False)
                 if len(cells) >= 8:  # Ligne complète de données
-                    row_text = ' '.join([cell.get_text().strip() for cell in cells])
-                    
+                    texts = [cell.get_text().strip() for cell in cells]
                     # Vérifier si cette ligne appartient au département recherché
-                    if self._is_department_row(row_text, department_code):
-                        center_info = self._extract_center_from_row(cells)
-                        if center_info:
-                            centers.append(center_info)
+                    if self._is_department_row(' '.join(texts), department_code):
+                        page.centers.append(self._center_from_texts(texts))
+            
+            elif name == 'a':
+                href = tag.get('href')
+                if href and '__doPostBack' in href and 'Page$' in href:
+                    match = PAGER_ARGUMENT.search(href)
+                    if match:
+                        page.pager_links.setdefault(int(match.group(1)), href)
+            
+            elif name == 'span':
+                # Page courante : premier numéro du pager qui n'est pas un lien
+                if page.current_page is None:
+                    text = tag.get_text().strip()
+                    if text.isdigit() and tag.parent and tag.parent.name != 'a':
+                        page.current_page = int(text)
+            
+            elif name == 'input' and tag.get('type') == 'hidden' and tag.get('name'):
+                page.hidden_fields[tag['name']] = tag.get('value', '')
         
-        return centers
+        if page.current_page is None:
+            page.current_page = 1
+        return page
     
     def _is_department_row(self, row_text, department_code):
         """Vérifie si une ligne appartient au département recherché"""
@@ -548,9 +837,9 @@ class UTACScraper:
         
         if dept_num <= 95:
             # Départements métropolitains : codes postaux commencent par le numéro du département
-            dept_formatted = f"{dept_num:02d}"  # Format 01, 02, etc.
-            postal_codes = [f"{dept_formatted}{i:03d}" for i in range(1000)]  # 01000-01999, etc.
-            return any(postal in row_text for postal in [dept_formatted + '0', dept_formatted + '1', dept_formatted + '2', dept_formatted + '3', dept_formatted + '4', dept_formatted + '5', dept_formatted + '6', dept_formatted + '7', dept_formatted + '8', dept_formatted + '9'])
+            # Format 01, 02, etc. suivi d'un chiffre (01000-01999, etc.)
+            dept_formatted = f"{dept_num:02d}"
+            return any(dept_formatted + digit in row_text for digit in '0123456789')
         else:
             # DOM-TOM : codes postaux = numéro département
             return department_code in row_text
@@ -589,223 +878,530 @@ class UTACScraper:
         """Extrait les informations d'un centre depuis une ligne de tableau"""
         if len(cells) < 8:
             return None
-        
+        return self._center_from_texts([cell.get_text().strip() for cell in cells[:8]])
+    
+    def _center_from_texts(self, texts):
+        """Centre à partir des textes des cellules d'une ligne de résultats"""
         # Parser ville et code postal
-        ville_complete = cells[4].get_text().strip()
-        ville, code_postal = self._parse_ville_code_postal(ville_complete)
+        ville, code_postal = self._parse_ville_code_postal(texts[4])
         
         return {
-            'raison_sociale': cells[0].get_text().strip(),
-            'agreement_number': cells[1].get_text().strip(),
-            'enseigne': cells[2].get_text().strip(),
-            'adresse': cells[3].get_text().strip(),
+            'raison_sociale': texts[0],
+            'agreement_number': texts[1],
+            'enseigne': texts[2],
+            'adresse': texts[3],
             'ville': ville,
             'code_postal': code_postal,
-            'telephone': cells[5].get_text().strip(),
-            'option': cells[6].get_text().strip(),
-            'site_internet': cells[7].get_text().strip() if len(cells) > 7 else ''
+            'telephone': texts[5],
+            'option': texts[6],
+            'site_internet': texts[7]
         }
     
-    def _find_next_page_link(self, soup):
-        """Trouve le lien vers la page suivante"""
-        # Chercher les liens de pagination
-        pagination_links = soup.find_all('a', href=lambda href: href and '__doPostBack' in href and 'Page$' in href)
+    def _navigate_to_page(self, soup, target_page):
+        """
+        Atteint une page donnée en suivant les liens visibles du pager
         
-        if not pagination_links:
-            return None
+        ASP.NET valide les arguments de postback (__EVENTVALIDATION) : on ne peut
+        demander que les pages affichées par le pager, d'où des sauts de bloc en bloc
+        ("..." = +10 pages) sans extraire les pages intermédiaires.
         
-        # Trouver le numéro de page actuelle
-        current_page = 1
-        page_spans = soup.find_all('span')
-        for span in page_spans:
-            text = span.get_text().strip()
-            if text.isdigit():
-                # Vérifier si c'est la page courante (pas un lien)
-                parent = span.parent
-                if parent and parent.name != 'a':
-                    current_page = int(text)
-                    break
+        Returns:
+            BeautifulSoup: Page cible, ou None si elle est inaccessible
+        """
+        page = self._read_results_page(soup)
         
-        # Chercher le lien vers la page suivante
-        next_page = current_page + 1
-        for link in pagination_links:
-            href = link.get('href', '')
-            if f'Page${next_page}' in href:
-                return link
+        while page.current_page != target_page:
+            link = page.hop(target_page)
+            if not link:
+                return None
+            
+            soup = self._navigate_to_next_page(page, link)
+            if not soup:
+                return None
+            
+            new_page = self._read_results_page(soup)
+            if new_page.current_page <= page.current_page:
+                return None
+            page = new_page
         
-        return None
+        return soup
     
-    def _navigate_to_next_page(self, current_soup, next_link):
-        """Navigue vers la page suivante en simulant le postback ASP.NET"""
-        href = next_link.get('href', '')
+    def _navigate_to_next_page(self, page, next_link):
+        """
+        Navigue vers une page du pager en simulant le postback ASP.NET
         
-        # Extraire les paramètres du JavaScript __doPostBack
-        if '__doPostBack' not in href:
+        Args:
+            page (_ResultsPage): Page courante (champs cachés du formulaire)
+            next_link (str): href __doPostBack du lien du pager
+        """
+        form_data = self._postback_form_data(page, next_link)
+        if not form_data:
             return None
         
-        # Parser le JavaScript pour extraire les paramètres
+        # Effectuer la requête POST
+        try:
+            response = self._request('POST', self.search_url, 'page_postback', data=form_data)
+            return self._parse_html(response.content, scope='results')
+        
+        except requests.RequestException as e:
+            print(f"Erreur lors de la navigation: {e}")
+            return None
+    
+    def _postback_form_data(self, page, href):
+        """Données POST du postback ASP.NET d'un lien du pager (None si le lien est inexploitable)"""
+        # Extraire les paramètres du JavaScript __doPostBack
         # Format: javascript:__doPostBack('target','argument')
-        import re
-        match = re.search(r"__doPostBack\('([^']+)','([^']+)'\)", href)
+        match = POSTBACK_CALL.search(href or '')
         if not match:
             return None
         
         event_target = match.group(1)
         event_argument = match.group(2)
         
-        # Préparer les données du formulaire pour le postback
-        form = current_soup.find('form', {'id': 'aspnetForm'})
-        if not form:
+        # Champs cachés du formulaire, relevés avec le reste de la page
+        if not page.hidden_fields:
             return None
-        
-        form_data = {}
-        hidden_inputs = form.find_all('input', {'type': 'hidden'})
-        for inp in hidden_inputs:
-            name = inp.get('name')
-            value = inp.get('value', '')
-            if name:
-                form_data[name] = value
+        form_data = dict(page.hidden_fields)
         
         # Ajouter les paramètres du postback
         form_data['__EVENTTARGET'] = event_target
         form_data['__EVENTARGUMENT'] = event_argument
+        return form_data
+    
+    @staticmethod
+    def list_french_departments():
+        """Liste complète des codes départements français (métropole puis outre-mer)"""
+        departments = []
+        
+        # Départements métropolitains (01-95)
+        for i in range(1, 96):
+            departments.append(f"{i:02d}")
+        
+        # Départements d'outre-mer (971-989)
+        for i in range(971, 990):
+            departments.append(str(i))
+        
+        return departments
+    
+    def _new_worker_scraper(self):
+        """Crée un scraper indépendant (session, état de formulaire) avec la même configuration et le même transport"""
+        return self.__class__(
+            form_state_ttl=self.form_state_ttl,
+            parser=self.parser,
+            scoped_parsing=self.scoped_parsing,
+            transport=self.transport,
+            metrics=self.metrics,
+            base_url=self.base_url,
+            priority=self.priority
+        )
+    
+    @staticmethod
+    def _write_json_atomic(path, payload):
+        """Écrit un fichier JSON de façon atomique (jamais de checkpoint à moitié écrit), compact sauf UTAC_JSON_PRETTY=1"""
+        import json_codec
+        
+        json_codec.write_file(path, payload)
+    
+    @staticmethod
+    def _load_checkpoint(path, run_started_at, max_age):
+        """
+        Charge un checkpoint s'il appartient au crawl en cours et n'est pas trop ancien
+        
+        Returns:
+            dict: Contenu du checkpoint ou None
+        """
+        import time
+        import json_codec
         
-        # Effectuer la requête POST
         try:
-            url = "https://www.utac-otc.com/vehicule_leger/Pages/Retrouver_un_CT.aspx"
-            response = self.session.post(url, data=form_data, timeout=10)
-            response.raise_for_status()
-            
-            return BeautifulSoup(response.content, 'html.parser')
+            checkpoint = json_codec.read_file(path)
+        except (OSError, ValueError):
+            return None
         
-        except requests.RequestException as e:
-            print(f"Erreur lors de la navigation: {e}")
+        timestamp = checkpoint.get('timestamp') or 0
+        if timestamp < run_started_at or time.time() - timestamp > max_age:
             return None
+        return checkpoint
     
-    def get_all_french_centers(self, output_dir="/tmp/utac_departments"):
+    def _crawl_department(self, dept, output_dir, run_started_at=0, checkpoint_max_age=0):
+        """
+        Récupère un département pour le crawl national avec checkpoints
+        
+        Chaque page récupérée est enregistrée dans dept_*.json.partial ; le fichier
+        dept_*.json (marqué "complete") n'est écrit qu'à la fin de la pagination.
+        Un département déjà complet pour le crawl en cours est sauté, un département
+        interrompu reprend après sa dernière page enregistrée.
+        
+        Args:
+            dept (str): Code du département
+            output_dir (str): Répertoire de sauvegarde incrémentale
+            run_started_at (float): Début du crawl en cours (les checkpoints antérieurs sont ignorés)
+            checkpoint_max_age (int): Âge maximal (secondes) d'un checkpoint réutilisable
+            
+        Returns:
+            tuple: (liste des centres, statistiques du département, message d'erreur ou None)
+        """
+        checkpoint = _DepartmentCheckpoint(dept, output_dir, run_started_at, checkpoint_max_age)
+        if checkpoint.complete:
+            return checkpoint.reuse()
+        
+        try:
+            try:
+                pages = self.iter_department_pages(dept, start_page=checkpoint.pages_completed + 1)
+                for page_number, page_centers in pages:
+                    checkpoint.add_page(page_number, page_centers)
+            
+            except UTACScraperError:
+                if not checkpoint.can_restart():
+                    raise
+                # Reprise impossible (pagination modifiée upstream) : repartir de la page 1
+                checkpoint.restart()
+                return self._crawl_department(dept, output_dir, run_started_at, checkpoint_max_age)
+            
+            return checkpoint.finish()
+            
+        except UTACScraperError as e:
+            return checkpoint.failed(str(e))
+            
+        except Exception as e:
+            return checkpoint.failed(str(e), status='exception')
+    
+    def get_all_french_centers(self, output_dir="/tmp/utac_departments", workers=1, progress_callback=None,
+                               resume=True, checkpoint_max_age=24 * 3600):
         """
         Récupère tous les centres de contrôle technique de France
         Sauvegarde incrémentale par département pour éviter les pertes
         
+        L'état du crawl est suivi dans crawl_state.json : si le crawl précédent n'a pas
+        été terminé (crash, worker tué), il est repris. Les départements complets sont
+        sautés, les départements interrompus reprennent à leur dernière page enregistrée,
+        et all_french_centers.json est assemblé à partir des checkpoints.
+        
         Args:
             output_dir (str): Répertoire pour les fichiers temporaires
+            workers (int): Nombre de départements traités en parallèle. Chaque worker
+                utilise son propre scraper (session HTTP et état de formulaire ASP.NET)
+            progress_callback (callable): Appelé après chaque département avec
+                (code département, statistiques, départements traités, total)
+            resume (bool): Reprendre le crawl précédent s'il n'a pas été terminé
+            checkpoint_max_age (int): Âge maximal (secondes) d'un checkpoint réutilisable
             
         Returns:
             dict: Résultats complets avec statistiques
         """
+        import threading
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        
+        crawl = _NationalCrawl(self.list_french_departments(), output_dir, workers, progress_callback,
+                               resume, checkpoint_max_age)
+        
+        if crawl.workers == 1:
+            for i, dept in enumerate(crawl.departments, 1):
+                print(f"\n[{i:3d}/{len(crawl.departments)}] Traitement département {dept}...")
+                crawl.record(dept, *self._crawl_department(dept, output_dir, crawl.run_started_at, checkpoint_max_age))
+        else:
+            # Un scraper par thread : sessions et états ASP.NET indépendants
+            local = threading.local()
+            
+            def crawl_department(dept):
+                if not hasattr(local, 'scraper'):
+                    local.scraper = self._new_worker_scraper()
+                return local.scraper._crawl_department(dept, output_dir, crawl.run_started_at, checkpoint_max_age)
+            
+            with ThreadPoolExecutor(max_workers=crawl.workers) as executor:
+                futures = {executor.submit(crawl_department, dept): dept for dept in crawl.departments}
+                for future in as_completed(futures):
+                    crawl.record(futures[future], *future.result())
+        
+        return crawl.finish()
+
+
+class _ResultsPage:
+    """Contenu utile d'une page de résultats (voir UTACScraper._read_results_page)"""
+    
+    def __init__(self):
+        self.centers = []
+        # Numéro de page -> href __doPostBack des liens visibles du pager
+        self.pager_links = {}
+        self.current_page = None
+        # Champs cachés du formulaire ASP.NET (__VIEWSTATE, __EVENTVALIDATION...)
+        self.hidden_fields = {}
+    
+    @property
+    def next_page_link(self):
+        """Lien vers la page suivante, ou None sur la dernière page"""
+        return self.pager_links.get(self.current_page + 1)
+    
+    def hop(self, target_page):
+        """Lien visible du pager le plus proche de la page cible (sans la dépasser)"""
+        if target_page in self.pager_links:
+            return self.pager_links[target_page]
+        candidates = [n for n in self.pager_links if self.current_page < n < target_page]
+        if not candidates:
+            return None
+        return self.pager_links[max(candidates)]
+
+
+class _DepartmentCheckpoint:
+    """
+    Checkpoints d'un département pendant le crawl national
+    
+    dept_XX.json.partial est réécrit après chaque page, dept_XX.json (marqué "complete")
+    est écrit en fin de pagination. Partagé par les crawls synchrone et asynchrone.
+    """
+    
+    def __init__(self, dept, output_dir, run_started_at, max_age):
         import os
-        import json
         import time
         
-        # Créer le répertoire de sortie
-        os.makedirs(output_dir, exist_ok=True)
+        self.dept = dept
+        self.started_at = time.time()
+        self.dept_file = os.path.join(output_dir, f"dept_{dept}.json")
+        self.partial_file = self.dept_file + '.partial'
+        
+        checkpoint = UTACScraper._load_checkpoint(self.dept_file, run_started_at, max_age)
+        self.complete = checkpoint if checkpoint and checkpoint.get('complete') else None
+        
+        # Département interrompu : reprendre après la dernière page enregistrée
+        self.centers = []
+        self.pages_completed = 0
+        self.resumed_from = 0
+        partial = None if self.complete else UTACScraper._load_checkpoint(self.partial_file, run_started_at, max_age)
+        if partial:
+            self.centers = partial['centers']
+            self.pages_completed = self.resumed_from = partial['pages_completed']
+            print(f"    ♻️  Reprise après la page {self.pages_completed} ({len(self.centers)} centres déjà récupérés)")
+    
+    def _elapsed(self):
+        import time
+        return round(time.time() - self.started_at, 2)
+    
+    def reuse(self):
+        """Département déjà complet pour ce crawl : rien à faire"""
+        print(f"    ♻️  Checkpoint complet réutilisé ({self.complete['total_centers']} centres)")
+        stats = {
+            'centers_count': self.complete['total_centers'],
+            'duration_seconds': 0,
+            'status': 'success',
+            'from_checkpoint': True
+        }
+        return self.complete['centers'], stats, None
+    
+    def add_page(self, page_number, page_centers):
+        """Enregistre une page récupérée dans le checkpoint partiel"""
+        import time
         
-        # Liste complète des départements français
-        departments = []
+        # Ajouter le code département à chaque centre
+        for center in page_centers:
+            center['department'] = self.dept
+        self.centers.extend(page_centers)
+        self.pages_completed = page_number
+        
+        UTACScraper._write_json_atomic(self.partial_file, {
+            'department_code': self.dept,
+            'pages_completed': self.pages_completed,
+            'total_centers': len(self.centers),
+            'centers': self.centers,
+            'timestamp': time.time(),
+            'complete': False
+        })
+    
+    def can_restart(self):
+        """Vrai si l'erreur vient de la reprise elle-même (aucune page récupérée depuis)"""
+        return self.resumed_from > 0 and self.pages_completed == self.resumed_from
+    
+    def restart(self):
+        """Abandonne le checkpoint partiel pour repartir de la page 1"""
+        import os
         
-        # Départements métropolitains (01-95)
-        for i in range(1, 96):
-            departments.append(f"{i:02d}")
+        print("    ⚠️  Reprise impossible, redémarrage du département depuis la page 1")
+        if os.path.exists(self.partial_file):
+            os.remove(self.partial_file)
+    
+    def finish(self):
+        """Pagination terminée : écrit dept_XX.json et supprime le checkpoint partiel"""
+        import os
+        import time
         
-        # Départements d'outre-mer (971-989)
-        for i in range(971, 990):
-            departments.append(str(i))
+        UTACScraper._write_json_atomic(self.dept_file, {
+            'department_code': self.dept,
+            'total_centers': len(self.centers),
+            'pages': self.pages_completed,
+            'centers': self.centers,
+            'timestamp': time.time(),
+            'complete': True
+        })
+        if os.path.exists(self.partial_file):
+            os.remove(self.partial_file)
+        
+        stats = {
+            'centers_count': len(self.centers),
+            'duration_seconds': self._elapsed(),
+            'status': 'success'
+        }
+        return self.centers, stats, None
+    
+    def failed(self, error_msg, status='error'):
+        """Département en erreur : le checkpoint partiel est conservé pour le crawl suivant"""
+        stats = {
+            'centers_count': 0,
+            'duration_seconds': self._elapsed(),
+            'status': status,
+            'error': error_msg,
+            'pages_completed': self.pages_completed
+        }
+        if status == 'exception':
+            return [], stats, f"Département {self.dept}: Exception - {error_msg}"
+        return [], stats, f"Département {self.dept}: {error_msg}"
+
+
+class _NationalCrawl:
+    """
+    Déroulement d'un crawl national : état de reprise (crawl_state.json), progression,
+    assemblage depuis les checkpoints et résultat final. Partagé par les crawls
+    synchrone et asynchrone.
+    """
+    
+    def __init__(self, departments, output_dir, workers, progress_callback, resume, checkpoint_max_age):
+        import os
+        import json_codec
+        import time
+        
+        # Créer le répertoire de sortie
+        os.makedirs(output_dir, exist_ok=True)
+        
+        self.departments = departments
+        self.output_dir = output_dir
+        self.workers = max(1, int(workers or 1))
+        self.progress_callback = progress_callback
+        self.checkpoint_max_age = checkpoint_max_age
         
         print(f"=== RÉCUPÉRATION DE TOUS LES CENTRES DE FRANCE ===")
         print(f"Départements à traiter: {len(departments)}")
-        print(f"Estimation: ~6700 centres en ~8-10 minutes")
+        print(f"Workers: {self.workers}")
+        print(f"Estimation: ~6700 centres en ~8-10 minutes (mode séquentiel)")
         print(f"Sauvegarde incrémentale dans: {output_dir}")
         
-        all_centers = []
-        department_stats = {}
-        total_centers = 0
-        errors = []
-        start_time = time.time()
-        
-        for i, dept in enumerate(departments, 1):
-            dept_start_time = time.time()
-            print(f"\n[{i:3d}/{len(departments)}] Traitement département {dept}...")
-            
+        # Reprendre le crawl précédent s'il a été interrompu, sinon en démarrer un nouveau
+        self.state_file = os.path.join(output_dir, 'crawl_state.json')
+        state = None
+        if resume:
             try:
-                result = self.search_by_department(dept)
-                
-                if result and 'error' not in result:
-                    centers = result.get('centers', [])
-                    dept_total = len(centers)
-                    total_centers += dept_total
-                    
-                    # Ajouter le code département à chaque centre
-                    for center in centers:
-                        center['department'] = dept
-                    
-                    all_centers.extend(centers)
-                    
-                    # Statistiques du département
-                    dept_duration = time.time() - dept_start_time
-                    department_stats[dept] = {
-                        'centers_count': dept_total,
-                        'duration_seconds': round(dept_duration, 2),
-                        'status': 'success'
-                    }
-                    
-                    # Sauvegarde incrémentale
-                    dept_file = os.path.join(output_dir, f"dept_{dept}.json")
-                    with open(dept_file, 'w', encoding='utf-8') as f:
-                        json.dump({
-                            'department_code': dept,
-                            'total_centers': dept_total,
-                            'centers': centers,
-                            'timestamp': time.time()
-                        }, f, indent=2, ensure_ascii=False)
-                    
-                    print(f"    ✅ {dept_total} centres récupérés en {dept_duration:.1f}s")
-                    
-                else:
-                    error_msg = result.get('error', 'Erreur inconnue') if result else 'Pas de résultat'
-                    errors.append(f"Département {dept}: {error_msg}")
-                    department_stats[dept] = {
-                        'centers_count': 0,
-                        'duration_seconds': round(time.time() - dept_start_time, 2),
-                        'status': 'error',
-                        'error': error_msg
-                    }
-                    print(f"    ❌ Erreur: {error_msg}")
-                
-            except Exception as e:
-                error_msg = str(e)
-                errors.append(f"Département {dept}: Exception - {error_msg}")
-                department_stats[dept] = {
-                    'centers_count': 0,
-                    'duration_seconds': round(time.time() - dept_start_time, 2),
-                    'status': 'exception',
-                    'error': error_msg
-                }
-                print(f"    💥 Exception: {error_msg}")
-            
-            # Affichage du progrès
-            elapsed = time.time() - start_time
-            if i > 0:
-                avg_time_per_dept = elapsed / i
-                remaining_time = avg_time_per_dept * (len(departments) - i)
-                print(f"    📊 Total: {total_centers} centres | Temps écoulé: {elapsed/60:.1f}min | Restant: {remaining_time/60:.1f}min")
+                state = json_codec.read_file(self.state_file)
+            except (OSError, ValueError):
+                state = None
         
-        total_duration = time.time() - start_time
+        if state and not state.get('finished') and time.time() - state['started_at'] < checkpoint_max_age:
+            self.run_started_at = state['started_at']
+            print(f"♻️  Reprise du crawl démarré le {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.run_started_at))}")
+        else:
+            self.run_started_at = time.time()
+            UTACScraper._write_json_atomic(self.state_file, {'started_at': self.run_started_at, 'finished': False})
+        
+        self.department_stats = {}
+        self.total_centers = 0
+        self.dept_errors = {}
+        self.start_time = time.time()
+    
+    def record(self, dept, centers, stats, error):
+        """Enregistre le résultat d'un département et affiche la progression"""
+        import time
+        
+        self.department_stats[dept] = stats
+        self.total_centers += len(centers)
+        i = len(self.department_stats)
+        departments = self.departments
+        
+        if error:
+            self.dept_errors[dept] = error
+            icon = '💥 Exception' if stats['status'] == 'exception' else '❌ Erreur'
+            print(f"\n[{i:3d}/{len(departments)}] Département {dept}")
+            print(f"    {icon}: {stats['error']}")
+        else:
+            print(f"\n[{i:3d}/{len(departments)}] Département {dept}")
+            print(f"    ✅ {stats['centers_count']} centres récupérés en {stats['duration_seconds']:.1f}s")
+        
+        # Affichage du progrès
+        elapsed = time.time() - self.start_time
+        avg_time_per_dept = elapsed / i
+        remaining_time = avg_time_per_dept * (len(departments) - i)
+        print(f"    📊 Total: {self.total_centers} centres | Temps écoulé: {elapsed/60:.1f}min | Restant: {remaining_time/60:.1f}min")
+        
+        if self.progress_callback:
+            self.progress_callback(dept, stats, i, len(departments))
+    
+    def finish(self):
+        """
+        Assemble le snapshot national depuis les checkpoints et clôt le crawl
+        
+        Returns:
+            dict: Résultats complets avec statistiques
+        """
+        import os
+        import time
+        from change_feed import ChangeFeed
+        from snapshot_store import SnapshotStore
+        from center_dedup import dedupe_centers
+        
+        departments = self.departments
+        department_stats = self.department_stats
+        crawled_centers = self.total_centers
+        workers = self.workers
+        output_dir = self.output_dir
+        total_duration = time.time() - self.start_time
+        
+        # Assemblage depuis les checkpoints, dans l'ordre des départements
+        successful_departments = [dept for dept in departments if department_stats[dept]['status'] == 'success']
+        checkpoints = []
+        for dept in successful_departments:
+            checkpoint = UTACScraper._load_checkpoint(os.path.join(output_dir, f"dept_{dept}.json"),
+                                                      self.run_started_at, self.checkpoint_max_age)
+            if checkpoint and checkpoint.get('complete'):
+                checkpoints.append((dept, checkpoint['centers']))
+        
+        # Un centre par numéro d'agrément, rattaché au département de son code postal
+        columns = dedupe_centers(checkpoints, successful_departments)
+        del checkpoints
+        all_centers = columns.to_centers()
+        total_centers = len(all_centers)
+        errors = [self.dept_errors[dept] for dept in departments if dept in self.dept_errors]
+        
+        # Durée équivalente en mode séquentiel : somme des durées par département
+        sequential_duration = sum(d['duration_seconds'] for d in department_stats.values())
+        speedup = sequential_duration / total_duration if total_duration > 0 else 0
+        
+        # Seul un crawl complet est publié : sinon le snapshot précédent reste servi
+        # et le prochain passage reprendra les départements en erreur
+        published = not errors and bool(all_centers)
+        
+        # Diff avec le snapshot précédent, pour le flux /changes
+        finished_at = time.time()
+        changes = None
+        if published:
+            changes = ChangeFeed(output_dir).record_snapshot(all_centers, successful_departments, finished_at)
         
         # Sauvegarde du résultat final
         final_result = {
             'success': True,
-            'timestamp': time.time(),
+            'timestamp': finished_at,
             'total_duration_seconds': round(total_duration, 2),
             'total_duration_minutes': round(total_duration / 60, 2),
             'summary': {
                 'total_centers': total_centers,
+                'crawled_centers': crawled_centers,
+                'normalization': columns.stats,
                 'total_departments': len(departments),
                 'successful_departments': len([d for d in department_stats.values() if d['status'] == 'success']),
                 'failed_departments': len([d for d in department_stats.values() if d['status'] != 'success']),
                 'average_centers_per_department': round(total_centers / len(departments), 1) if departments else 0,
-                'processing_rate_centers_per_second': round(total_centers / total_duration, 1) if total_duration > 0 else 0
+                'processing_rate_centers_per_second': round(crawled_centers / total_duration, 1) if total_duration > 0 else 0,
+                'workers': workers,
+                'sequential_duration_seconds': round(sequential_duration, 2),
+                'speedup_vs_sequential': round(speedup, 2),
+                'published': published,
+                'changes': changes
             },
-            'department_statistics': department_stats,
+            'department_statistics': {dept: department_stats[dept] for dept in departments},
             'errors': errors,
             'data': {
                 'total_centers': total_centers,
@@ -813,15 +1409,38 @@ class UTACScraper:
             }
         }
         
-        # Sauvegarder le résultat complet
+        # Sauvegarder le résultat complet, puis le snapshot SQLite indexé lu par
+        # CenterIndex sans tout charger en mémoire
         final_file = os.path.join(output_dir, "all_french_centers.json")
-        with open(final_file, 'w', encoding='utf-8') as f:
-            json.dump(final_result, f, indent=2, ensure_ascii=False)
+        store = SnapshotStore.in_directory(output_dir)
+        if published:
+            UTACScraper._write_json_atomic(final_file, final_result)
+            store.write_rows(columns.rows(), finished_at)
+        
+        # Crawl terminé sans erreur : le prochain appel démarrera un nouveau crawl.
+        # Sinon il reprendra les départements en erreur depuis leurs checkpoints.
+        UTACScraper._write_json_atomic(self.state_file, {
+            'started_at': self.run_started_at,
+            'finished': not errors,
+            'finished_at': time.time()
+        })
         
         print(f"\n=== RÉCUPÉRATION TERMINÉE ===")
         print(f"✅ {total_centers} centres récupérés")
+        if columns.stats['duplicates_removed'] or columns.stats['departments_reassigned']:
+            print(f"🧹 Normalisation: {columns.stats['duplicates_removed']} doublons supprimés, "
+                  f"{columns.stats['departments_reassigned']} centres rattachés au département de leur code postal")
         print(f"⏱️  Durée totale: {total_duration/60:.1f} minutes")
-        print(f"📁 Fichier final: {final_file}")
+        if workers > 1:
+            print(f"🚀 Accélération vs séquentiel: x{speedup:.1f} ({workers} workers, {sequential_duration/60:.1f} min cumulées)")
+        if changes and not changes['baseline']:
+            print(f"🔄 Changements: +{changes['added']} / -{changes['removed']} / ~{changes['modified']} "
+                  f"({changes['changed_departments']} départements modifiés)")
+        if published:
+            print(f"📁 Fichier final: {final_file}")
+            print(f"🗄️  Snapshot indexé: {store.path}")
+        else:
+            print("⏸️  Snapshot non publié (crawl incomplet) : le snapshot précédent reste servi")
         print(f"📂 Fichiers par département: {output_dir}/dept_*.json")
         
         if errors:
@@ -889,4 +1508,11 @@ def search_agreement(agreement_number):
         print("Aucun résultat trouvé")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import sys
+    
+    if sys.argv[1:2] == ['refresh']:
+        # Processus de rafraîchissement du snapshot national (voir snapshot_refresher.py)
+        from snapshot_refresher import main as refresh_main
+        refresh_main(sys.argv[2:])
+    else:
+        main()